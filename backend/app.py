@@ -8,6 +8,7 @@ from azure.core.credentials import AzureKeyCredential
 from azure.search.documents import SearchClient
 from geopy.geocoders import Nominatim
 import config
+from pipeline import gazetteer, index_state
 
 # ==========================================
 # --- 1. KONFIGURATION ---
@@ -16,7 +17,6 @@ import config
 
 SEARCH_ENDPOINT = config.SEARCH_ENDPOINT
 SEARCH_KEY = config.SEARCH_KEY
-INDEX_NAME = config.INDEX_NAME
 SEMANTIC_CONFIG = config.SEMANTIC_CONFIG
 PROFILES_FILE = "saved_profiles.json"
 
@@ -26,12 +26,17 @@ PROFILES_FILE = "saved_profiles.json"
 
 st.set_page_config(page_title="Vergaberadar Pro", layout="wide", page_icon="📡")
 
+@st.cache_data(ttl=config.INDEX_STATE_CACHE_SECONDS)
+def get_live_index_name():
+    """Aktiver Index (nach --rebuild-index config.INDEX_NAME-<Zeitstempel>)."""
+    return index_state.live_index_name()
+
 # Verbindung herstellen
 try:
     # Hier passiert der Zugriff auf die oben definierten Variablen
     client = SearchClient(
         endpoint=SEARCH_ENDPOINT, 
-        index_name=INDEX_NAME, 
+        index_name=get_live_index_name(), 
         credential=AzureKeyCredential(SEARCH_KEY)
     )
 except Exception as e:
@@ -43,13 +48,22 @@ except Exception as e:
 # --- 3. HELFER-FUNKTIONEN ---
 # ==========================================
 
+@st.cache_resource
+def load_gazetteer():
+    """Lokaler PLZ-Gazetteer (memory-mapped); None, wenn nicht gebaut."""
+    return gazetteer.load()
+
 def get_geo_location(postal_code):
-    """Wandelt PLZ in Koordinaten um (Nominatim)."""
+    """Wandelt PLZ in (lat, lng) um: Gazetteer, Nominatim nur als Fallback."""
+    plz_lookup = load_gazetteer()
+    if plz_lookup is not None:
+        return plz_lookup.get(postal_code)
+
     geolocator = Nominatim(user_agent="vergabe_radar_app")
     try:
         # Wir fügen "Deutschland" hinzu für bessere Treffer
         location = geolocator.geocode(f"{postal_code}, Deutschland")
-        return location
+        return (location.latitude, location.longitude) if location else None
     except:
         return None
 
@@ -262,8 +276,9 @@ if should_search:
     if plz_val and len(plz_val) == 5:
         loc = get_geo_location(plz_val)
         if loc:
+            lat, lng = loc
             # Azure Geo-Distance Filter
-            filters.append(f"geo.distance(geo_location, geography'POINT({loc.longitude} {loc.latitude})') le {rad_val}")
+            filters.append(f"geo.distance(geo_location, geography'POINT({lng} {lat})') le {rad_val}")
         else:
             st.warning(f"Konnte PLZ '{plz_val}' nicht finden. Umkreissuche deaktiviert.")
     
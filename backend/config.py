@@ -19,13 +19,73 @@ SQL_PASSWORD = os.environ["VERGABE_SQL_PASSWORD"]
 SEARCH_ENDPOINT = os.environ["VERGABE_SEARCH_ENDPOINT"]
 SEARCH_KEY = os.environ["VERGABE_SEARCH_KEY"]
 INDEX_NAME = "vergabe-radar-v2"
+INDEX_STATE_PATH = Path(__file__).parent / "data" / "search_index.json"  # aktiver Index nach --rebuild-index
+INDEX_STATE_CACHE_SECONDS = 60  # so lange merkt sich app.py den Namen; der alte Index lebt so lange weiter
 SEMANTIC_CONFIG = "vergabe-semantic-config"
 
+# --- Vektor-Index (Änderungen erst nach --rebuild-index wirksam) ---
+VECTOR_COMPRESSION = "scalar"  # None | "scalar" (int8, ~4x kleiner) | "binary" (~32x kleiner)
+VECTOR_RESCORING = True  # Top-Kandidaten mit Originalvektoren nachbewerten
+VECTOR_OVERSAMPLING = 4.0  # Kandidaten-Faktor für das Rescoring
+VECTOR_RESCORE_STORAGE = "preserveOriginals"  # "discardOriginals": kleiner, nur bei "binary" sinnvoll
+VECTOR_STORED = False  # content_vector nicht abrufbar speichern (wird nie ausgelesen)
+HNSW_M = 4  # Kanten pro Knoten (4-10)
+HNSW_EF_CONSTRUCTION = 400  # Kandidatenliste beim Indexaufbau (100-1000)
+HNSW_EF_SEARCH = 500  # Kandidatenliste bei der Suche (100-1000)
+
 # --- Azure OpenAI ---
 OPENAI_ENDPOINT = os.environ["VERGABE_OPENAI_ENDPOINT"]
 OPENAI_KEY = os.environ["VERGABE_OPENAI_KEY"]
 OPENAI_EMBEDDING_DEPLOYMENT = "text-embedding-3-small"
 OPENAI_EMBEDDING_DIMENSIONS = 256  # Reduziert für Free Tier (50 MB Limit). 1536 bei Upgrade.
 
+# --- Embedding-Scheduler (Quota des Deployments) ---
+EMBEDDING_TPM_LIMIT = 350_000  # Tokens pro Minute
+EMBEDDING_RPM_LIMIT = 2_100  # Requests pro Minute
+EMBEDDING_WORKERS = 4  # Gleichzeitige Requests
+EMBEDDING_BATCH_MAX_TOKENS = 8_000  # Geschätzte Tokens pro Request (glättet das Quota)
+EMBEDDING_BATCH_MAX_SIZE = 512  # Texte pro Request (API-Maximum 2048)
+EMBEDDING_MAX_RETRIES = 6  # Bei 429/5xx, danach bleibt das Dokument offen
+EMBEDDING_CHARS_PER_TOKEN = 3  # Für die Token-Schätzung
+
+# --- Indexing (Streaming Embedding → Upload) ---
+INDEX_CHUNK_SIZE = 1000  # Dokumente pro gelesenem Chunk
+INDEX_PREFETCH_CHUNKS = 2  # Embeddete Chunks, die auf den Upload warten dürfen
+
 # --- Datenquelle ---
-API_BASE_URL = "https://oeffentlichevergabe.de/api/notice-exports"
+API_BASE_URL = os.environ.get(
+    "VERGABE_API_BASE_URL", "https://oeffentlichevergabe.de/api/notice-exports"
+)
+HTTP_POOL_SIZE = 8          # Keep-Alive-Verbindungen der geteilten Session
+HTTP_RETRIES = 5            # Wiederholungen bei 429/5xx/Verbindungsfehlern
+HTTP_BACKOFF = 1.0          # Exponentielles Backoff: 1s, 2s, 4s, ...
+DOWNLOAD_SPOOL_MAX_MB = 64  # Größere Archive werden beim Download auf Platte ausgelagert
+
+# --- Lokaler Archiv-Cache (None = deaktiviert) ---
+ARCHIVE_CACHE_DIR = Path(__file__).parent / ".cache" / "archives"
+ARCHIVE_CACHE_MAX_MB = 2048
+ARCHIVE_CACHE_REVALIDATE_HOURS = 24  # Re-Exporte erkennen (Conditional GET); None = nie
+
+# --- Embedding-Cache (None = deaktiviert) ---
+VECTOR_CACHE_DIR = Path(__file__).parent / ".cache" / "vectors"
+VECTOR_CACHE_MAX_MB = 1024  # float16: 256 Dim. = 512 Bytes pro Vektor
+
+# --- PLZ-Gazetteer (vorgebaut per --build-gazetteer) ---
+GAZETTEER_PATH = Path(__file__).parent / "data" / "plz_gazetteer.npy"
+
+# --- Parquet-Staging-Lake (None = deaktiviert, braucht pyarrow) ---
+STAGING_LAKE_DIR = Path(__file__).parent / ".cache" / "lake"
+
+# --- Import ---
+IMPORT_MODE = "merge"       # "rows" (zeilenweise), "bulk" (fast_executemany), "merge" (Staging + Anti-Join)
+IMPORT_BATCH_SIZE = 1000    # Zeilen pro executemany-Round-Trip
+IMPORT_CHUNK_SIZE = 50_000  # Zeilen pro Chunk beim Streaming-Import
+IMPORT_PREFETCH_CHUNKS = 2  # Chunks, die während des Imports vorgeladen werden
+IMPORT_WORKERS = 4          # Unabhängige Tabellen, die parallel importieren (eigene Verbindungen)
+
+# --- Backfill ---
+BACKFILL_FETCH_WORKERS = 4  # Tage, die gleichzeitig heruntergeladen werden
+BACKFILL_DB_WORKERS = 2     # Tage, die gleichzeitig nach SQL importieren
+
+# --- Denormalisierung ---
+DENORMALIZE_MODE = "sql"    # "sql" (OUTER APPLY über denorm_queue), "frames" (pandas aus den Tages-DataFrames)
@@ -0,0 +1,369 @@
+"""Versionierte Schema-Migrationen für die Pipeline-Tabellen.
+
+Die normalisierten Tabellen kommen weiterhin aus sql/schema.sql. Alles,
+was die Pipeline darüber hinaus braucht (search_documents, Queues, Ledger,
+Indizes für die Arbeits-Queues), ist hier als fortlaufend nummerierte
+Migration hinterlegt. Angewendete Versionen stehen in schema_migrations.
+
+Jede Migration läuft in einer eigenen Transaktion; die Statements werden
+einzeln ausgeführt (entspricht den GO-Batches der .sql-Dateien).
+
+Usage:
+  python run_pipeline.py --migrate         # Offene Migrationen anwenden
+  python run_pipeline.py --verify-schema   # Stand prüfen (Exit-Code 1 bei Abweichung)
+"""
+import logging
+import db
+
+logger = logging.getLogger(__name__)
+
+
+MIGRATIONS = [
+    {
+        "version": 1,
+        "name": "search_documents",
+        # Bestehende Datenbanken haben die Tabelle schon (ohne DDL angelegt)
+        "statements": ["""
+            IF OBJECT_ID('search_documents') IS NULL
+            CREATE TABLE search_documents (
+                id VARCHAR(120) NOT NULL,
+                notice_identifier VARCHAR(100) NOT NULL,
+                notice_version VARCHAR(10) NOT NULL,
+                title NVARCHAR(MAX),
+                description NVARCHAR(MAX),
+                buyer_name NVARCHAR(500),
+                buyer_city NVARCHAR(200),
+                buyer_post_code VARCHAR(20),
+                contract_nature VARCHAR(20),
+                publication_date DATETIME2,
+                deadline DATETIME2,
+                estimated_value DECIMAL(15,2),
+                document_url VARCHAR(300),
+                cpv_code_main VARCHAR(20),
+                all_cpv_codes NVARCHAR(MAX),
+                procedure_type VARCHAR(50),
+                embedding_text NVARCHAR(MAX),
+                embedding_hash CHAR(64),
+                lat DECIMAL(10, 8),
+                lng DECIMAL(11, 8),
+                updated_at DATETIME2,
+                indexed_at DATETIME2,
+
+                CONSTRAINT PK_search_documents PRIMARY KEY (id)
+            )
+        """],
+        "tables": ["search_documents"],
+    },
+    {
+        "version": 2,
+        "name": "import_ledger",
+        "statements": ["""
+            IF OBJECT_ID('import_ledger') IS NULL
+            CREATE TABLE import_ledger (
+                source VARCHAR(50) NOT NULL,
+                import_date DATE NOT NULL,
+                table_name VARCHAR(50) NOT NULL,
+                content_hash VARCHAR(64) NOT NULL,
+                row_count INT NOT NULL,
+                imported INT NOT NULL,
+                skipped_dupes INT NOT NULL,
+                errors INT NOT NULL,
+                duration_ms INT NOT NULL,
+                imported_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+
+                CONSTRAINT PK_import_ledger PRIMARY KEY (source, import_date, table_name)
+            )
+        """],
+        "tables": ["import_ledger"],
+    },
+    {
+        "version": 3,
+        "name": "denorm_queue",
+        "statements": [
+            """
+            IF OBJECT_ID('denorm_queue') IS NULL
+            CREATE TABLE denorm_queue (
+                notice_identifier VARCHAR(100) NOT NULL,
+                notice_version VARCHAR(10) NOT NULL,
+                enqueued_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+
+                CONSTRAINT PK_denorm_queue PRIMARY KEY (notice_identifier, notice_version)
+            )
+            """,
+            # Bestehende Notices ohne Suchdokument einmalig nachziehen
+            """
+            INSERT INTO denorm_queue (notice_identifier, notice_version)
+            SELECT n.notice_identifier, n.notice_version
+            FROM notices n
+            WHERE n.notice_type LIKE 'cn-%'
+              AND NOT EXISTS (
+                  SELECT 1 FROM search_documents sd
+                  WHERE sd.id = CONCAT(n.notice_identifier, '-', n.notice_version)
+              )
+              AND NOT EXISTS (
+                  SELECT 1 FROM denorm_queue q
+                  WHERE q.notice_identifier = n.notice_identifier
+                    AND q.notice_version = n.notice_version
+              )
+            """,
+        ],
+        "tables": ["denorm_queue"],
+    },
+    {
+        "version": 4,
+        "name": "search_deletions",
+        "statements": [
+            """
+            IF OBJECT_ID('search_deletions') IS NULL
+            CREATE TABLE search_deletions (
+                id VARCHAR(120) NOT NULL,
+                enqueued_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+
+                CONSTRAINT PK_search_deletions PRIMARY KEY (id)
+            )
+            """,
+            # Altbestand: ältere Versionen entfernen und zum Löschen vormerken
+            # (gleiches Vorgehen wie denormalizer.collapse_versions())
+            """
+            DECLARE @removed TABLE (id VARCHAR(120), indexed_at DATETIME2);
+
+            WITH ranked AS (
+                SELECT id, indexed_at, ROW_NUMBER() OVER (
+                    PARTITION BY notice_identifier
+                    ORDER BY RIGHT(REPLICATE('0', 10) + notice_version, 10) DESC
+                ) AS version_rank
+                FROM search_documents
+            )
+            DELETE FROM ranked
+            OUTPUT deleted.id, deleted.indexed_at INTO @removed
+            WHERE version_rank > 1;
+
+            INSERT INTO search_deletions (id)
+            SELECT r.id FROM @removed r
+            WHERE r.indexed_at IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM search_deletions d WHERE d.id = r.id);
+            """,
+        ],
+        "tables": ["search_deletions"],
+    },
+    {
+        "version": 5,
+        "name": "work_queue_indexes",
+        "statements": [
+            # Ein Dokument pro Notice; trägt auch den MERGE der Denormalisierung
+            """
+            CREATE UNIQUE INDEX ux_search_documents_notice
+                ON search_documents(notice_identifier) INCLUDE (notice_version, indexed_at)
+            """,
+            # denormalizer._update_embedding_texts: Keyset über id
+            """
+            CREATE INDEX ix_search_documents_pending_text
+                ON search_documents(id) WHERE embedding_text IS NULL
+            """,
+            # enricher.geocode_new_records
+            """
+            CREATE INDEX ix_search_documents_pending_geo
+                ON search_documents(id) INCLUDE (buyer_post_code, buyer_city)
+                WHERE lat IS NULL
+            """,
+            # embedder: offene Dokumente in updated_at-Reihenfolge
+            """
+            CREATE INDEX ix_search_documents_pending_index
+                ON search_documents(updated_at, id) INCLUDE (embedding_hash)
+                WHERE indexed_at IS NULL AND embedding_text IS NOT NULL
+            """,
+            # Cutoff-DELETE der Denormalisierung und FIFO-Abarbeitung der Löschungen
+            "CREATE INDEX ix_denorm_queue_enqueued ON denorm_queue(enqueued_at)",
+            "CREATE INDEX ix_search_deletions_enqueued ON search_deletions(enqueued_at)",
+        ],
+        "indexes": {
+            "search_documents": [
+                "ux_search_documents_notice",
+                "ix_search_documents_pending_text",
+                "ix_search_documents_pending_geo",
+                "ix_search_documents_pending_index",
+            ],
+            "denorm_queue": ["ix_denorm_queue_enqueued"],
+            "search_deletions": ["ix_search_deletions_enqueued"],
+        },
+    },
+    {
+        "version": 6,
+        "name": "notices_document_id",
+        # Persistierter Schlüssel statt CONCAT(...) im Anti-Join gegen search_documents
+        "statements": [
+            """
+            ALTER TABLE notices ADD document_id AS
+                CAST(CONCAT(notice_identifier, '-', notice_version) AS VARCHAR(120)) PERSISTED
+            """,
+            "CREATE INDEX ix_notices_document_id ON notices(document_id) INCLUDE (notice_type)",
+        ],
+        "indexes": {"notices": ["ix_notices_document_id"]},
+    },
+    {
+        "version": 7,
+        "name": "plz_prefix_centroids",
+        # Befüllt von Migration 10 und run_pipeline.py --build-gazetteer
+        "statements": ["""
+            IF OBJECT_ID('plz_prefix_centroids') IS NULL
+            CREATE TABLE plz_prefix_centroids (
+                prefix VARCHAR(3) NOT NULL,
+                lat DECIMAL(10, 8) NOT NULL,
+                lng DECIMAL(11, 8) NOT NULL,
+                plz_count INT NOT NULL,
+
+                CONSTRAINT PK_plz_prefix_centroids PRIMARY KEY (prefix)
+            )
+        """],
+        "tables": ["plz_prefix_centroids"],
+    },
+    {
+        "version": 8,
+        "name": "search_vectors",
+        # Content-adressiert wie der lokale Vektor-Cache: gleicher Text → eine Zeile,
+        # unabhängig von Dokument-id und Version. Vektor als gepacktes float16.
+        "statements": ["""
+            IF OBJECT_ID('search_vectors') IS NULL
+            CREATE TABLE search_vectors (
+                embedding_hash CHAR(64) NOT NULL,
+                model VARCHAR(100) NOT NULL,
+                dims SMALLINT NOT NULL,
+                vector VARBINARY(8000) NOT NULL,
+                created_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+
+                CONSTRAINT PK_search_vectors PRIMARY KEY (embedding_hash, model, dims)
+            )
+        """],
+        "tables": ["search_vectors"],
+    },
+    {
+        "version": 9,
+        "name": "pending_index_by_id",
+        # embedder.iter_pending paginiert nur noch über id: updated_at (GETDATE,
+        # 1/300 s) lässt sich über pyodbc nicht verlustfrei als Keyset zurückgeben
+        "statements": ["""
+            CREATE INDEX ix_search_documents_pending_index
+                ON search_documents(id) INCLUDE (embedding_hash)
+                WHERE indexed_at IS NULL AND embedding_text IS NOT NULL
+                WITH (DROP_EXISTING = ON)
+        """],
+        "indexes": {"search_documents": ["ix_search_documents_pending_index"]},
+    },
+    {
+        "version": 10,
+        "name": "plz_prefix_centroids_fill",
+        # Einmalig befüllen; danach nur noch über --build-gazetteer neu aufbauen,
+        # damit das Geocoding nicht bei jedem Lauf plz_coordinates scannt
+        "statements": ["""
+            IF OBJECT_ID('plz_coordinates') IS NOT NULL
+               AND NOT EXISTS (SELECT 1 FROM plz_prefix_centroids)
+            INSERT INTO plz_prefix_centroids (prefix, lat, lng, plz_count)
+            SELECT prefix, AVG(lat), AVG(lng), COUNT(*)
+            FROM plz_coordinates
+            CROSS APPLY (VALUES (LEFT(plz, 2)), (LEFT(plz, 3))) p(prefix)
+            WHERE lat IS NOT NULL AND lng IS NOT NULL
+            GROUP BY prefix
+        """],
+    },
+]
+
+
+def _ensure_table(cursor):
+    cursor.execute("""
+        IF OBJECT_ID('schema_migrations') IS NULL
+        CREATE TABLE schema_migrations (
+            version INT NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            applied_at DATETIME2 NOT NULL DEFAULT SYSUTCDATETIME(),
+
+            CONSTRAINT PK_schema_migrations PRIMARY KEY (version)
+        )
+    """)
+
+
+def applied_versions() -> set[int]:
+    """Bereits angewendete Migrationen (leer, wenn schema_migrations fehlt)."""
+    if db.fetch_all("SELECT OBJECT_ID('schema_migrations')")[0][0] is None:
+        return set()
+    return {r[0] for r in db.fetch_all("SELECT version FROM schema_migrations")}
+
+
+def pending() -> list[dict]:
+    """Noch nicht angewendete Migrationen in Reihenfolge."""
+    done = applied_versions()
+    return [m for m in MIGRATIONS if m["version"] not in done]
+
+
+def apply() -> int:
+    """Wendet alle offenen Migrationen an.
+
+    Returns:
+        Anzahl angewendeter Migrationen
+    """
+    engine = db.get_engine()
+    raw_conn = engine.raw_connection()
+    cursor = raw_conn.cursor()
+    try:
+        _ensure_table(cursor)
+        raw_conn.commit()
+
+        todo = pending()
+        for migration in todo:
+            logger.info(f"Migration {migration['version']:03d}: {migration['name']}")
+            try:
+                for statement in migration["statements"]:
+                    cursor.execute(statement)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (?, ?)",
+                    migration["version"], migration["name"],
+                )
+                raw_conn.commit()
+            except Exception:
+                raw_conn.rollback()
+                logger.error(f"Migration {migration['version']:03d} fehlgeschlagen")
+                raise
+    finally:
+        cursor.close()
+        raw_conn.close()
+
+    if todo:
+        logger.info(f"Schema: {len(todo)} Migrationen angewendet")
+    else:
+        logger.info("Schema: aktuell")
+    return len(todo)
+
+
+def verify() -> list[str]:
+    """Prüft, ob alle Migrationen angewendet sind und ihre Objekte existieren.
+
+    Returns:
+        Liste der Abweichungen (leer = Schema aktuell)
+    """
+    problems = [f"Migration {m['version']:03d} ({m['name']}) nicht angewendet" for m in pending()]
+
+    existing = {
+        (r[0], r[1])
+        for r in db.fetch_all("""
+            SELECT OBJECT_NAME(i.object_id), i.name
+            FROM sys.indexes i
+            JOIN sys.tables t ON t.object_id = i.object_id
+        """)
+    }
+    tables = {table for table, _ in existing}
+    missing = []
+    for migration in MIGRATIONS:
+        for table in migration.get("tables", []):
+            if table not in tables:
+                missing.append(f"Tabelle {table} fehlt")
+        for table, indexes in migration.get("indexes", {}).items():
+            for index in indexes:
+                if (table, index) not in existing:
+                    missing.append(f"Index {table}.{index} fehlt")
+    # Neu angelegte Indizes (DROP_EXISTING) stehen in mehreren Migrationen
+    problems += list(dict.fromkeys(missing))
+
+    for problem in problems:
+        logger.warning(f"Schema: {problem}")
+    if not problems:
+        logger.info(f"Schema: aktuell (Version {MIGRATIONS[-1]['version']:03d})")
+    return problems
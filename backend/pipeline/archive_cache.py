@@ -0,0 +1,199 @@
+"""Lokaler Cache für heruntergeladene Tages-Exporte.
+
+Layout: <root>/<source>/<YYYY-MM-DD>/<sha256>.zip
+Tage ohne Daten (Wochenende/Feiertag) werden als leere Marker-Datei
+NO_DATA abgelegt, damit auch sie keinen Request mehr kosten.
+Überschreitet der Cache config.ARCHIVE_CACHE_MAX_MB, werden die am
+längsten nicht gelesenen Archive gelöscht (LRU über mtime).
+
+Die Quelle exportiert Tage bei Korrekturen neu. Deshalb hat jeder Tag eine
+META.json mit ETag/Last-Modified der Antwort und dem Zeitpunkt der letzten
+Prüfung. Nach config.ARCHIVE_CACHE_REVALIDATE_HOURS gilt der Eintrag als
+veraltet und wird per Conditional GET geprüft (304 = unverändert).
+Gespeichert werden nur Archive, die sich als ZIP vollständig lesen lassen.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import zipfile
+import zlib
+from collections.abc import Iterable
+from datetime import date
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+NO_DATA_MARKER = "NO_DATA"
+META_FILE = "META.json"
+
+
+class ArchiveCache:
+    """Content-adressierter Datei-Cache für Roh-Archive (csv.zip).
+
+    Args:
+        root: Basisverzeichnis
+        max_bytes: Obergrenze für alle Archive
+        revalidate_after: Sekunden, nach denen ein Tag erneut geprüft wird
+            (None = nie)
+    """
+
+    def __init__(self, root: Path, max_bytes: int, revalidate_after: float | None = None):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.revalidate_after = revalidate_after
+
+    def _day_dir(self, source: str, target_date: date) -> Path:
+        return self.root / source / target_date.isoformat()
+
+    def lookup(self, source: str, target_date: date) -> Path | None:
+        """Gibt das gecachte Archiv für den Tag zurück (und markiert es als benutzt)."""
+        day_dir = self._day_dir(source, target_date)
+        if not day_dir.is_dir():
+            return None
+        archives = sorted(day_dir.glob("*.zip"), key=lambda p: p.stat().st_mtime, reverse=True)
+        if not archives:
+            return None
+        os.utime(archives[0])
+        return archives[0]
+
+    def _meta(self, source: str, target_date: date) -> dict:
+        try:
+            return json.loads((self._day_dir(source, target_date) / META_FILE).read_text())
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def validators(self, source: str, target_date: date) -> dict:
+        """ETag/Last-Modified der gecachten Antwort (für Conditional Requests)."""
+        meta = self._meta(source, target_date)
+        return {k: meta[k] for k in ("etag", "last_modified") if meta.get(k)}
+
+    def mark_checked(self, source: str, target_date: date, validators: dict | None = None):
+        """Vermerkt eine Prüfung beim Server (optional mit neuen Validatoren)."""
+        day_dir = self._day_dir(source, target_date)
+        day_dir.mkdir(parents=True, exist_ok=True)
+        meta = self._meta(source, target_date)
+        if validators is not None:
+            meta = {k: v for k, v in validators.items() if v}
+        meta["checked_at"] = time.time()
+        tmp = day_dir / (META_FILE + ".tmp")
+        tmp.write_text(json.dumps(meta))
+        os.replace(tmp, day_dir / META_FILE)
+
+    def is_stale(self, source: str, target_date: date) -> bool:
+        """True, wenn der Tag beim Server neu geprüft werden sollte."""
+        if self.revalidate_after is None:
+            return False
+        checked_at = self._meta(source, target_date).get("checked_at", 0)
+        return time.time() - checked_at > self.revalidate_after
+
+    def is_empty_day(self, source: str, target_date: date) -> bool:
+        """True wenn für den Tag bekannt ist, dass es keine Daten gibt."""
+        return (self._day_dir(source, target_date) / NO_DATA_MARKER).exists()
+
+    def mark_empty(self, source: str, target_date: date):
+        """Merkt sich, dass der Tag keine Daten hat."""
+        day_dir = self._day_dir(source, target_date)
+        day_dir.mkdir(parents=True, exist_ok=True)
+        (day_dir / NO_DATA_MARKER).touch()
+        self.mark_checked(source, target_date, {})
+
+    def store(self, source: str, target_date: date, chunks: Iterable[bytes],
+              validators: dict | None = None) -> Path:
+        """Schreibt einen Download chunkweise in den Cache.
+
+        Der SHA-256 wird beim Schreiben berechnet; ältere Archive desselben
+        Tages (z.B. vor einem Re-Export) werden ersetzt. Abgebrochene oder
+        beschädigte Downloads (kein lesbares ZIP) werden verworfen.
+
+        Raises:
+            zipfile.BadZipFile: Download ist kein vollständiges ZIP
+
+        Returns:
+            Pfad des gespeicherten Archivs
+        """
+        day_dir = self._day_dir(source, target_date)
+        day_dir.mkdir(parents=True, exist_ok=True)
+
+        digest = hashlib.sha256()
+        fd, tmp_name = tempfile.mkstemp(dir=day_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    digest.update(chunk)
+            check_zip(tmp_name)
+            target = day_dir / f"{digest.hexdigest()}.zip"
+            os.replace(tmp_name, target)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+
+        for old in day_dir.glob("*.zip"):
+            if old != target:
+                _remove(old)
+        (day_dir / NO_DATA_MARKER).unlink(missing_ok=True)
+        self.mark_checked(source, target_date, validators or {})
+
+        self.evict(keep=target)
+        return target
+
+    def evict(self, keep: Path | None = None) -> int:
+        """Löscht die am längsten ungenutzten Archive bis max_bytes erreicht ist.
+
+        Returns:
+            Anzahl gelöschter Archive
+        """
+        entries = []
+        for path in self.root.glob("*/*/*.zip"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            if _remove(path):
+                total -= size
+                removed += 1
+
+        if removed:
+            logger.info(f"Archiv-Cache: {removed} Archive verdrängt ({total / (1024 * 1024):.0f} MB)")
+        return removed
+
+
+def check_zip(f):
+    """Prüft Pfad oder Datei-Objekt auf ein vollständiges ZIP (CRC aller Member).
+
+    Raises:
+        zipfile.BadZipFile: Kein ZIP, abgeschnitten oder CRC-Fehler
+    """
+    if not zipfile.is_zipfile(f):
+        raise zipfile.BadZipFile("kein ZIP-Archiv (abgeschnittener Download?)")
+    try:
+        with zipfile.ZipFile(f) as zf:
+            bad = zf.testzip()
+    except (zlib.error, EOFError) as e:
+        # Beschädigte Deflate-Daten meldet zipfile nicht als BadZipFile
+        raise zipfile.BadZipFile(f"beschädigte Daten: {e}") from e
+    if bad is not None:
+        raise zipfile.BadZipFile(f"CRC-Fehler in {bad}")
+    if hasattr(f, "seek"):
+        f.seek(0)
+
+
+def _remove(path: Path) -> bool:
+    """Löscht eine Datei; geöffnete/bereits gelöschte Dateien werden übersprungen."""
+    try:
+        path.unlink()
+        return True
+    except OSError:
+        return False
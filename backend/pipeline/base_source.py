@@ -3,10 +3,14 @@
 Neue Quellen (TED, Bund.de, etc.) implementieren diese Klasse.
 """
 from abc import ABC, abstractmethod
+from collections.abc import Iterator, Mapping
 from datetime import date
 from pathlib import Path
 import pandas as pd
 
+# Zeilen pro Chunk beim Streaming-Import
+DEFAULT_CHUNK_SIZE = 50_000
+
 
 class TenderSource(ABC):
     """Interface für eine Ausschreibungs-Datenquelle."""
@@ -17,15 +21,74 @@ class TenderSource(ABC):
         """Eindeutiger Name der Quelle (z.B. 'oeffentlichevergabe')."""
 
     @abstractmethod
-    def fetch(self, target_date: date) -> dict[str, pd.DataFrame]:
+    def fetch(self, target_date: date) -> Mapping[str, pd.DataFrame]:
         """Lädt Daten für einen Tag herunter.
 
         Returns:
-            Dict mit Tabellennamen → DataFrame, z.B.:
+            Mapping mit Tabellennamen → DataFrame, z.B.:
             {'notice': df_notices, 'purpose': df_purposes, ...}
             Leeres Dict wenn keine Daten verfügbar (Wochenende etc.)
+            Das Mapping darf DataFrames lazy erzeugen; hat es eine
+            close()-Methode, ruft die Pipeline sie nach dem Import auf.
         """
 
     @abstractmethod
     def get_import_order(self) -> list[str]:
         """Reihenfolge der Tabellen für den Import (FK-Abhängigkeiten)."""
+
+    def get_import_dependencies(self) -> dict[str, list[str]]:
+        """FK-Abhängigkeiten: Tabelle → Tabellen, die vorher fertig sein müssen.
+
+        Default: strikte Kette entlang get_import_order() (kein paralleler
+        Import). Quellen mit unabhängigen Tabellen geben einen flacheren
+        Graphen zurück.
+        """
+        order = self.get_import_order()
+        return {name: order[:i] for i, name in enumerate(order)}
+
+    def table_hashes(self, target_date: date) -> dict[str, str]:
+        """Content-Hash pro Tabelle für einen Tag (für das Import-Ledger).
+
+        Default: leer, d.h. die Quelle unterstützt kein Überspringen
+        unveränderter Tage und wird immer vollständig importiert.
+        """
+        return {}
+
+    def iter_chunks(self, target_date: date, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                    tables: list[str] | None = None) -> Iterator[tuple[str, pd.DataFrame]]:
+        """Liefert (Tabelle, Chunk)-Paare in FK-Reihenfolge.
+
+        Default-Adapter über fetch(). Quellen mit sehr großen Exporten können
+        das überschreiben und Chunks direkt aus dem Download erzeugen, ohne
+        eine Tabelle je vollständig im Speicher zu halten.
+
+        Args:
+            tables: Nur diese Tabellen liefern (Default: alle)
+        """
+        order = [t for t in self.get_import_order() if tables is None or t in tables]
+        yield from iter_table_chunks(self.fetch(target_date), order, chunk_size)
+
+
+def iter_table_chunks(data: Mapping[str, pd.DataFrame], import_order: list[str],
+                      chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[tuple[str, pd.DataFrame]]:
+    """Zerlegt ein Tabellen-Mapping in (Tabelle, Chunk)-Paare in FK-Reihenfolge.
+
+    Bietet das Mapping iter_chunks(csv_name, chunk_size) an (CsvZipArchive,
+    LakeTables), wird direkt daraus gestreamt, sonst werden die DataFrames
+    geslict. Jede vorhandene Tabelle liefert mindestens einen (ggf. leeren)
+    Chunk. Das Mapping wird am Ende geschlossen, falls es close() hat.
+    """
+    try:
+        for csv_name in import_order:
+            if csv_name not in data:
+                continue
+            if hasattr(data, "iter_chunks"):
+                for chunk in data.iter_chunks(csv_name, chunk_size):
+                    yield csv_name, chunk
+                continue
+            df = data[csv_name]
+            for start in range(0, max(len(df), 1), chunk_size):
+                yield csv_name, df.iloc[start : start + chunk_size]
+    finally:
+        if hasattr(data, "close"):
+            data.close()
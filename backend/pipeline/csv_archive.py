@@ -0,0 +1,152 @@
+"""Lazy Zugriff auf die CSV-Tabellen eines ZIP-Exports.
+
+Das Archiv liegt als Datei-Objekt vor (SpooledTemporaryFile oder Datei auf
+Platte). Ein CSV-Member wird erst geparst, wenn der Importer danach fragt,
+und danach nicht im Speicher gehalten.
+
+Sind für eine Tabelle Spalten bekannt, werden nur diese gelesen, und zwar
+als Strings (PLZ bleibt '01067' statt 1067.0). Typisierung macht der
+Importer. Geparst wird mit pyarrow (multi-threaded), falls installiert.
+"""
+import logging
+import zipfile
+from collections.abc import Mapping
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # pyarrow ist optional
+    pa = None
+    pa_csv = None
+
+logger = logging.getLogger(__name__)
+
+
+def _arrow_options(usecols: list[str]) -> dict:
+    """pyarrow-Optionen: nur usecols, alle als String, Zeilenumbrüche in Werten erlaubt."""
+    return {
+        "parse_options": pa_csv.ParseOptions(newlines_in_values=True),
+        "convert_options": pa_csv.ConvertOptions(
+            include_columns=usecols,
+            include_missing_columns=True,
+            column_types={c: pa.string() for c in usecols},
+            strings_can_be_null=True,
+        ),
+    }
+
+
+def read_csv(f, usecols: list[str] | None = None) -> pd.DataFrame:
+    """Liest eine CSV; mit usecols nur diese Spalten, alle als String.
+
+    Fehlende Spalten aus usecols werden bei pyarrow als NULL-Spalte ergänzt,
+    beim pandas-Fallback weggelassen (der Importer behandelt beides als NULL).
+    """
+    if usecols is None:
+        return pd.read_csv(f)
+
+    if pa_csv is not None:
+        return pa_csv.read_csv(f, **_arrow_options(usecols)).to_pandas()
+
+    wanted = set(usecols)
+    return pd.read_csv(f, usecols=lambda c: c in wanted, dtype=str)
+
+
+def iter_csv(f, usecols: list[str] | None, chunk_size: int):
+    """Wie read_csv, liefert aber DataFrames mit höchstens chunk_size Zeilen.
+
+    Liefert mindestens einen (ggf. leeren) Chunk.
+    """
+    if usecols is not None and pa_csv is not None:
+        reader = pa_csv.open_csv(f, **_arrow_options(usecols))
+        pending, pending_rows, yielded = [], 0, False
+        for batch in reader:
+            pending.append(batch)
+            pending_rows += batch.num_rows
+            while pending_rows >= chunk_size:
+                table = pa.Table.from_batches(pending, schema=reader.schema)
+                yield table.slice(0, chunk_size).to_pandas()
+                yielded = True
+                rest = table.slice(chunk_size)
+                pending, pending_rows = rest.to_batches(), rest.num_rows
+        if pending_rows or not yielded:
+            yield pa.Table.from_batches(pending, schema=reader.schema).to_pandas()
+        return
+
+    if usecols is None:
+        reader = pd.read_csv(f, chunksize=chunk_size)
+    else:
+        wanted = set(usecols)
+        reader = pd.read_csv(f, usecols=lambda c: c in wanted, dtype=str, chunksize=chunk_size)
+    yielded = False
+    with reader:
+        for chunk in reader:
+            yielded = True
+            yield chunk
+    if not yielded:
+        yield pd.DataFrame(columns=usecols or [])
+
+
+class CsvZipArchive(Mapping):
+    """Mapping CSV-Name → DataFrame über einem geöffneten ZIP-Archiv.
+
+    Args:
+        fileobj: Lesbares Datei-Objekt mit dem ZIP
+        columns: Optional CSV-Name → benötigte Spalten (Column-Pruning)
+    """
+
+    def __init__(self, fileobj, columns: dict[str, list[str]] | None = None):
+        self._file = fileobj
+        self._columns = columns or {}
+        self._zip = zipfile.ZipFile(fileobj)
+        self._members = {
+            f.replace(".csv", ""): f for f in self._zip.namelist() if f.endswith(".csv")
+        }
+        self.row_counts: dict[str, int] = {}
+
+    def __getitem__(self, csv_name: str) -> pd.DataFrame:
+        filename = self._members[csv_name]
+        with self._zip.open(filename) as f:
+            df = read_csv(f, self._columns.get(csv_name))
+        self.row_counts[csv_name] = len(df)
+        logger.info(f"  {csv_name}: {len(df)} Zeilen")
+        return df
+
+    def iter_chunks(self, csv_name: str, chunk_size: int):
+        """Streamt eine CSV in Chunks, ohne sie vollständig zu parsen."""
+        filename = self._members[csv_name]
+        rows = 0
+        with self._zip.open(filename) as f:
+            for chunk in iter_csv(f, self._columns.get(csv_name), chunk_size):
+                rows += len(chunk)
+                yield chunk
+        self.row_counts[csv_name] = rows
+        logger.info(f"  {csv_name}: {rows} Zeilen")
+
+    def table_hashes(self) -> dict[str, str]:
+        """CRC32 + Größe jedes CSV-Members aus dem ZIP-Verzeichnis (ohne Entpacken)."""
+        hashes = {}
+        for csv_name, filename in self._members.items():
+            info = self._zip.getinfo(filename)
+            hashes[csv_name] = f"crc32:{info.CRC:08x}:{info.file_size}"
+        return hashes
+
+    def __contains__(self, csv_name) -> bool:
+        return csv_name in self._members
+
+    def __iter__(self):
+        return iter(self._members)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    def close(self):
+        """Schließt ZIP und zugrunde liegende Datei."""
+        self._zip.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,17 +1,26 @@
 """Denormalisierung: 9 normalisierte Tabellen → search_documents.
 
 Baut die flache Suchtabelle aus den normalisierten Tabellen auf.
-Nur neue Notices die noch nicht in search_documents sind werden verarbeitet.
+Verarbeitet werden nur Notices aus denorm_queue, die der Import des
+aktuellen Laufs dort vormerkt (Tabellen: migrations.py).
 """
 import hashlib
 import logging
+import time
+from collections.abc import Iterable, Iterator
+import pandas as pd
+import config
 import db
+from pipeline import importer
 
 logger = logging.getLogger(__name__)
 
 
 def _build_embedding_text(title, description, buyer_name, buyer_city, cpv, nature):
-    """Baut den Text der embedded wird."""
+    """Baut den Text der embedded wird.
+
+    Skalare Referenz für build_embedding_texts (tests/test_denormalizer.py).
+    """
     parts = []
     if title:
         parts.append(f"Ausschreibung: {title}")
@@ -30,121 +39,638 @@ def _build_embedding_text(title, description, buyer_name, buyer_city, cpv, natur
     return "\n".join(parts)
 
 
-def refresh():
-    """Füllt search_documents mit neuen Notices aus den normalisierten Tabellen.
+def _version_key(column: str) -> str:
+    """Sortierbarer Versions-Ausdruck ('2' < '10'), links mit Nullen aufgefüllt."""
+    return f"RIGHT(REPLICATE('0', 10) + {column}, 10)"
+
+
+# (Präfix, Spalte) in der Reihenfolge von _build_embedding_text
+_TEXT_PARTS = [
+    ("Ausschreibung: ", "title"),
+    ("Beschreibung: ", "description"),
+    ("Auftraggeber: ", "buyer_name"),
+    ("Ort: ", "buyer_city"),
+    ("CPV: ", "cpv_code_main"),
+    ("Art: ", "contract_nature"),
+]
 
-    Nur Notices mit notice_type='competition' und die noch nicht in search_documents sind.
+
+def build_embedding_texts(docs: pd.DataFrame) -> pd.Series:
+    """Spaltenweises Äquivalent zu _build_embedding_text für viele Dokumente.
+
+    Erwartet die Spalten title, description, buyer_name, buyer_city,
+    cpv_code_main und contract_nature; liefert exakt dieselben Texte.
     """
-    # Neue Notices finden die noch nicht denormalisiert wurden
-    count_before = db.fetch_all("SELECT COUNT(*) FROM search_documents")[0][0]
+    parts = []
+    for prefix, column in _TEXT_PARTS:
+        # Beschreibung auf ~2000 Zeichen kürzen für Embedding
+        limit = 2000 if column == "description" else None
+        # Fehlende Werte kommen je nach dtype als None, pd.NA oder NaN (NaN != NaN)
+        parts.append([prefix + str(v)[:limit]
+                      if v is not None and v is not pd.NA and v == v and v != "" else None
+                      for v in docs[column].tolist()])
+    # Teile einmal pro Zeile verbinden statt Series wiederholt zu verketten
+    texts = ["\n".join(filter(None, row)) for row in zip(*parts)]
+    return pd.Series(texts, index=docs.index, dtype=object)
 
-    db.execute("""
-        INSERT INTO search_documents (
-            id, notice_identifier, notice_version, title, description,
-            buyer_name, buyer_city, buyer_post_code, contract_nature,
-            publication_date, deadline, estimated_value, document_url,
-            cpv_code_main, all_cpv_codes, procedure_type,
-            embedding_text, embedding_hash, updated_at
-        )
-        SELECT
-            CONCAT(n.notice_identifier, '-', n.notice_version) AS id,
-            n.notice_identifier,
-            n.notice_version,
-            p.title,
-            p.description,
-            o.organisation_name AS buyer_name,
-            o.organisation_city AS buyer_city,
-            o.organisation_post_code AS buyer_post_code,
-            p.main_nature AS contract_nature,
-            n.publication_date,
-            st.public_opening_date AS deadline,
-            p.estimated_value,
-            CONCAT('https://oeffentlichevergabe.de/ui/de/tender/', n.notice_identifier) AS document_url,
-            c.main_classification_code AS cpv_code_main,
-            c.additional_classification_codes AS all_cpv_codes,
-            pr.procedure_type,
-            -- Embedding text: wird in Python nachbearbeitet
-            NULL AS embedding_text,
-            NULL AS embedding_hash,
-            GETDATE() AS updated_at
+
+def embedding_hashes(texts: pd.Series) -> list[str]:
+    """SHA-256 (hex) je Embedding-Text."""
+    return [hashlib.sha256(t.encode("utf-8")).hexdigest() for t in texts]
+
+
+# Flache Dokument-Felder pro Notice aus den normalisierten Tabellen.
+# Wird auf die Notices in denorm_queue eingeschränkt.
+_DOCUMENT_COLUMNS = [
+    "title", "description", "buyer_name", "buyer_city", "buyer_post_code",
+    "contract_nature", "publication_date", "deadline", "estimated_value",
+    "document_url", "cpv_code_main", "all_cpv_codes", "procedure_type",
+]
+
+_SOURCE_SQL = f"""
+    SELECT
+        n.document_id AS id,
+        n.notice_identifier,
+        n.notice_version,
+        p.title,
+        p.description,
+        o.organisation_name AS buyer_name,
+        o.organisation_city AS buyer_city,
+        o.organisation_post_code AS buyer_post_code,
+        p.main_nature AS contract_nature,
+        n.publication_date,
+        st.public_opening_date AS deadline,
+        p.estimated_value,
+        CONCAT('https://oeffentlichevergabe.de/ui/de/tender/', n.notice_identifier) AS document_url,
+        c.main_classification_code AS cpv_code_main,
+        c.additional_classification_codes AS all_cpv_codes,
+        pr.procedure_type,
+        {_version_key('n.notice_version')} AS version_key,
+        ROW_NUMBER() OVER (
+            PARTITION BY n.notice_identifier ORDER BY {_version_key('n.notice_version')} DESC
+        ) AS version_rank
+    FROM denorm_queue q
+    JOIN notices n
+        ON n.notice_identifier = q.notice_identifier
+        AND n.notice_version = q.notice_version
+    -- Purpose: Notice-Level (lot_identifier IS NULL) bevorzugt
+    OUTER APPLY (
+        SELECT TOP 1 title, description, main_nature, estimated_value
+        FROM purposes
+        WHERE notice_identifier = n.notice_identifier
+          AND notice_version = n.notice_version
+        ORDER BY CASE WHEN lot_identifier IS NULL THEN 0 ELSE 1 END, id
+    ) p
+    -- Buyer Organisation
+    OUTER APPLY (
+        SELECT TOP 1 organisation_name, organisation_city, organisation_post_code
+        FROM organisations
+        WHERE notice_identifier = n.notice_identifier
+          AND notice_version = n.notice_version
+          AND organisation_role = 'buyer'
+        ORDER BY id
+    ) o
+    -- Haupt-CPV Code
+    OUTER APPLY (
+        SELECT TOP 1 main_classification_code, additional_classification_codes
+        FROM classifications
+        WHERE notice_identifier = n.notice_identifier
+          AND notice_version = n.notice_version
+        ORDER BY CASE WHEN lot_identifier IS NULL THEN 0 ELSE 1 END, id
+    ) c
+    -- Deadline
+    OUTER APPLY (
+        SELECT TOP 1 public_opening_date
+        FROM submission_terms
+        WHERE notice_identifier = n.notice_identifier
+          AND notice_version = n.notice_version
+        ORDER BY id
+    ) st
+    -- Procedure Type
+    LEFT JOIN procedures pr
+        ON pr.notice_identifier = n.notice_identifier
+        AND pr.notice_version = n.notice_version
+    WHERE q.enqueued_at <= @cutoff
+      AND n.notice_type LIKE 'cn-%'
+"""
+
+
+def _merge_sql(source: str, with_texts: bool = False) -> str:
+    """MERGE einer Dokument-Quelle nach search_documents, Änderungen in @changes.
+
+    Pro notice_identifier gibt es genau ein Dokument mit der neuesten Version.
+    Eine neuere Version ersetzt das bestehende Dokument in place (neue id);
+    die alte id wird, falls schon im Index, in search_deletions vorgemerkt.
+    Bei gleicher Version wird nur aktualisiert, wenn sich ein Feld tatsächlich
+    geändert hat (EXCEPT vergleicht NULL-sicher). In beiden Fällen werden
+    Koordinaten und indexed_at zurückgesetzt, damit die Folgeschritte das
+    Dokument neu verarbeiten. Ältere Versionen als die vorhandene werden
+    ignoriert.
+
+    Args:
+        source: SELECT mit id, Schlüsseln, _DOCUMENT_COLUMNS, version_key
+            und version_rank (ggf. embedding_text/embedding_hash)
+        with_texts: embedding_text/-hash aus der Quelle übernehmen statt NULL
+    """
+    cols = ", ".join(_DOCUMENT_COLUMNS)
+    insert_cols = f"id, notice_identifier, notice_version, {cols}"
+    texts = "s.embedding_text, s.embedding_hash" if with_texts else "NULL, NULL"
+    set_texts = ("embedding_text = s.embedding_text, embedding_hash = s.embedding_hash"
+                 if with_texts else "embedding_text = NULL, embedding_hash = NULL")
+    return f"""
+        DECLARE @changes TABLE (
+            action NVARCHAR(10), old_id VARCHAR(120), new_id VARCHAR(120),
+            old_indexed_at DATETIME2
+        );
+
+        WITH src AS (SELECT * FROM ({source}) ranked WHERE version_rank = 1)
+        MERGE search_documents AS t
+        USING src AS s ON t.notice_identifier = s.notice_identifier
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT ({insert_cols}, embedding_text, embedding_hash, updated_at)
+            VALUES ({", ".join(f"s.{c}" for c in insert_cols.split(", "))}, {texts}, GETDATE())
+        WHEN MATCHED AND (
+            s.version_key > {_version_key("t.notice_version")}
+            OR (s.notice_version = t.notice_version AND EXISTS (
+                SELECT {", ".join(f"s.{c}" for c in _DOCUMENT_COLUMNS)}
+                EXCEPT
+                SELECT {", ".join(f"t.{c}" for c in _DOCUMENT_COLUMNS)}
+            ))
+        ) THEN UPDATE SET
+            id = s.id, notice_version = s.notice_version,
+            {", ".join(f"{c} = s.{c}" for c in _DOCUMENT_COLUMNS)},
+            {set_texts},
+            lat = NULL, lng = NULL, indexed_at = NULL, updated_at = GETDATE()
+        OUTPUT $action, deleted.id, inserted.id, deleted.indexed_at INTO @changes;
+
+        -- Abgelöste Versionen aus dem Suchindex entfernen lassen
+        INSERT INTO search_deletions (id)
+        SELECT DISTINCT c.old_id FROM @changes c
+        WHERE c.action = 'UPDATE' AND c.old_id <> c.new_id
+          AND c.old_indexed_at IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM search_deletions d WHERE d.id = c.old_id);
+    """
+
+
+# Neue / gleiche Version geändert / durch neue Version ersetzt
+_COUNTS_SQL = """
+    SELECT
+        COALESCE(SUM(CASE WHEN action = 'INSERT' THEN 1 ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN action = 'UPDATE' AND old_id = new_id THEN 1 ELSE 0 END), 0),
+        COALESCE(SUM(CASE WHEN action = 'UPDATE' AND old_id <> new_id THEN 1 ELSE 0 END), 0)
+    FROM @changes;
+"""
+
+
+def _refresh_sql() -> str:
+    """MERGE der Queue-Notices nach search_documents; leert danach die Queue."""
+    return f"""
+        SET NOCOUNT ON;
+        DECLARE @cutoff DATETIME2 = SYSUTCDATETIME();
+        {_merge_sql(_SOURCE_SQL)}
+        DELETE FROM denorm_queue WHERE enqueued_at <= @cutoff;
+        {_COUNTS_SQL}
+    """
+
+
+def collect_keys(chunks: Iterable[tuple[str, pd.DataFrame]],
+                 keys: set) -> Iterator[tuple[str, pd.DataFrame]]:
+    """Reicht (Tabelle, Chunk)-Paare durch und sammelt dabei die Notice-Schlüssel."""
+    for csv_name, chunk in chunks:
+        keys |= importer.notice_keys(chunk)
+        yield csv_name, chunk
+
+
+def enqueue(keys: Iterable[tuple[str, str]],
+            batch_size: int = config.IMPORT_BATCH_SIZE) -> int:
+    """Schreibt Notice-Schlüssel in denorm_queue (bereits vorhandene werden aufgefrischt).
+
+    Returns:
+        Anzahl übergebener Schlüssel
+    """
+    keys = list(keys)
+    if not keys:
+        return 0
+
+    engine = db.get_engine()
+    raw_conn = engine.raw_connection()
+    cursor = raw_conn.cursor()
+    try:
+        cursor.execute("IF OBJECT_ID('tempdb..#denorm_keys') IS NOT NULL DROP TABLE #denorm_keys")
+        cursor.execute("SELECT TOP 0 notice_identifier, notice_version "
+                       "INTO #denorm_keys FROM denorm_queue")
+        cursor.fast_executemany = True
+        for i in range(0, len(keys), batch_size):
+            cursor.executemany(
+                "INSERT INTO #denorm_keys (notice_identifier, notice_version) VALUES (?, ?)",
+                keys[i : i + batch_size],
+            )
+        cursor.execute("""
+            MERGE denorm_queue AS t
+            USING (SELECT DISTINCT notice_identifier, notice_version FROM #denorm_keys) AS s
+                ON t.notice_identifier = s.notice_identifier
+               AND t.notice_version = s.notice_version
+            WHEN MATCHED THEN UPDATE SET enqueued_at = SYSUTCDATETIME()
+            WHEN NOT MATCHED THEN INSERT (notice_identifier, notice_version)
+                VALUES (s.notice_identifier, s.notice_version);
+        """)
+        cursor.execute("DROP TABLE #denorm_keys")
+        raw_conn.commit()
+    finally:
+        cursor.close()
+        raw_conn.close()
+
+    logger.info(f"Denormalisierung: {len(keys)} Notices vorgemerkt")
+    return len(keys)
+
+
+def enqueue_missing() -> int:
+    """Merkt alle Notices ohne Suchdokument vor (Vollscan, z.B. nach Migration)."""
+    sql = """
+        INSERT INTO denorm_queue (notice_identifier, notice_version)
+        SELECT n.notice_identifier, n.notice_version
         FROM notices n
-        -- Purpose: Notice-Level (lot_identifier IS NULL) bevorzugt
-        OUTER APPLY (
-            SELECT TOP 1 title, description, main_nature, estimated_value
-            FROM purposes
-            WHERE notice_identifier = n.notice_identifier
-              AND notice_version = n.notice_version
-            ORDER BY CASE WHEN lot_identifier IS NULL THEN 0 ELSE 1 END
-        ) p
-        -- Buyer Organisation
-        OUTER APPLY (
-            SELECT TOP 1 organisation_name, organisation_city, organisation_post_code
-            FROM organisations
-            WHERE notice_identifier = n.notice_identifier
-              AND notice_version = n.notice_version
-              AND organisation_role = 'buyer'
-        ) o
-        -- Haupt-CPV Code
-        OUTER APPLY (
-            SELECT TOP 1 main_classification_code, additional_classification_codes
-            FROM classifications
-            WHERE notice_identifier = n.notice_identifier
-              AND notice_version = n.notice_version
-            ORDER BY CASE WHEN lot_identifier IS NULL THEN 0 ELSE 1 END
-        ) c
-        -- Deadline
-        OUTER APPLY (
-            SELECT TOP 1 public_opening_date
-            FROM submission_terms
-            WHERE notice_identifier = n.notice_identifier
-              AND notice_version = n.notice_version
-        ) st
-        -- Procedure Type
-        LEFT JOIN procedures pr
-            ON pr.notice_identifier = n.notice_identifier
-            AND pr.notice_version = n.notice_version
         WHERE n.notice_type LIKE 'cn-%'
           AND NOT EXISTS (
               SELECT 1 FROM search_documents sd
-              WHERE sd.id = CONCAT(n.notice_identifier, '-', n.notice_version)
+              WHERE sd.id = n.document_id
           )
-    """)
+          AND NOT EXISTS (
+              SELECT 1 FROM denorm_queue q
+              WHERE q.notice_identifier = n.notice_identifier
+                AND q.notice_version = n.notice_version
+          )
+    """
+    engine = db.get_engine()
+    raw_conn = engine.raw_connection()
+    cursor = raw_conn.cursor()
+    try:
+        cursor.execute(sql)
+        queued = cursor.rowcount
+        raw_conn.commit()
+    finally:
+        cursor.close()
+        raw_conn.close()
+    return queued
+
+
+def collapse_versions() -> int:
+    """Entfernt ältere Versionen aus search_documents (Altbestand vor der Versionierung).
+
+    Behält pro notice_identifier nur die neueste Version; gelöschte ids, die
+    schon im Index waren, landen in search_deletions.
+
+    Returns:
+        Anzahl entfernter Dokumente
+    """
+    sql = f"""
+        SET NOCOUNT ON;
+        DECLARE @removed TABLE (id VARCHAR(120), indexed_at DATETIME2);
 
-    count_after = db.fetch_all("SELECT COUNT(*) FROM search_documents")[0][0]
-    new_docs = count_after - count_before
-    logger.info(f"Denormalisierung: {new_docs} neue Dokumente (gesamt: {count_after})")
+        WITH ranked AS (
+            SELECT id, indexed_at, ROW_NUMBER() OVER (
+                PARTITION BY notice_identifier ORDER BY {_version_key("notice_version")} DESC
+            ) AS version_rank
+            FROM search_documents
+        )
+        DELETE FROM ranked
+        OUTPUT deleted.id, deleted.indexed_at INTO @removed
+        WHERE version_rank > 1;
+
+        INSERT INTO search_deletions (id)
+        SELECT r.id FROM @removed r
+        WHERE r.indexed_at IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM search_deletions d WHERE d.id = r.id);
+
+        SELECT COUNT(*) FROM @removed;
+    """
+    engine = db.get_engine()
+    raw_conn = engine.raw_connection()
+    cursor = raw_conn.cursor()
+    try:
+        cursor.execute(sql)
+        removed = cursor.fetchone()[0]
+        raw_conn.commit()
+    finally:
+        cursor.close()
+        raw_conn.close()
+    return removed
+
+
+# --- Denormalisierung direkt aus den Tages-DataFrames ---
+
+_KEY = ["notice_identifier", "notice_version"]
+
+# Ziel-Spalten (SQL-Namen), die pro Quelltabelle gebraucht werden
+FRAME_COLUMNS = {
+    "notice": _KEY + ["notice_type", "publication_date"],
+    "procedure": _KEY + ["procedure_type"],
+    "purpose": _KEY + ["lot_identifier", "title", "description", "main_nature", "estimated_value"],
+    "organisation": _KEY + ["organisation_name", "organisation_city",
+                            "organisation_post_code", "organisation_role"],
+    "classification": _KEY + ["lot_identifier", "main_classification_code",
+                              "additional_classification_codes"],
+    "submissionTerms": _KEY + ["public_opening_date"],
+}
+
+
+class FrameCollector:
+    """Sammelt beim Import die Spalten, aus denen search_documents entsteht.
+
+    Werte werden wie beim Import konvertiert, damit die Dokumente exakt dem
+    entsprechen, was der SQL-Weg aus den normalisierten Tabellen lesen würde.
+    """
+
+    def __init__(self):
+        self._parts = {name: [] for name in FRAME_COLUMNS}
+
+    def tap(self, chunks: Iterable[tuple[str, pd.DataFrame]]) -> Iterator[tuple[str, pd.DataFrame]]:
+        """Reicht (Tabelle, Chunk)-Paare durch und merkt sich die benötigten Spalten."""
+        for csv_name, chunk in chunks:
+            columns = FRAME_COLUMNS.get(csv_name)
+            if columns and not chunk.empty:
+                self._parts[csv_name].append(importer.convert_frame(csv_name, chunk, columns))
+            yield csv_name, chunk
+
+    def frames(self) -> dict[str, pd.DataFrame]:
+        """Gesammelte Tabellen (leere DataFrames für Tabellen ohne Zeilen)."""
+        return {
+            name: (pd.concat(parts, ignore_index=True) if parts
+                   else pd.DataFrame(columns=FRAME_COLUMNS[name]))
+            for name, parts in self._parts.items()
+        }
+
+
+def _first_per_notice(df: pd.DataFrame, columns: dict[str, str],
+                      notice_level_first: bool = False) -> pd.DataFrame:
+    """Erste Zeile pro Notice (Dateireihenfolge), optional Notice-Level vor Losen.
+
+    Entspricht den OUTER APPLY (SELECT TOP 1 … ORDER BY …, id) im SQL-Weg:
+    die IDENTITY-Spalte id folgt beim Import der Dateireihenfolge.
+    """
+    # Zeilenposition als Gegenstück zu id (Tie-Breaker)
+    df = df.assign(_row=range(len(df)))
+    order = ["_row"]
+    if notice_level_first:
+        df = df.assign(_lot_rank=df["lot_identifier"].notna().astype(int))
+        order = ["_lot_rank", "_row"]
+    df = df.sort_values(order).drop_duplicates(_KEY, keep="first")
+    return df[_KEY + list(columns)].rename(columns=columns)
+
+
+def imported_frames(frames: dict[str, pd.DataFrame]) -> tuple[dict[str, pd.DataFrame], dict[str, int]]:
+    """Schränkt die gesammelten Tabellen auf die Zeilen ein, die der Import übernimmt.
+
+    Wie beim Import fallen Zeilen mit NULL im Notice-Schlüssel weg, bei
+    notice und procedure gewinnt die erste Zeile pro Schlüssel und alle
+    übrigen Tabellen behalten nur Zeilen zu übernommenen Notices.
+
+    Returns:
+        (gefilterte Tabellen, {Tabelle: Zeilen, die der Import ablehnen muss})
+    """
+    out, rejected = {}, {}
+    for name, df in frames.items():
+        valid = df.dropna(subset=_KEY)
+        if name == "notice":
+            valid = valid.drop_duplicates(_KEY, keep="first")
+        rejected[name] = len(df) - len(valid)
+        if name == "procedure":
+            # Dubletten zählen nicht: verwaiste procedures fallen ebenfalls darunter
+            valid = valid.drop_duplicates(_KEY, keep="first")
+        out[name] = valid.reset_index(drop=True)
+
+    notice_keys = pd.MultiIndex.from_frame(out["notice"][_KEY])
+    for name, df in out.items():
+        if name != "notice":
+            out[name] = df[pd.MultiIndex.from_frame(df[_KEY]).isin(notice_keys)].reset_index(drop=True)
+    return out, rejected
+
+
+def _import_matches(rejected: dict[str, int], import_stats: dict) -> bool:
+    """Prüft, ob der Import genau die erwarteten Zeilen abgelehnt hat.
+
+    Bei notices zählen auch Dubletten: ein schon vorhandener Schlüssel bleibt
+    in SQL unverändert, die DataFrames kennen nur die neue Zeile. Verwaiste
+    Zeilen der übrigen Tabellen gehören nie zu einer übernommenen Notice und
+    spielen für die Dokumente keine Rolle.
+    """
+    for name, expected in rejected.items():
+        stats = import_stats.get(name, {})
+        actual = stats.get("errors", 0)
+        if name == "notice":
+            actual += stats.get("skipped_dupes", 0)
+        if actual != expected:
+            logger.info(f"Import von {name} weicht von den DataFrames ab "
+                        f"({actual} statt {expected} abgelehnte Zeilen)")
+            return False
+    return True
+
+
+def build_documents(frames: dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """Baut flache Suchdokumente inkl. embedding_text/-hash aus den Tages-Tabellen.
+
+    Erwartet die mit imported_frames gefilterten Tabellen.
+    """
+    notices = frames["notice"]
+    notices = notices[notices["notice_type"].fillna("").str.startswith("cn-")]
+    docs = notices[_KEY + ["publication_date"]]
+
+    organisations = frames["organisation"]
+    parts = [
+        _first_per_notice(frames["purpose"], {
+            "title": "title", "description": "description",
+            "main_nature": "contract_nature", "estimated_value": "estimated_value",
+        }, notice_level_first=True),
+        _first_per_notice(organisations[organisations["organisation_role"] == "buyer"], {
+            "organisation_name": "buyer_name", "organisation_city": "buyer_city",
+            "organisation_post_code": "buyer_post_code",
+        }),
+        _first_per_notice(frames["classification"], {
+            "main_classification_code": "cpv_code_main",
+            "additional_classification_codes": "all_cpv_codes",
+        }, notice_level_first=True),
+        _first_per_notice(frames["submissionTerms"], {"public_opening_date": "deadline"}),
+        _first_per_notice(frames["procedure"], {"procedure_type": "procedure_type"}),
+    ]
+    for part in parts:
+        docs = docs.merge(part, on=_KEY, how="left")
+
+    docs = docs.astype(object).where(docs.notna(), None)
+    docs.insert(0, "id", docs["notice_identifier"] + "-" + docs["notice_version"])
+    docs["document_url"] = "https://oeffentlichevergabe.de/ui/de/tender/" + docs["notice_identifier"]
+    docs["embedding_text"] = build_embedding_texts(docs)
+    docs["embedding_hash"] = embedding_hashes(docs["embedding_text"])
+    return docs[["id"] + _KEY + _DOCUMENT_COLUMNS + ["embedding_text", "embedding_hash"]]
+
+
+def refresh_from_frames(collector: FrameCollector, fallback_keys: Iterable[tuple[str, str]],
+                        import_stats: dict | None = None,
+                        batch_size: int = config.IMPORT_BATCH_SIZE) -> int:
+    """Schreibt die Dokumente eines Tages direkt aus den gesammelten DataFrames.
+
+    Die Dokumente gehen per fast_executemany in eine Staging-Tabelle und
+    werden mit derselben MERGE-Logik wie refresh() übernommen; Texte und
+    Hashes sind schon berechnet. Hat der Import andere Zeilen abgelehnt als
+    erwartet (z.B. Notices, die schon in SQL stehen) oder scheitert das
+    Schreiben, werden die Notices wie im SQL-Weg in denorm_queue vorgemerkt.
+
+    Args:
+        import_stats: Ergebnis von importer.import_stream für diesen Tag
+
+    Returns:
+        Anzahl neuer + aktualisierter + ersetzter Dokumente
+    """
+    frames, rejected = imported_frames(collector.frames())
+    if import_stats is not None and not _import_matches(rejected, import_stats):
+        logger.info("Denormalisierung über denorm_queue statt aus DataFrames")
+        enqueue(fallback_keys)
+        return 0
+
+    docs = build_documents(frames)
+    if docs.empty:
+        return 0
+
+    import pyodbc
+    columns = list(docs.columns)
+    rows = list(docs.itertuples(index=False, name=None))
+    engine = db.get_engine()
+    raw_conn = engine.raw_connection()
+    cursor = raw_conn.cursor()
+    try:
+        cursor.execute("IF OBJECT_ID('tempdb..#stage_documents') IS NOT NULL DROP TABLE #stage_documents")
+        cursor.execute(f"SELECT TOP 0 {', '.join(columns)} INTO #stage_documents FROM search_documents")
+        cursor.fast_executemany = True
+        insert_sql = (f"INSERT INTO #stage_documents ({', '.join(columns)}) "
+                      f"VALUES ({', '.join('?' * len(columns))})")
+        for i in range(0, len(rows), batch_size):
+            cursor.executemany(insert_sql, rows[i : i + batch_size])
+
+        source = f"""
+            SELECT *, {_version_key("notice_version")} AS version_key,
+                ROW_NUMBER() OVER (
+                    PARTITION BY notice_identifier ORDER BY {_version_key("notice_version")} DESC
+                ) AS version_rank
+            FROM #stage_documents
+        """
+        cursor.execute(f"SET NOCOUNT ON; {_merge_sql(source, with_texts=True)} {_COUNTS_SQL}")
+        new_docs, updated_docs, superseded_docs = cursor.fetchone()
+        cursor.execute("DROP TABLE #stage_documents")
+        raw_conn.commit()
+    except pyodbc.Error as e:
+        raw_conn.rollback()
+        logger.warning(f"Denormalisierung aus DataFrames fehlgeschlagen, "
+                       f"Fallback auf denorm_queue: {str(e)[:100]}")
+        enqueue(fallback_keys)
+        return 0
+    finally:
+        cursor.close()
+        raw_conn.close()
+
+    logger.info(f"Denormalisierung (DataFrames): {new_docs} neue, {updated_docs} aktualisierte, "
+                f"{superseded_docs} durch neue Version ersetzte Dokumente")
+    return new_docs + updated_docs + superseded_docs
+
+
+def refresh(full: bool = False) -> int:
+    """Denormalisiert die Notices aus denorm_queue nach search_documents.
+
+    Es werden nur die seit dem letzten Lauf importierten Notices betrachtet
+    (nur notice_type 'cn-%'); die Kosten wachsen mit dem Tages-Delta, nicht
+    mit der Gesamtzahl der Notices. Die Queue wird danach geleert.
+
+    Args:
+        full: Vorher alte Versionen zusammenführen und alle Notices ohne
+            Suchdokument vormerken (alter Vollscan)
+
+    Returns:
+        Anzahl neuer + aktualisierter + ersetzter Dokumente
+    """
+    if full:
+        logger.info(f"Denormalisierung: {collapse_versions()} alte Versionen entfernt")
+        logger.info(f"Denormalisierung: {enqueue_missing()} fehlende Notices vorgemerkt")
+
+    engine = db.get_engine()
+    raw_conn = engine.raw_connection()
+    cursor = raw_conn.cursor()
+    try:
+        cursor.execute(_refresh_sql())
+        new_docs, updated_docs, superseded_docs = cursor.fetchone()
+        raw_conn.commit()
+    finally:
+        cursor.close()
+        raw_conn.close()
+
+    logger.info(f"Denormalisierung: {new_docs} neue, {updated_docs} aktualisierte, "
+                f"{superseded_docs} durch neue Version ersetzte Dokumente")
 
     # Embedding-Text in Python aufbauen (flexibler als in SQL)
-    if new_docs > 0:
+    changed = new_docs + updated_docs + superseded_docs
+    if changed:
         _update_embedding_texts()
 
-    return new_docs
+    return changed
 
 
-def _update_embedding_texts():
-    """Baut embedding_text + embedding_hash für Dokumente wo es noch fehlt."""
-    rows = db.fetch_all("""
-        SELECT id, title, description, buyer_name, buyer_city, cpv_code_main, contract_nature
-        FROM search_documents
-        WHERE embedding_text IS NULL
-    """)
+def _update_embedding_texts(chunk_size: int = 10_000,
+                            batch_size: int = config.IMPORT_BATCH_SIZE) -> int:
+    """Baut embedding_text + embedding_hash für Dokumente wo es noch fehlt.
 
-    if not rows:
-        return
+    Liest die offenen Dokumente chunkweise (Keyset über id), baut Texte und
+    Hashes spaltenweise und schreibt jeden Chunk per fast_executemany in eine
+    temporäre Tabelle, aus der ein einziges UPDATE…JOIN übernimmt.
 
+    Returns:
+        Anzahl aktualisierter Dokumente
+    """
     engine = db.get_engine()
     raw_conn = engine.raw_connection()
     cursor = raw_conn.cursor()
+    started = time.monotonic()
+    total = 0
+    last_id = ""
+    try:
+        cursor.execute("IF OBJECT_ID('tempdb..#embedding_texts') IS NOT NULL DROP TABLE #embedding_texts")
+        cursor.execute("SELECT TOP 0 id, embedding_text, embedding_hash "
+                       "INTO #embedding_texts FROM search_documents")
+        cursor.fast_executemany = True
+        while True:
+            docs = db.fetch_df("""
+                SELECT TOP (:n) id, title, description, buyer_name, buyer_city,
+                       cpv_code_main, contract_nature
+                FROM search_documents
+                WHERE embedding_text IS NULL AND id > :last_id
+                ORDER BY id
+            """, {"n": chunk_size, "last_id": last_id})
+            if docs.empty:
+                break
 
-    for doc_id, title, desc, buyer, city, cpv, nature in rows:
-        emb_text = _build_embedding_text(title, desc, buyer, city, cpv, nature)
-        emb_hash = hashlib.sha256(emb_text.encode("utf-8")).hexdigest()
-        cursor.execute(
-            "UPDATE search_documents SET embedding_text=?, embedding_hash=? WHERE id=?",
-            emb_text, emb_hash, doc_id,
-        )
+            texts = build_embedding_texts(docs)
+            rows = list(zip(docs["id"], texts, embedding_hashes(texts)))
+            for i in range(0, len(rows), batch_size):
+                cursor.executemany(
+                    "INSERT INTO #embedding_texts (id, embedding_text, embedding_hash) VALUES (?, ?, ?)",
+                    rows[i : i + batch_size],
+                )
+            cursor.execute("""
+                UPDATE sd
+                SET embedding_text = et.embedding_text, embedding_hash = et.embedding_hash
+                FROM search_documents sd
+                JOIN #embedding_texts et ON et.id = sd.id
+            """)
+            cursor.execute("TRUNCATE TABLE #embedding_texts")
+            raw_conn.commit()
+
+            total += len(rows)
+            last_id = docs["id"].iloc[-1]
+            if len(docs) < chunk_size:
+                break
+        cursor.execute("DROP TABLE #embedding_texts")
+    finally:
+        cursor.close()
+        raw_conn.close()
 
-    raw_conn.commit()
-    cursor.close()
-    raw_conn.close()
-    logger.info(f"Embedding-Text für {len(rows)} Dokumente aufgebaut")
+    if total:
+        elapsed = time.monotonic() - started
+        logger.info(f"Embedding-Text für {total} Dokumente aufgebaut "
+                    f"({elapsed:.1f}s, {total / max(elapsed, 1e-9):.0f} Dok/s)")
+    return total
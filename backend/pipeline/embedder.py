@@ -3,12 +3,24 @@
 Berechnet Embeddings für alle Dokumente in search_documents
 die noch kein Embedding haben (indexed_at IS NULL) oder
 deren embedding_hash sich geändert hat.
+
+Bereits berechnete Vektoren kommen aus dem Vektor-Cache (pipeline/vector_cache.py,
+Schlüssel embedding_hash + Modell + Dimensionen) oder aus search_vectors; nur
+Misses gehen an die API, nebenläufig und im Rahmen des Quotas über
+pipeline/embedding_scheduler.py. Neue Vektoren werden in search_vectors
+gespeichert, damit der Index ohne API neu aufgebaut werden kann
+(run_pipeline.py --rebuild-index).
 """
+import hashlib
 import logging
 import json
-from openai import AzureOpenAI
+from collections.abc import Iterator
+from functools import partial
+from openai import APIConnectionError, AzureOpenAI
 import config
 import db
+from pipeline import vector_cache
+from pipeline.embedding_scheduler import EmbeddingScheduler
 
 logger = logging.getLogger(__name__)
 
@@ -27,9 +39,14 @@ def _get_client() -> AzureOpenAI:
     return _client
 
 
-def _embed_batch(texts: list[str]) -> list[list[float]]:
-    """Berechnet Embeddings für eine Liste von Texten."""
+def _embed_batch(texts: list[str], max_retries: int | None = None) -> list[list[float]]:
+    """Berechnet Embeddings für eine Liste von Texten.
+
+    max_retries überschreibt die Retries des SDK (der Scheduler wiederholt selbst).
+    """
     client = _get_client()
+    if max_retries is not None:
+        client = client.with_options(max_retries=max_retries)
     response = client.embeddings.create(
         input=texts,
         model=config.OPENAI_EMBEDDING_DEPLOYMENT,
@@ -38,71 +55,158 @@ def _embed_batch(texts: list[str]) -> list[list[float]]:
     return [item.embedding for item in response.data]
 
 
-def embed_pending(batch_size: int = 100) -> int:
-    """Berechnet Embeddings für alle Dokumente ohne Embedding.
-
-    Args:
-        batch_size: Anzahl Texte pro API-Call (max 2048)
+def _is_retryable(e: Exception) -> bool:
+    """429, 408, 5xx und Verbindungsfehler sind vorübergehend."""
+    if isinstance(e, APIConnectionError):
+        return True
+    status = getattr(e, "status_code", None)
+    return status is not None and (status in (408, 429) or status >= 500)
+
+
+def new_scheduler() -> EmbeddingScheduler:
+    """Scheduler für einen Lauf (Quota-Buckets werden über alle Chunks geteilt)."""
+    return EmbeddingScheduler(partial(_embed_batch, max_retries=0), _is_retryable)
+
+
+def _load_stored(hashes: list[str]) -> dict[str, list[float]]:
+    """Bereits in search_vectors gespeicherte Vektoren zu den Hashes."""
+    found = {}
+    for i in range(0, len(hashes), 1000):
+        part = hashes[i : i + 1000]
+        params = {f"h{j}": h for j, h in enumerate(part)}
+        rows = db.fetch_all(f"""
+            SELECT embedding_hash, vector FROM search_vectors
+            WHERE model = :model AND dims = :dims
+              AND embedding_hash IN ({", ".join(f":{k}" for k in params)})
+        """, {**params, "model": config.OPENAI_EMBEDDING_DEPLOYMENT,
+              "dims": config.OPENAI_EMBEDDING_DIMENSIONS})
+        for h, data in rows:
+            found[h] = vector_cache.unpack_vector(data)
+    return found
+
+
+def embed_documents(docs: list[tuple[str, str, str | None]],
+                    scheduler: EmbeddingScheduler) -> dict[str, list[float]]:
+    """Vektoren für (id, embedding_text, embedding_hash)-Tupel.
+
+    Treffer kommen aus dem Vektor-Cache, dann aus search_vectors; nur der
+    Rest geht über den Scheduler an die API. Fehlt ein embedding_hash
+    (Altbestand), wird er aus dem Text berechnet. Endgültig fehlgeschlagene
+    ids fehlen im Ergebnis und stehen in scheduler.failed.
+    """
+    cache = vector_cache.get_cache()
+    hashes = {doc_id: h.strip() if h else hashlib.sha256(text.encode("utf-8")).hexdigest()
+              for doc_id, text, h in docs}
+    vectors = {}
+    pending = docs
+    if cache is not None:
+        pending = []
+        for doc, vector in zip(docs, cache.get_many([hashes[d[0]] for d in docs])):
+            if vector is None:
+                pending.append(doc)
+            else:
+                vectors[doc[0]] = vector
+
+    if pending:
+        stored = _load_stored(list({hashes[d[0]] for d in pending}))
+        if stored:
+            if cache is not None:
+                cache.put_many(list(stored), list(stored.values()))
+            vectors.update((d[0], stored[hashes[d[0]]]) for d in pending if hashes[d[0]] in stored)
+            pending = [d for d in pending if hashes[d[0]] not in stored]
+
+    for keys, fresh in scheduler.run((doc_id, text) for doc_id, text, _ in pending):
+        if cache is not None:
+            cache.put_many([hashes[k] for k in keys], fresh)
+        vectors.update(zip(keys, fresh))
+    return vectors
+
+
+def _log_run_stats(scheduler: EmbeddingScheduler):
+    """Durchsatz des Schedulers und Trefferquote des Vektor-Caches für diesen Lauf."""
+    scheduler.log_stats()
+    cache = vector_cache.get_cache()
+    if cache is None:
+        return
+    cache.flush()
+    total = cache.hits + cache.misses
+    if total:
+        logger.info(f"Vektor-Cache: {cache.hits}/{total} Treffer ({cache.hit_rate():.0%}), "
+                    f"{len(cache)} Einträge")
+    cache.hits = cache.misses = 0
+
+
+def embed_pending(chunk_size: int | None = None) -> int:
+    """Berechnet Embeddings für alle offenen Dokumente und speichert sie in
+    search_vectors, ohne sie hochzuladen (z.B. zum Vorberechnen vor einem Rebuild).
 
     Returns:
-        Anzahl der neu eingebetteten Dokumente
+        Anzahl der eingebetteten Dokumente
     """
-    # Dokumente die ein Embedding brauchen
-    rows = db.fetch_all("""
-        SELECT id, embedding_text
-        FROM search_documents
-        WHERE embedding_text IS NOT NULL
-          AND indexed_at IS NULL
-        ORDER BY updated_at
-    """)
-
-    if not rows:
-        logger.info("Keine Dokumente zum Embedden")
-        return 0
-
-    logger.info(f"{len(rows)} Dokumente zum Embedden")
+    scheduler = new_scheduler()
     total = 0
+    for docs in iter_pending(chunk_size):
+        vectors = embed_documents(
+            [(d["id"], d["embedding_text"], d["embedding_hash"]) for d in docs], scheduler
+        )
+        embedded = [d for d in docs if d["id"] in vectors]
+        store_vectors([d["embedding_hash"] for d in embedded], [vectors[d["id"]] for d in embedded])
+        total += len(embedded)
+        logger.info(f"  {total} embedded...")
 
-    # In Batches verarbeiten
-    for i in range(0, len(rows), batch_size):
-        batch = rows[i : i + batch_size]
-        doc_ids = [r[0] for r in batch]
-        texts = [r[1] for r in batch]
-
-        try:
-            vectors = _embed_batch(texts)
-        except Exception as e:
-            logger.error(f"Embedding-Fehler bei Batch {i}: {e}")
-            continue
+    _log_run_stats(scheduler)
+    logger.info(f"Embedding fertig: {total} Dokumente")
+    return total
 
-        # Vektoren in DB speichern (als indexed_at markieren)
-        # Die eigentlichen Vektoren gehen direkt in den Search Index,
-        # wir speichern sie hier temporär als JSON in einer temp-Tabelle
-        _store_vectors(doc_ids, vectors)
-        total += len(vectors)
 
-        if (i + batch_size) % 500 == 0:
-            logger.info(f"  {total}/{len(rows)} embedded...")
+def store_vectors(hashes: list[str | None], vectors: list[list[float]],
+                  batch_size: int = config.IMPORT_BATCH_SIZE) -> int:
+    """Speichert Vektoren content-adressiert in search_vectors.
 
-    logger.info(f"Embedding fertig: {total} Dokumente")
-    return total
+    Schon vorhandene (Hash, Modell, Dimensionen) bleiben unverändert;
+    Dokumente ohne embedding_hash werden übersprungen.
 
+    Returns:
+        Anzahl neu gespeicherter Vektoren
+    """
+    rows = {}
+    for h, vector in zip(hashes, vectors):
+        if h:
+            rows[h.strip()] = vector_cache.pack_vector(vector)
+    if not rows:
+        return 0
 
-def _store_vectors(doc_ids: list[str], vectors: list[list[float]]):
-    """Markiert Dokumente als embedded und speichert Vektor-Referenz."""
     engine = db.get_engine()
     raw_conn = engine.raw_connection()
     cursor = raw_conn.cursor()
-
-    for doc_id, vector in zip(doc_ids, vectors):
-        cursor.execute(
-            "UPDATE search_documents SET indexed_at = GETDATE() WHERE id = ?",
-            doc_id,
-        )
-
-    raw_conn.commit()
-    cursor.close()
-    raw_conn.close()
+    try:
+        cursor.execute("IF OBJECT_ID('tempdb..#vectors') IS NOT NULL DROP TABLE #vectors")
+        cursor.execute("SELECT TOP 0 embedding_hash, vector INTO #vectors FROM search_vectors")
+        cursor.fast_executemany = True
+        items = list(rows.items())
+        for i in range(0, len(items), batch_size):
+            cursor.executemany(
+                "INSERT INTO #vectors (embedding_hash, vector) VALUES (?, ?)",
+                items[i : i + batch_size],
+            )
+        cursor.execute("""
+            INSERT INTO search_vectors (embedding_hash, model, dims, vector)
+            SELECT v.embedding_hash, ?, ?, v.vector
+            FROM #vectors v
+            WHERE NOT EXISTS (
+                SELECT 1 FROM search_vectors sv
+                WHERE sv.embedding_hash = v.embedding_hash
+                  AND sv.model = ? AND sv.dims = ?
+            )
+        """, config.OPENAI_EMBEDDING_DEPLOYMENT, config.OPENAI_EMBEDDING_DIMENSIONS,
+             config.OPENAI_EMBEDDING_DEPLOYMENT, config.OPENAI_EMBEDDING_DIMENSIONS)
+        stored = cursor.rowcount
+        cursor.execute("DROP TABLE #vectors")
+        raw_conn.commit()
+    finally:
+        cursor.close()
+        raw_conn.close()
+    return stored
 
 
 def get_embedding(text: str) -> list[float]:
@@ -111,64 +215,98 @@ def get_embedding(text: str) -> list[float]:
     return vectors[0]
 
 
-def embed_and_collect(batch_size: int = 100) -> list[dict]:
-    """Berechnet Embeddings und gibt Dokumente mit Vektoren zurück.
+# Felder, die der Indexer je Dokument braucht (siehe indexer._format_doc)
+_DOCUMENT_FIELDS = [
+    "id", "embedding_text", "title", "description", "buyer_name", "buyer_city",
+    "cpv_code_main", "contract_nature", "publication_date", "deadline",
+    "estimated_value", "document_url", "procedure_type", "lat", "lng",
+    "buyer_post_code", "all_cpv_codes",
+]
 
-    Returns:
-        Liste von {"id": ..., "vector": [...], ...} für den Indexer
-    """
-    rows = db.fetch_all("""
-        SELECT id, embedding_text, title, description, buyer_name, buyer_city,
-               cpv_code_main, contract_nature, publication_date, deadline,
-               estimated_value, document_url, procedure_type, lat, lng,
-               buyer_post_code, all_cpv_codes
-        FROM search_documents
-        WHERE embedding_text IS NOT NULL
-          AND indexed_at IS NULL
-        ORDER BY updated_at
-    """)
 
-    if not rows:
-        logger.info("Keine Dokumente zum Embedden + Indexen")
-        return []
-
-    logger.info(f"{len(rows)} Dokumente zum Embedden + Indexen")
-    results = []
-
-    for i in range(0, len(rows), batch_size):
-        batch = rows[i : i + batch_size]
-        texts = [r[1] for r in batch]  # embedding_text
-
-        try:
-            vectors = _embed_batch(texts)
-        except Exception as e:
-            logger.error(f"Embedding-Fehler bei Batch {i}: {e}")
-            continue
-
-        for row, vector in zip(batch, vectors):
-            results.append({
-                "id": row[0],
-                "embedding_text": row[1],
-                "title": row[2],
-                "description": row[3],
-                "buyer_name": row[4],
-                "buyer_city": row[5],
-                "cpv_code_main": row[6],
-                "contract_nature": row[7],
-                "publication_date": row[8],
-                "deadline": row[9],
-                "estimated_value": row[10],
-                "document_url": row[11],
-                "procedure_type": row[12],
-                "lat": row[13],
-                "lng": row[14],
-                "buyer_post_code": row[15],
-                "all_cpv_codes": row[16],
-                "content_vector": vector,
-            })
-
-        if (i + batch_size) % 500 == 0:
-            logger.info(f"  {len(results)}/{len(rows)} embedded...")
-
-    logger.info(f"Embedding fertig: {len(results)} Dokumente mit Vektoren")
-    return results
+def iter_pending(chunk_size: int | None = None) -> Iterator[list[dict]]:
+    """Liest offene Dokumente (indexed_at IS NULL) chunkweise in id-Reihenfolge.
+
+    Keyset-Paginierung über id entlang ix_search_documents_pending_index;
+    im Speicher liegt immer nur ein Chunk.
+    """
+    chunk_size = chunk_size or config.INDEX_CHUNK_SIZE
+    last_id = ""
+    while True:
+        rows = db.fetch_all(f"""
+            SELECT TOP (:n) {", ".join(_DOCUMENT_FIELDS)}, embedding_hash
+            FROM search_documents
+            WHERE embedding_text IS NOT NULL
+              AND indexed_at IS NULL
+              AND id > :last_id
+            ORDER BY id
+        """, {"n": chunk_size, "last_id": last_id})
+        if not rows:
+            return
+        yield [dict(zip(_DOCUMENT_FIELDS + ["embedding_hash"], r)) for r in rows]
+        last_id = rows[-1][0]
+        if len(rows) < chunk_size:
+            return
+
+
+def iter_embedded(chunk_size: int | None = None) -> Iterator[list[dict]]:
+    """Streamt offene Dokumente chunkweise mit content_vector.
+
+    Die Vektoren jedes Chunks werden vor der Weitergabe in search_vectors
+    gespeichert. Dokumente, deren Embedding auch nach allen Retries
+    fehlschlägt, fehlen im Ergebnis; sie bleiben offen und kommen im
+    nächsten Lauf wieder.
+    """
+    scheduler = new_scheduler()
+    total = 0
+    try:
+        for docs in iter_pending(chunk_size):
+            vectors = embed_documents(
+                [(d["id"], d["embedding_text"], d["embedding_hash"]) for d in docs],
+                scheduler,
+            )
+            embedded = []
+            for doc in docs:
+                if doc["id"] in vectors:
+                    doc["content_vector"] = vectors[doc["id"]]
+                    embedded.append(doc)
+            store_vectors([d["embedding_hash"] for d in embedded],
+                          [d["content_vector"] for d in embedded])
+            total += len(embedded)
+            logger.info(f"  {total} embedded...")
+            yield embedded
+    finally:
+        _log_run_stats(scheduler)
+        logger.info(f"Embedding fertig: {total} Dokumente mit Vektoren")
+
+
+def iter_stored(chunk_size: int | None = None) -> Iterator[list[dict]]:
+    """Streamt alle Dokumente mit gespeichertem Vektor (für Index-Rebuilds, ohne API).
+
+    Keyset über id; Dokumente ohne Vektor für das aktuelle Modell fehlen.
+    """
+    chunk_size = chunk_size or config.INDEX_CHUNK_SIZE
+    last_id = ""
+    while True:
+        rows = db.fetch_all(f"""
+            SELECT TOP (:n) {", ".join(f"sd.{c}" for c in _DOCUMENT_FIELDS)}, sv.vector
+            FROM search_documents sd
+            JOIN search_vectors sv
+              ON sv.embedding_hash = sd.embedding_hash
+             AND sv.model = :model AND sv.dims = :dims
+            WHERE sd.id > :last_id
+            ORDER BY sd.id
+        """, {"n": chunk_size, "last_id": last_id,
+              "model": config.OPENAI_EMBEDDING_DEPLOYMENT,
+              "dims": config.OPENAI_EMBEDDING_DIMENSIONS})
+        if not rows:
+            return
+        docs = []
+        for row in rows:
+            doc = dict(zip(_DOCUMENT_FIELDS, row[:-1]))
+            doc["content_vector"] = vector_cache.unpack_vector(row[-1])
+            docs.append(doc)
+        yield docs
+        last_id = rows[-1][0]
+        if len(rows) < chunk_size:
+            return
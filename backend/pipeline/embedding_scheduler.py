@@ -0,0 +1,240 @@
+"""Nebenläufige Embedding-Requests unter dem Quota des Deployments.
+
+Azure OpenAI begrenzt ein Deployment auf Tokens pro Minute (TPM) und
+Requests pro Minute (RPM). Der Scheduler
+  - packt Texte nach geschätzter Token-Zahl zu Batches,
+  - schickt bis zu config.EMBEDDING_WORKERS Requests gleichzeitig,
+  - hält TPM/RPM über zwei Token-Buckets ein,
+  - stellt Batches nach 429/5xx mit Jitter-Backoff erneut ein (Retry-After
+    wird beachtet, bei 429 pausieren alle Worker),
+  - teilt Batches bei anderen Fehlern (z.B. ein zu langer Text) auf, bis
+    der fehlerhafte Text isoliert ist.
+Texte, die endgültig scheitern, landen in `failed` statt im Ergebnis.
+"""
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+from collections.abc import Callable, Hashable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+import config
+
+logger = logging.getLogger(__name__)
+
+BACKOFF_BASE_S = 1.0
+BACKOFF_MAX_S = 60.0
+
+
+def estimate_tokens(text: str) -> int:
+    """Grobe Token-Schätzung ohne Tokenizer (deutscher Text: ~3 Zeichen/Token)."""
+    return len(text) // config.EMBEDDING_CHARS_PER_TOKEN + 1
+
+
+class TokenBucket:
+    """Thread-sicherer Token-Bucket mit Nachfüllrate pro Minute.
+
+    Größere Entnahmen als die Bucket-Größe sind erlaubt und werden als
+    Schuld verbucht; nachfolgende Aufrufer warten entsprechend länger.
+
+    Args:
+        per_minute: Erlaubte Einheiten pro Minute
+        burst_seconds: Bucket-Größe in Sekunden Nachfüllrate
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 1.0):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._level = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float = 1.0):
+        """Blockiert, bis `amount` Einheiten verfügbar sind, und entnimmt sie."""
+        needed = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._level >= needed:
+                    self._level -= amount
+                    return
+                delay = (needed - self._level) / self.rate
+            time.sleep(delay)
+
+    def refund(self, amount: float):
+        """Gibt Einheiten eines abgelehnten Requests zurück."""
+        with self._lock:
+            self._level = min(self.capacity, self._level + amount)
+
+
+@dataclass(order=True)
+class _Batch:
+    not_before: float
+    seq: int
+    keys: list = field(compare=False)
+    texts: list[str] = field(compare=False)
+    tokens: int = field(compare=False)
+    attempt: int = field(default=0, compare=False)
+
+
+def _retry_after(exc: Exception) -> float | None:
+    """Retry-After-Header der Fehlerantwort (Sekunden), falls vorhanden."""
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class EmbeddingScheduler:
+    """Führt Embedding-Batches nebenläufig im Rahmen von TPM/RPM aus.
+
+    Args:
+        embed_fn: Texte → Vektoren (ein API-Request, ohne eigene Retries)
+        retryable: Entscheidet, ob ein Fehler vorübergehend ist (429/5xx/Netzwerk)
+        workers, tpm, rpm, max_batch_tokens, max_batch_size, max_retries:
+            Standardwerte aus config.EMBEDDING_*
+    """
+
+    def __init__(self, embed_fn: Callable[[list[str]], list[list[float]]],
+                 retryable: Callable[[Exception], bool],
+                 workers: int | None = None, tpm: int | None = None, rpm: int | None = None,
+                 max_batch_tokens: int | None = None, max_batch_size: int | None = None,
+                 max_retries: int | None = None):
+        self.embed_fn = embed_fn
+        self.retryable = retryable
+        self.workers = workers or config.EMBEDDING_WORKERS
+        self.max_batch_size = max_batch_size or config.EMBEDDING_BATCH_MAX_SIZE
+        self.max_batch_tokens = max_batch_tokens or config.EMBEDDING_BATCH_MAX_TOKENS
+        self.max_retries = config.EMBEDDING_MAX_RETRIES if max_retries is None else max_retries
+        self._tokens = TokenBucket(tpm or config.EMBEDDING_TPM_LIMIT)
+        self._requests = TokenBucket(rpm or config.EMBEDDING_RPM_LIMIT)
+        self._paused_until = 0.0
+        self._pause_lock = threading.Lock()
+        self._seq = itertools.count()
+
+        self.failed: list = []
+        self.requests = 0
+        self.retries = 0
+        self.tokens = 0
+        self.elapsed = 0.0
+
+    def _pack(self, items: Iterable[tuple[Hashable, str]]) -> Iterator[_Batch]:
+        """Packt (key, text)-Paare bis max_batch_tokens / max_batch_size."""
+        keys, texts, tokens = [], [], 0
+        for key, text in items:
+            estimate = estimate_tokens(text)
+            if keys and (tokens + estimate > self.max_batch_tokens
+                         or len(keys) >= self.max_batch_size):
+                yield _Batch(0.0, next(self._seq), keys, texts, tokens)
+                keys, texts, tokens = [], [], 0
+            keys.append(key)
+            texts.append(text)
+            tokens += estimate
+        if keys:
+            yield _Batch(0.0, next(self._seq), keys, texts, tokens)
+
+    def _call(self, batch: _Batch) -> list[list[float]]:
+        """Ein Request im Worker-Thread: Pause abwarten, Quota reservieren, senden."""
+        delay = self._paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._requests.acquire(1)
+        self._tokens.acquire(batch.tokens)
+        vectors = self.embed_fn(batch.texts)
+        if len(vectors) != len(batch.texts):
+            raise ValueError(f"{len(vectors)} Vektoren für {len(batch.texts)} Texte")
+        return vectors
+
+    def _handle_failure(self, batch: _Batch, exc: Exception, retry: list):
+        """Stellt den Batch erneut ein, teilt ihn auf oder gibt ihn verloren."""
+        status = getattr(exc, "status_code", None)
+        if status is not None and 400 <= status < 500:
+            # Abgelehnte Requests zählen nicht gegen das Quota
+            self._tokens.refund(batch.tokens)
+        if self.retryable(exc) and batch.attempt < self.max_retries:
+            delay = _retry_after(exc)
+            if delay is None:
+                delay = random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** batch.attempt))
+            if status == 429:
+                with self._pause_lock:
+                    self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            batch.attempt += 1
+            batch.not_before = time.monotonic() + delay
+            self.retries += 1
+            heapq.heappush(retry, batch)
+            logger.debug(f"Embedding-Batch ({len(batch.keys)} Texte) Retry {batch.attempt} "
+                         f"in {delay:.1f}s: {exc}")
+        elif not self.retryable(exc) and len(batch.keys) > 1:
+            mid = len(batch.keys) // 2
+            for keys, texts in ((batch.keys[:mid], batch.texts[:mid]),
+                                (batch.keys[mid:], batch.texts[mid:])):
+                tokens = sum(estimate_tokens(t) for t in texts)
+                heapq.heappush(retry, _Batch(0.0, next(self._seq), keys, texts, tokens,
+                                             batch.attempt))
+        else:
+            self.failed.extend(batch.keys)
+            logger.error(f"Embedding-Fehler ({len(batch.keys)} Texte, "
+                         f"{batch.attempt} Retries): {exc}")
+
+    def run(self, items: Iterable[tuple[Hashable, str]]) -> Iterator[tuple[list, list[list[float]]]]:
+        """Liefert (keys, vectors) je fertigem Batch, in Abschlussreihenfolge.
+
+        Eingaben werden erst gelesen, wenn ein Worker frei wird; höchstens
+        2 × workers Batches sind gleichzeitig unterwegs.
+        """
+        started = time.monotonic()
+        batches = self._pack(items)
+        exhausted = False
+        retry: list[_Batch] = []
+        running = {}
+        with ThreadPoolExecutor(self.workers, thread_name_prefix="embed") as pool:
+            while True:
+                while len(running) < self.workers * 2:
+                    if retry and retry[0].not_before <= time.monotonic():
+                        batch = heapq.heappop(retry)
+                    elif not exhausted and (batch := next(batches, None)) is not None:
+                        pass
+                    else:
+                        exhausted = True
+                        break
+                    running[pool.submit(self._call, batch)] = batch
+                    self.requests += 1
+
+                if not running:
+                    if not retry:
+                        break
+                    time.sleep(max(0.0, retry[0].not_before - time.monotonic()))
+                    continue
+
+                # Fällige Retries können nur starten, wenn ein Platz frei ist: bei
+                # voller Warteschlange auf einen fertigen Batch warten statt zu pollen
+                if retry and len(running) < self.workers * 2:
+                    timeout = max(0.01, retry[0].not_before - time.monotonic())
+                else:
+                    timeout = None
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = running.pop(future)
+                    try:
+                        vectors = future.result()
+                    except Exception as e:
+                        self._handle_failure(batch, e, retry)
+                        continue
+                    self.tokens += batch.tokens
+                    yield batch.keys, vectors
+        self.elapsed += time.monotonic() - started
+
+    def log_stats(self):
+        """Durchsatz und Fehler seit Erzeugung des Schedulers."""
+        if not self.requests:
+            return
+        per_minute = self.tokens / self.elapsed * 60 if self.elapsed else 0
+        logger.info(f"Embedding-Scheduler: {self.requests} Requests, ~{self.tokens} Tokens "
+                    f"(~{per_minute:,.0f}/min, Limit {self._tokens.rate * 60:,.0f}), "
+                    f"{self.retries} Retries, {len(self.failed)} fehlgeschlagen")
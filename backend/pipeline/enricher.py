@@ -1,10 +1,15 @@
 """Enrichment: Geocoding von PLZ → Koordinaten.
 
-Nutzt die plz_coordinates Tabelle in der DB und Nominatim als Fallback.
+Level 1 und der 3-stellige PLZ-Präfix laufen in SQL gegen plz_coordinates, der
+Rest in Python gegen den PLZ-Gazetteer (pipeline/gazetteer.py, sonst
+plz_coordinates aus der DB).
 """
 import re
 import logging
+from collections.abc import Mapping
+import config
 import db
+from pipeline import gazetteer
 
 logger = logging.getLogger(__name__)
 
@@ -12,14 +17,45 @@ logger = logging.getLogger(__name__)
 PLZ_RE = re.compile(r"\b(\d{5})\b")
 
 
-def _load_plz_lookup() -> dict:
-    """Lädt PLZ → (lat, lng) Mapping aus der DB."""
+def _load_plz_lookup() -> Mapping:
+    """PLZ → (lat, lng): aus dem Gazetteer, sonst aus der DB."""
+    lookup = gazetteer.load()
+    if lookup is not None:
+        return lookup
     rows = db.fetch_all(
         "SELECT plz, lat, lng FROM plz_coordinates WHERE lat IS NOT NULL"
     )
     return {r[0]: (float(r[1]), float(r[2])) for r in rows}
 
 
+def _load_city_index(plz_lookup: Mapping) -> gazetteer.CityIndex:
+    """Ortsnamen-Index aus dem Gazetteer, sonst aus plz_coordinates."""
+    if isinstance(plz_lookup, gazetteer.Gazetteer):
+        return gazetteer.CityIndex.from_gazetteer(plz_lookup)
+    rows = db.fetch_all("""
+        SELECT city, AVG(lat), AVG(lng), COUNT(*) FROM plz_coordinates
+        WHERE lat IS NOT NULL AND lng IS NOT NULL AND city IS NOT NULL
+        GROUP BY city
+    """)
+    return gazetteer.CityIndex(rows)
+
+
+def _build_prefix_index(plz_lookup: Mapping) -> dict:
+    """PLZ-Präfix (2- und 3-stellig) → Schwerpunkt aller bekannten PLZ darunter.
+
+    Wird einmal pro Lauf aus dem Lookup gebaut; der Level-2-Fallback ist
+    damit ein Dict-Zugriff statt eines Scans über alle PLZ.
+    """
+    sums = {}
+    for plz, (lat, lng) in plz_lookup.items():
+        for length in (2, 3):
+            entry = sums.setdefault(plz[:length], [0.0, 0.0, 0])
+            entry[0] += lat
+            entry[1] += lng
+            entry[2] += 1
+    return {prefix: (lat / n, lng / n) for prefix, (lat, lng, n) in sums.items()}
+
+
 def _normalize_plz(raw: str | None) -> str | None:
     """Bereinigt PLZ-Strings: '01067.0' → '01067', 'D-50667' → '50667'."""
     if not raw:
@@ -38,69 +74,172 @@ def _normalize_plz(raw: str | None) -> str | None:
     return None
 
 
-def geocode_new_records():
-    """Geocoded alle search_documents ohne Koordinaten.
+# Normalisierte PLZ pro Dokument in SQL (Gegenstück zu _normalize_plz für die
+# gängigen Formate '01067', '1067', '01067.0', 'D-50667'). Alles andere
+# bleibt NULL und wird in Python mit _normalize_plz behandelt.
+_SQL_PLZ = """
+    CROSS APPLY (
+        SELECT REPLACE(REPLACE(REPLACE(REPLACE(LTRIM(RTRIM(
+            CASE WHEN CHARINDEX('.', sd.buyer_post_code) > 0
+                 THEN LEFT(sd.buyer_post_code, CHARINDEX('.', sd.buyer_post_code) - 1)
+                 ELSE sd.buyer_post_code END
+        )), ' ', ''), '-', ''), 'D', ''), 'd', '') AS digits
+    ) raw
+    CROSS APPLY (
+        SELECT CASE
+            WHEN raw.digits LIKE '%[^0-9]%' THEN NULL
+            WHEN LEN(raw.digits) = 5 THEN raw.digits
+            WHEN LEN(raw.digits) = 4 THEN '0' + raw.digits
+        END AS plz
+    ) n
+"""
 
-    Strategie (3-Level-Fallback):
-    1. Exakter PLZ-Match aus plz_coordinates
-    2. PLZ-Prefix (erste 3 Stellen)
-    3. PLZ aus Beschreibungstext extrahieren
-    """
-    plz_lookup = _load_plz_lookup()
-    logger.info(f"PLZ-Lookup geladen: {len(plz_lookup)} Einträge")
 
-    # Alle Docs ohne Koordinaten
-    rows = db.fetch_all("""
-        SELECT id, buyer_post_code, buyer_city, description
-        FROM search_documents
-        WHERE lat IS NULL
+def refresh_prefix_centroids():
+    """Baut plz_prefix_centroids (2-/3-stellige Präfixe) aus plz_coordinates neu auf.
+
+    Läuft nur mit run_pipeline.py --build-gazetteer (und einmalig als
+    Migration), nicht bei jedem Geocoding-Lauf.
+    """
+    db.execute("""
+        DELETE FROM plz_prefix_centroids;
+        INSERT INTO plz_prefix_centroids (prefix, lat, lng, plz_count)
+        SELECT prefix, AVG(lat), AVG(lng), COUNT(*)
+        FROM plz_coordinates
+        CROSS APPLY (VALUES (LEFT(plz, 2)), (LEFT(plz, 3))) p(prefix)
+        WHERE lat IS NOT NULL AND lng IS NOT NULL
+        GROUP BY prefix;
     """)
 
-    if not rows:
-        logger.info("Keine Dokumente zum Geocoden")
-        return 0
 
-    logger.info(f"{len(rows)} Dokumente ohne Koordinaten")
+def _geocode_in_sql() -> tuple[int, int]:
+    """Level 1 und 2a (3-stelliger Präfix) als UPDATE…JOIN in der Datenbank.
 
-    updated = 0
+    Der 2-stellige Präfix ist so grob, dass eine PLZ aus der Beschreibung
+    (Level 3) Vorrang hat; er läuft deshalb erst im Python-Durchlauf.
+
+    Returns:
+        (exakte Treffer, Präfix-Treffer)
+    """
     engine = db.get_engine()
     raw_conn = engine.raw_connection()
     cursor = raw_conn.cursor()
+    try:
+        cursor.execute(f"""
+            UPDATE sd SET lat = pc.lat, lng = pc.lng
+            FROM search_documents sd
+            {_SQL_PLZ}
+            JOIN plz_coordinates pc ON pc.plz = n.plz
+            WHERE sd.lat IS NULL AND pc.lat IS NOT NULL AND pc.lng IS NOT NULL
+        """)
+        exact = cursor.rowcount
+        cursor.execute(f"""
+            UPDATE sd SET lat = p3.lat, lng = p3.lng
+            FROM search_documents sd
+            {_SQL_PLZ}
+            JOIN plz_prefix_centroids p3 ON p3.prefix = LEFT(n.plz, 3)
+            WHERE sd.lat IS NULL
+        """)
+        prefix = cursor.rowcount
+        raw_conn.commit()
+    finally:
+        cursor.close()
+        raw_conn.close()
+    return exact, prefix
+
+
+def _resolve(post_code, description, city, plz_lookup: Mapping, prefix_index: dict,
+             city_index: gazetteer.CityIndex):
+    """4-Level-Fallback für ein Dokument → (lat, lng) oder None.
+
+    Reihenfolge nach Genauigkeit: exakte PLZ, 3-stelliger Präfix, PLZ aus
+    der Beschreibung, 2-stelliger Präfix, Ortsname.
+    """
+    # Level 1: Exakter PLZ-Match
+    plz = _normalize_plz(post_code)
+    if plz and plz in plz_lookup:
+        return plz_lookup[plz]
+
+    # Level 2a: 3-stelliger PLZ-Prefix → Schwerpunkt des Gebiets
+    if plz and plz[:3] in prefix_index:
+        return prefix_index[plz[:3]]
+
+    # Level 3: PLZ aus Description extrahieren (genauer als der 2-stellige Prefix)
+    if description:
+        for m in PLZ_RE.findall(str(description)):
+            if m in plz_lookup:
+                return plz_lookup[m]
+
+    # Level 2b: 2-stelliger PLZ-Prefix
+    if plz and plz[:2] in prefix_index:
+        return prefix_index[plz[:2]]
+
+    # Level 4: Ortsname (normalisiert, notfalls Trigramm-Fuzzy-Match)
+    return city_index.resolve(city)
+
+
+def geocode_new_records(chunk_size: int = 5_000,
+                        batch_size: int = config.IMPORT_BATCH_SIZE) -> int:
+    """Geocoded alle search_documents ohne Koordinaten.
+
+    Strategie (4-Level-Fallback):
+    1. Exakter PLZ-Match aus plz_coordinates
+    2. PLZ-Prefix: Schwerpunkt der ersten 3 Stellen
+    3. PLZ aus Beschreibungstext extrahieren, sonst Schwerpunkt der ersten 2 Stellen
+    4. Ortsname (buyer_city) über den Ortsnamen-Index
+
+    Level 1 und der 3-stellige Präfix laufen set-based in SQL. Nur die danach
+    noch offenen Dokumente werden chunkweise (Keyset über id) nach Python
+    geholt; dort greifen _normalize_plz für exotische PLZ-Formate, Level 3,
+    der 2-stellige Präfix und Level 4.
+    """
+    exact, by_prefix = _geocode_in_sql()
+    logger.info(f"Geocoding (SQL): {exact} exakt, {by_prefix} über PLZ-Präfix")
 
-    for doc_id, post_code, city, description in rows:
-        lat, lng = None, None
-
-        # Level 1: Exakter PLZ-Match
-        plz = _normalize_plz(post_code)
-        if plz and plz in plz_lookup:
-            lat, lng = plz_lookup[plz]
-
-        # Level 2: PLZ-Prefix (erste 3 Stellen → nächste bekannte PLZ)
-        if lat is None and plz:
-            prefix = plz[:3]
-            for known_plz, coords in plz_lookup.items():
-                if known_plz.startswith(prefix):
-                    lat, lng = coords
-                    break
-
-        # Level 3: PLZ aus Description extrahieren
-        if lat is None and description:
-            matches = PLZ_RE.findall(str(description))
-            for m in matches:
-                if m in plz_lookup:
-                    lat, lng = plz_lookup[m]
-                    break
-
-        if lat is not None:
-            cursor.execute(
-                "UPDATE search_documents SET lat=?, lng=? WHERE id=?",
-                lat, lng, doc_id,
-            )
-            updated += 1
-
-    raw_conn.commit()
-    cursor.close()
-    raw_conn.close()
-
-    logger.info(f"Geocoding: {updated}/{len(rows)} Dokumente mit Koordinaten versehen")
-    return updated
+    plz_lookup = _load_plz_lookup()
+    prefix_index = _build_prefix_index(plz_lookup)
+    city_index = _load_city_index(plz_lookup)
+
+    engine = db.get_engine()
+    raw_conn = engine.raw_connection()
+    cursor = raw_conn.cursor()
+    cursor.fast_executemany = True
+
+    scanned = 0
+    updated = 0
+    last_id = ""
+    try:
+        while True:
+            rows = db.fetch_all("""
+                SELECT TOP (:n) id, buyer_post_code, buyer_city, description
+                FROM search_documents
+                WHERE lat IS NULL AND id > :last_id
+                ORDER BY id
+            """, {"n": chunk_size, "last_id": last_id})
+            if not rows:
+                break
+
+            hits = []
+            for doc_id, post_code, city, description in rows:
+                coords = _resolve(post_code, description, city,
+                                  plz_lookup, prefix_index, city_index)
+                if coords is not None:
+                    hits.append((coords[0], coords[1], doc_id))
+            for i in range(0, len(hits), batch_size):
+                cursor.executemany(
+                    "UPDATE search_documents SET lat=?, lng=? WHERE id=?",
+                    hits[i : i + batch_size],
+                )
+            raw_conn.commit()
+
+            scanned += len(rows)
+            updated += len(hits)
+            last_id = rows[-1][0]
+            if len(rows) < chunk_size:
+                break
+    finally:
+        cursor.close()
+        raw_conn.close()
+
+    logger.info(f"Geocoding (Python): {updated}/{scanned} offene Dokumente mit Koordinaten versehen")
+    return exact + by_prefix + updated
@@ -0,0 +1,252 @@
+"""PLZ-Gazetteer als memory-mapped Array-Datei.
+
+Ersetzt das Laden von plz_coordinates aus SQL (Pipeline) und Nominatim-
+Aufrufe (Streamlit-App) durch eine vorgebaute Datei:
+
+  <GAZETTEER_PATH>             sortiertes Structured Array (plz u4, lat f4, lng f4, city u4)
+  <GAZETTEER_PATH>.cities.txt  Ortsnamen, eine Zeile pro city-id
+
+Die Datei wird per np.load(mmap_mode="r") geöffnet (kein Parsen, keine
+Kopie) und per Binärsuche abgefragt. Gebaut wird sie einmalig aus der DB:
+  python run_pipeline.py --build-gazetteer
+"""
+import logging
+import os
+import re
+from collections.abc import Mapping
+from pathlib import Path
+import numpy as np
+import config
+
+logger = logging.getLogger(__name__)
+
+DTYPE = np.dtype([("plz", "<u4"), ("lat", "<f4"), ("lng", "<f4"), ("city", "<u4")])
+
+_default = None
+
+
+def _cities_path(path: Path) -> Path:
+    return path.with_name(path.name + ".cities.txt")
+
+
+class Gazetteer(Mapping):
+    """Read-only Mapping PLZ ('01067') → (lat, lng) über einem sortierten Array.
+
+    Args:
+        entries: Structured Array mit DTYPE, nach plz sortiert
+        cities: Ortsnamen, Index = city-id
+    """
+
+    def __init__(self, entries: np.ndarray, cities: list[str]):
+        self._entries = entries
+        self._codes = entries["plz"]
+        self.cities = cities
+
+    @classmethod
+    def open(cls, path: Path) -> "Gazetteer":
+        """Öffnet eine Gazetteer-Datei memory-mapped."""
+        path = Path(path)
+        entries = np.load(path, mmap_mode="r")
+        cities = _cities_path(path).read_text(encoding="utf-8").split("\n")
+        return cls(entries, cities)
+
+    def _find(self, plz: str) -> int | None:
+        if not isinstance(plz, str) or len(plz) != 5 or not plz.isdigit():
+            return None
+        code = int(plz)
+        i = int(np.searchsorted(self._codes, code))
+        if i < len(self._codes) and self._codes[i] == code:
+            return i
+        return None
+
+    def __getitem__(self, plz: str) -> tuple[float, float]:
+        i = self._find(plz)
+        if i is None:
+            raise KeyError(plz)
+        entry = self._entries[i]
+        return float(entry["lat"]), float(entry["lng"])
+
+    def __contains__(self, plz) -> bool:
+        return self._find(plz) is not None
+
+    def __iter__(self):
+        return (f"{code:05d}" for code in self._codes)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def city(self, plz: str) -> str | None:
+        """Ortsname zur PLZ."""
+        i = self._find(plz)
+        return None if i is None else self.cities[self._entries[i]["city"]]
+
+
+def load(path: Path | None = None) -> Gazetteer | None:
+    """Gibt den (gecachten) Gazetteer zurück; None, wenn die Datei fehlt."""
+    global _default
+    if path is None and _default is not None:
+        return _default
+    path = Path(path or config.GAZETTEER_PATH)
+    if not path.exists() or not _cities_path(path).exists():
+        return None
+    gazetteer = Gazetteer.open(path)
+    if path == Path(config.GAZETTEER_PATH):
+        _default = gazetteer
+    return gazetteer
+
+
+def build(path: Path | None = None) -> int:
+    """Baut die Gazetteer-Datei aus plz_coordinates (atomar ersetzt).
+
+    Returns:
+        Anzahl PLZ-Einträge
+    """
+    global _default
+    import db
+
+    path = Path(path or config.GAZETTEER_PATH)
+    rows = db.fetch_all("""
+        SELECT plz, lat, lng, city FROM plz_coordinates
+        WHERE lat IS NOT NULL AND lng IS NOT NULL
+        ORDER BY plz
+    """)
+
+    cities = []
+    city_ids = {}
+    entries = {}
+    for plz, lat, lng, city in rows:
+        plz = str(plz).strip()
+        if len(plz) != 5 or not plz.isdigit() or int(plz) in entries:
+            continue
+        name = (city or "").strip()
+        if name not in city_ids:
+            city_ids[name] = len(cities)
+            cities.append(name)
+        entries[int(plz)] = (int(plz), float(lat), float(lng), city_ids[name])
+
+    array = np.array(sorted(entries.values()), dtype=DTYPE)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    cities_tmp = tmp.with_name(tmp.name + ".cities")
+    cities_tmp.write_text("\n".join(cities), encoding="utf-8")
+    os.replace(cities_tmp, _cities_path(path))
+    os.replace(tmp, path)
+
+    _default = None
+    logger.info(f"Gazetteer: {len(array)} PLZ, {len(cities)} Orte → {path} "
+                f"({path.stat().st_size / 1024:.0f} KB)")
+    return len(array)
+
+
+# --- Ortsnamen-Index (Fallback ohne PLZ) ---
+
+_UMLAUTS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_ABBREVIATIONS = [
+    (re.compile(r"\ba\.\s*m(?:ain\b|\.|\b)|/\s*main\b"), " am main "),
+    (re.compile(r"\ba\.\s*d(?:\.|\b)"), " an der "),
+    (re.compile(r"\bi\.\s*"), " im "),
+    (re.compile(r"\bst\.\s*"), " sankt "),
+]
+# Verwaltungs-Zusätze, die vorne/hinten am Namen stehen ("Stadt Köln", "Köln, Stadt")
+_AFFIXES = {"stadt", "hansestadt", "landeshauptstadt", "kreisstadt", "gemeinde",
+            "universitaetsstadt", "freie", "und", "der", "die"}
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+
+CITY_MATCH_MIN_SCORE = 0.75  # Dice-Koeffizient über Trigramme
+
+
+def normalize_city(name: str | None) -> str:
+    """Normalisiert Ortsnamen: 'Frankfurt a.M.' → 'frankfurt am main', 'Stadt Köln' → 'koeln'."""
+    if not name:
+        return ""
+    s = str(name).casefold().translate(_UMLAUTS)
+    for pattern, replacement in _ABBREVIATIONS:
+        s = pattern.sub(replacement, s)
+    tokens = _NON_ALNUM.sub(" ", s).split()
+    while len(tokens) > 1 and tokens[0] in _AFFIXES:
+        tokens.pop(0)
+    while len(tokens) > 1 and tokens[-1] in _AFFIXES:
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def _trigrams(name: str) -> set[str]:
+    padded = f"  {name} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class CityIndex:
+    """Ortsname → (lat, lng) mit exaktem Match auf normalisierte Namen und
+    Trigramm-Fuzzy-Match als Fallback. Ergebnisse werden pro Eingabe gecacht.
+
+    Args:
+        entries: (Ortsname, lat, lng, Anzahl PLZ) je Ort; bei gleichem
+            normalisiertem Namen gewinnt der Ort mit den meisten PLZ
+    """
+
+    def __init__(self, entries):
+        best = {}
+        for name, lat, lng, weight in entries:
+            key = normalize_city(name)
+            if key and (key not in best or weight > best[key][2]):
+                best[key] = (float(lat), float(lng), weight)
+        self._names = list(best)
+        self._coords = [best[k][:2] for k in self._names]
+        self._exact = {k: i for i, k in enumerate(self._names)}
+        postings = {}
+        for i, key in enumerate(self._names):
+            for gram in _trigrams(key):
+                postings.setdefault(gram, []).append(i)
+        # Trigramm → Orts-ids als Array; gezählt wird per np.bincount
+        self._postings = {g: np.array(ids, dtype=np.int32) for g, ids in postings.items()}
+        self._gram_counts = np.array([len(_trigrams(k)) for k in self._names], dtype=np.float64)
+        self._cache = {}
+
+    @classmethod
+    def from_gazetteer(cls, gazetteer: Gazetteer) -> "CityIndex":
+        """Baut den Index aus den PLZ-Schwerpunkten je Ort des Gazetteers."""
+        entries = gazetteer._entries
+        city_ids = entries["city"].astype(np.int64)
+        counts = np.bincount(city_ids, minlength=len(gazetteer.cities))
+        lat = np.bincount(city_ids, weights=entries["lat"], minlength=len(counts))
+        lng = np.bincount(city_ids, weights=entries["lng"], minlength=len(counts))
+        return cls(
+            (gazetteer.cities[i], lat[i] / n, lng[i] / n, n)
+            for i, n in enumerate(counts) if n
+        )
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _match(self, key: str, name: str) -> int | None:
+        if key in self._exact:
+            return self._exact[key]
+        # Ortsteil nach Bindestrich abschneiden: 'Berlin-Mitte' → 'berlin'
+        # (nur dort; Leerzeichen trennen auch 'Bad …', 'Neustadt a.d. …')
+        parts = str(name).split("-")
+        for end in range(len(parts) - 1, 0, -1):
+            head = normalize_city("-".join(parts[:end]))
+            if head in self._exact:
+                return self._exact[head]
+
+        grams = _trigrams(key)
+        hits = [self._postings[g] for g in grams if g in self._postings]
+        if not hits:
+            return None
+        shared = np.bincount(np.concatenate(hits), minlength=len(self._names))
+        scores = 2 * shared / (len(grams) + self._gram_counts)
+        best = int(np.argmax(scores))
+        return best if scores[best] >= CITY_MATCH_MIN_SCORE else None
+
+    def resolve(self, name: str | None) -> tuple[float, float] | None:
+        """Koordinaten zu einem Ortsnamen oder None."""
+        key = normalize_city(name)
+        if not key:
+            return None
+        if key not in self._cache:
+            i = self._match(key, name)
+            self._cache[key] = None if i is None else self._coords[i]
+        return self._cache[key]
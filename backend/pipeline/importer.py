@@ -4,14 +4,26 @@ Importiert DataFrames in die normalisierten 9 Tabellen.
 Basiert auf der bewährten Logik aus etl/import_to_azure.py.
 """
 import logging
+import threading
+import time
+import warnings
+from collections import deque
+from collections.abc import Iterable, Iterator, Mapping
+from concurrent.futures import Future, ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 from decimal import Decimal
+import config
 import db
+from pipeline.base_source import iter_table_chunks
+from pipeline.streaming import prefetch
 
 logger = logging.getLogger(__name__)
 
 
 # --- Typ-Konvertierungen (aus import_to_azure.py übernommen) ---
+# Skalare Referenz-Semantik. Die spaltenweisen Konverter unten liefern exakt
+# dieselben Werte; _dec/_int/_bool/_dt dienen dort als Fallback pro distinct-Wert.
 
 def _s(value, max_len=None):
     """Safe string."""
@@ -21,6 +33,18 @@ def _s(value, max_len=None):
     return v[:max_len] if max_len and len(v) > max_len else v
 
 
+def _num_str(value, max_len=None):
+    """Numerische Kennung als String ohne führende Nullen ('01' → '1').
+
+    Bis die CSVs als Strings gelesen wurden, hat pandas solche Spalten als
+    Zahl erkannt; die gespeicherten Schlüssel behalten diese Form.
+    """
+    v = _s(value)
+    if v is not None and v.isdigit():
+        v = str(int(v))
+    return v[:max_len] if v and max_len and len(v) > max_len else v
+
+
 def _dec(value):
     """Safe decimal."""
     if pd.isna(value) or value == "":
@@ -60,199 +84,737 @@ def _dt(value):
         return None
 
 
+# --- Spaltenweise Konvertierung (ganze Spalte → bindbares object-Array) ---
+
+def _map_unique(series: pd.Series, fn) -> np.ndarray:
+    """Wendet fn einmal pro distinct-Wert an und verteilt die Ergebnisse."""
+    codes, uniques = pd.factorize(series)
+    # Letztes Element fängt NA ab (factorize-Code -1)
+    mapped = np.array([fn(v) for v in uniques] + [None], dtype=object)
+    return mapped[codes]
+
+
+def _col_str(series: pd.Series, max_len=None) -> np.ndarray:
+    """Spaltenweises Äquivalent zu _s()."""
+    missing = series.isna().to_numpy() | series.isin(["", "NaN"]).to_numpy()
+    values = series.astype(str).str.strip()
+    if max_len:
+        values = values.str.slice(0, max_len)
+    out = values.to_numpy(dtype=object, copy=True)
+    out[missing] = None
+    return out
+
+
+def _col_num_str(series: pd.Series, max_len=None) -> np.ndarray:
+    """Spaltenweises Äquivalent zu _num_str()."""
+    return _map_unique(series, lambda v: _num_str(v, max_len))
+
+
+def _col_dec(series: pd.Series, max_len=None) -> np.ndarray:
+    """Spaltenweises Äquivalent zu _dec()."""
+    return _map_unique(series, _dec)
+
+
+def _col_int(series: pd.Series, max_len=None) -> np.ndarray:
+    """Spaltenweises Äquivalent zu _int()."""
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        values = series.to_numpy(dtype="float64")
+        valid = np.isfinite(values)
+        # astype("int64") läuft außerhalb des Wertebereichs still über
+        in_range = valid & (values >= -2.0**63) & (values < 2.0**63)
+        out = np.full(len(values), None, dtype=object)
+        out[in_range] = np.trunc(values[in_range]).astype("int64").astype(object)
+        if (valid & ~in_range).any():
+            out[valid & ~in_range] = _map_unique(series[valid & ~in_range], _int)
+        return out
+    return _map_unique(series, _int)
+
+
+def _col_bool(series: pd.Series, max_len=None) -> np.ndarray:
+    """Spaltenweises Äquivalent zu _bool()."""
+    if pd.api.types.is_bool_dtype(series) and not series.hasnans:
+        return series.to_numpy(dtype=bool).astype(object)
+    return _map_unique(series, _bool)
+
+
+def _col_dt(series: pd.Series, max_len=None) -> np.ndarray:
+    """Spaltenweises Äquivalent zu _dt().
+
+    Parst die Spalte in einem Aufruf; nur Werte, die dabei nicht erkannt werden
+    (abweichendes Format, gemischte Offsets), laufen einzeln durch _dt().
+    """
+    missing = series.isna().to_numpy() | series.isin([""]).to_numpy()
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            parsed = pd.to_datetime(series, errors="coerce")
+    except (ValueError, TypeError):
+        parsed = None
+    if parsed is None or not pd.api.types.is_datetime64_any_dtype(parsed):
+        return _map_unique(series, _dt)
+
+    out = parsed.astype(object).to_numpy(dtype=object, copy=True)
+    unparsed = parsed.isna().to_numpy()
+    out[unparsed] = None
+    retry = unparsed & ~missing
+    if retry.any():
+        out[retry] = _map_unique(series[retry], _dt)
+    return out
+
+
+_CONVERTERS = {
+    "str": _col_str,
+    "num_str": _col_num_str,
+    "dec": _col_dec,
+    "int": _col_int,
+    "bool": _col_bool,
+    "dt": _col_dt,
+}
+
+
 # --- Tabellen-spezifische Insert-Logik ---
+# columns: (CSV-Spalte, SQL-Spalte, Zieltyp, max. Länge)
+# noticeVersion ist "num_str": ohne führende Nullen wie vor dem String-Import
+# key: Primärschlüssel (nur Tabellen ohne IDENTITY-Spalte)
 
 _TABLE_DEFS = {
     "notice": {
-        "sql": """INSERT INTO notices (notice_identifier, notice_version, procedure_identifier,
-                   procedure_legal_basis, form_type, notice_type, publication_date)
-                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
-        "cols": lambda r: (
-            _s(r.get("noticeIdentifier"), 100), _s(r.get("noticeVersion"), 10),
-            _s(r.get("procedureIdentifier"), 100), _s(r.get("procedureLegalBasis"), 50),
-            _s(r.get("formType"), 50), _s(r.get("noticeType"), 50),
-            _dt(r.get("publicationDate")),
-        ),
+        "table": "notices",
+        "key": ("notice_identifier", "notice_version"),
+        "columns": [
+            ("noticeIdentifier", "notice_identifier", "str", 100),
+            ("noticeVersion", "notice_version", "num_str", 10),
+            ("procedureIdentifier", "procedure_identifier", "str", 100),
+            ("procedureLegalBasis", "procedure_legal_basis", "str", 50),
+            ("formType", "form_type", "str", 50),
+            ("noticeType", "notice_type", "str", 50),
+            ("publicationDate", "publication_date", "dt", None),
+        ],
     },
     "procedure": {
-        "sql": """INSERT INTO procedures (notice_identifier, notice_version, cross_border_law,
-                   procedure_type, procedure_features, procedure_accelerated,
-                   lots_max_allowed, lots_all_required, lots_max_awarded)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        "cols": lambda r: (
-            _s(r.get("noticeIdentifier"), 100), _s(r.get("noticeVersion"), 10),
-            _s(r.get("crossBorderLaw"), 100), _s(r.get("procedureType"), 50),
-            _s(r.get("procedureFeatures")), _bool(r.get("procedureAccelerated")),
-            _int(r.get("lotsMaxAllowed")), _bool(r.get("lotsAllRequired")),
-            _int(r.get("lotsMaxAwarded")),
-        ),
+        "table": "procedures",
+        "key": ("notice_identifier", "notice_version"),
+        "columns": [
+            ("noticeIdentifier", "notice_identifier", "str", 100),
+            ("noticeVersion", "notice_version", "num_str", 10),
+            ("crossBorderLaw", "cross_border_law", "str", 100),
+            ("procedureType", "procedure_type", "str", 50),
+            ("procedureFeatures", "procedure_features", "str", None),
+            ("procedureAccelerated", "procedure_accelerated", "bool", None),
+            ("lotsMaxAllowed", "lots_max_allowed", "int", None),
+            ("lotsAllRequired", "lots_all_required", "bool", None),
+            ("lotsMaxAwarded", "lots_max_awarded", "int", None),
+        ],
     },
     "lot": {
-        "sql": """INSERT INTO lots (notice_identifier, notice_version, lot_identifier)
-                   VALUES (?, ?, ?)""",
-        "cols": lambda r: (
-            _s(r.get("noticeIdentifier"), 100), _s(r.get("noticeVersion"), 10),
-            _s(r.get("lotIdentifier"), 50),
-        ),
+        "table": "lots",
+        "key": ("notice_identifier", "notice_version", "lot_identifier"),
+        "columns": [
+            ("noticeIdentifier", "notice_identifier", "str", 100),
+            ("noticeVersion", "notice_version", "num_str", 10),
+            ("lotIdentifier", "lot_identifier", "str", 50),
+        ],
     },
     "purpose": {
-        "sql": """INSERT INTO purposes (notice_identifier, notice_version, lot_identifier,
-                   internal_identifier, main_nature, additional_nature,
-                   title, estimated_value, estimated_value_currency, description)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        "cols": lambda r: (
-            _s(r.get("noticeIdentifier"), 100), _s(r.get("noticeVersion"), 10),
-            _s(r.get("lotIdentifier"), 50), _s(r.get("internalIdentifier"), 100),
-            _s(r.get("mainNature"), 20), _s(r.get("additionalNature"), 50),
-            _s(r.get("title")), _dec(r.get("estimatedValue")),
-            _s(r.get("estimatedValueCurrency"), 3), _s(r.get("description")),
-        ),
+        "table": "purposes",
+        "columns": [
+            ("noticeIdentifier", "notice_identifier", "str", 100),
+            ("noticeVersion", "notice_version", "num_str", 10),
+            ("lotIdentifier", "lot_identifier", "str", 50),
+            ("internalIdentifier", "internal_identifier", "str", 100),
+            ("mainNature", "main_nature", "str", 20),
+            ("additionalNature", "additional_nature", "str", 50),
+            ("title", "title", "str", None),
+            ("estimatedValue", "estimated_value", "dec", None),
+            ("estimatedValueCurrency", "estimated_value_currency", "str", 3),
+            ("description", "description", "str", None),
+        ],
     },
     "classification": {
-        "sql": """INSERT INTO classifications (notice_identifier, notice_version, lot_identifier,
-                   classification_type, main_classification_code,
-                   additional_classification_codes, options)
-                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
-        "cols": lambda r: (
-            _s(r.get("noticeIdentifier"), 100), _s(r.get("noticeVersion"), 10),
-            _s(r.get("lotIdentifier"), 50), _s(r.get("classificationType"), 20),
-            _s(r.get("mainClassificationCode"), 20),
-            _s(r.get("additionalClassificationCodes")), _s(r.get("options")),
-        ),
+        "table": "classifications",
+        "columns": [
+            ("noticeIdentifier", "notice_identifier", "str", 100),
+            ("noticeVersion", "notice_version", "num_str", 10),
+            ("lotIdentifier", "lot_identifier", "str", 50),
+            ("classificationType", "classification_type", "str", 20),
+            ("mainClassificationCode", "main_classification_code", "str", 20),
+            ("additionalClassificationCodes", "additional_classification_codes", "str", None),
+            ("options", "options", "str", None),
+        ],
     },
     "organisation": {
-        "sql": """INSERT INTO organisations (notice_identifier, notice_version, organisation_name,
-                   organisation_identifier, organisation_city, organisation_post_code,
-                   organisation_country_subdivision, organisation_country_code,
-                   organisation_internet_address, organisation_natural_person,
-                   organisation_role, buyer_profile_url, buyer_legal_type,
-                   buyer_contracting_entity, winner_size, winner_owner_nationality,
-                   winner_listed)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        "cols": lambda r: (
-            _s(r.get("noticeIdentifier"), 100), _s(r.get("noticeVersion"), 10),
-            _s(r.get("organisationName"), 500), _s(r.get("organisationIdentifier"), 200),
-            _s(r.get("organisationCity"), 200), _s(r.get("organisationPostCode"), 20),
-            _s(r.get("organisationCountrySubdivision"), 10),
-            _s(r.get("organisationCountryCode"), 3),
-            _s(r.get("organisationInternetAddress"), 500),
-            _bool(r.get("organisationNaturalPerson")),
-            _s(r.get("organisationRole"), 50), _s(r.get("buyerProfileURL"), 500),
-            _s(r.get("buyerLegalType"), 50), _bool(r.get("buyerContractingEntity")),
-            _s(r.get("winnerSize"), 20), _s(r.get("winnerOwnerNationality"), 3),
-            _bool(r.get("winnerListed")),
-        ),
+        "table": "organisations",
+        "columns": [
+            ("noticeIdentifier", "notice_identifier", "str", 100),
+            ("noticeVersion", "notice_version", "num_str", 10),
+            ("organisationName", "organisation_name", "str", 500),
+            ("organisationIdentifier", "organisation_identifier", "str", 200),
+            ("organisationCity", "organisation_city", "str", 200),
+            ("organisationPostCode", "organisation_post_code", "str", 20),
+            ("organisationCountrySubdivision", "organisation_country_subdivision", "str", 10),
+            ("organisationCountryCode", "organisation_country_code", "str", 3),
+            ("organisationInternetAddress", "organisation_internet_address", "str", 500),
+            ("organisationNaturalPerson", "organisation_natural_person", "bool", None),
+            ("organisationRole", "organisation_role", "str", 50),
+            ("buyerProfileURL", "buyer_profile_url", "str", 500),
+            ("buyerLegalType", "buyer_legal_type", "str", 50),
+            ("buyerContractingEntity", "buyer_contracting_entity", "bool", None),
+            ("winnerSize", "winner_size", "str", 20),
+            ("winnerOwnerNationality", "winner_owner_nationality", "str", 3),
+            ("winnerListed", "winner_listed", "bool", None),
+        ],
     },
     "placeOfPerformance": {
-        "sql": """INSERT INTO places_of_performance (notice_identifier, notice_version,
-                   lot_identifier, street, town, post_code, country_subdivision, country_code)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-        "cols": lambda r: (
-            _s(r.get("noticeIdentifier"), 100), _s(r.get("noticeVersion"), 10),
-            _s(r.get("lotIdentifier"), 50), _s(r.get("street"), 500),
-            _s(r.get("town"), 200), _s(r.get("postCode"), 20),
-            _s(r.get("countrySubdivision"), 10), _s(r.get("countryCode"), 3),
-        ),
+        "table": "places_of_performance",
+        "columns": [
+            ("noticeIdentifier", "notice_identifier", "str", 100),
+            ("noticeVersion", "notice_version", "num_str", 10),
+            ("lotIdentifier", "lot_identifier", "str", 50),
+            ("street", "street", "str", 500),
+            ("town", "town", "str", 200),
+            ("postCode", "post_code", "str", 20),
+            ("countrySubdivision", "country_subdivision", "str", 10),
+            ("countryCode", "country_code", "str", 3),
+        ],
     },
     "submissionTerms": {
-        "sql": """INSERT INTO submission_terms (notice_identifier, notice_version, lot_identifier,
-                   tender_validity_deadline, tender_validity_deadline_unit,
-                   guarantee_required, public_opening_date)
-                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
-        "cols": lambda r: (
-            _s(r.get("noticeIdentifier"), 100), _s(r.get("noticeVersion"), 10),
-            _s(r.get("lotIdentifier"), 50), _dec(r.get("tenderValidityDeadline")),
-            _s(r.get("tenderValidityDeadlineUnit"), 20),
-            _bool(r.get("guaranteeRequired")), _dt(r.get("publicOpeningDate")),
-        ),
+        "table": "submission_terms",
+        "columns": [
+            ("noticeIdentifier", "notice_identifier", "str", 100),
+            ("noticeVersion", "notice_version", "num_str", 10),
+            ("lotIdentifier", "lot_identifier", "str", 50),
+            ("tenderValidityDeadline", "tender_validity_deadline", "dec", None),
+            ("tenderValidityDeadlineUnit", "tender_validity_deadline_unit", "str", 20),
+            ("guaranteeRequired", "guarantee_required", "bool", None),
+            ("publicOpeningDate", "public_opening_date", "dt", None),
+        ],
     },
     "tender": {
-        "sql": """INSERT INTO tenders (notice_identifier, notice_version, tender_identifier,
-                   lot_identifier, tender_value, tender_value_currency,
-                   tender_payment_value, tender_payment_value_currency,
-                   tender_penalties, tender_penalties_currency, tender_rank,
-                   concession_revenue_user, concession_revenue_user_currency,
-                   concession_revenue_buyer, concession_revenue_buyer_currency,
-                   country_origin)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-        "cols": lambda r: (
-            _s(r.get("noticeIdentifier"), 100), _s(r.get("noticeVersion"), 10),
-            _s(r.get("tenderIdentifier"), 50), _s(r.get("lotIdentifier"), 50),
-            _dec(r.get("tenderValue")), _s(r.get("tenderValueCurrency"), 3),
-            _dec(r.get("tenderPaymentValue")), _s(r.get("tenderPaymentValueCurrency"), 3),
-            _dec(r.get("tenderPenalties")), _s(r.get("tenderPenaltiesCurrency"), 3),
-            _int(r.get("tenderRank")),
-            _dec(r.get("concessionRevenueUser")), _s(r.get("concessionRevenueUserCurrency"), 3),
-            _dec(r.get("concessionRevenueBuyer")), _s(r.get("concessionRevenueBuyerCurrency"), 3),
-            _s(r.get("countryOrigin"), 3),
-        ),
+        "table": "tenders",
+        "columns": [
+            ("noticeIdentifier", "notice_identifier", "str", 100),
+            ("noticeVersion", "notice_version", "num_str", 10),
+            ("tenderIdentifier", "tender_identifier", "str", 50),
+            ("lotIdentifier", "lot_identifier", "str", 50),
+            ("tenderValue", "tender_value", "dec", None),
+            ("tenderValueCurrency", "tender_value_currency", "str", 3),
+            ("tenderPaymentValue", "tender_payment_value", "dec", None),
+            ("tenderPaymentValueCurrency", "tender_payment_value_currency", "str", 3),
+            ("tenderPenalties", "tender_penalties", "dec", None),
+            ("tenderPenaltiesCurrency", "tender_penalties_currency", "str", 3),
+            ("tenderRank", "tender_rank", "int", None),
+            ("concessionRevenueUser", "concession_revenue_user", "dec", None),
+            ("concessionRevenueUserCurrency", "concession_revenue_user_currency", "str", 3),
+            ("concessionRevenueBuyer", "concession_revenue_buyer", "dec", None),
+            ("concessionRevenueBuyerCurrency", "concession_revenue_buyer_currency", "str", 3),
+            ("countryOrigin", "country_origin", "str", 3),
+        ],
     },
 }
 
+for _table_def in _TABLE_DEFS.values():
+    _target_cols = [c[1] for c in _table_def["columns"]]
+    _table_def["sql"] = (
+        f"INSERT INTO {_table_def['table']} ({', '.join(_target_cols)}) "
+        f"VALUES ({', '.join('?' * len(_target_cols))})"
+    )
 
-def import_table(csv_name: str, df: pd.DataFrame) -> dict:
-    """Importiert einen DataFrame in die entsprechende SQL-Tabelle.
 
-    Returns:
-        {"imported": int, "errors": int, "skipped_dupes": int}
-    """
+def source_columns(csv_name: str) -> list[str] | None:
+    """CSV-Spalten, die der Import einer Tabelle liest (None = keine Definition)."""
     table_def = _TABLE_DEFS.get(csv_name)
     if not table_def:
-        logger.warning(f"Keine Definition für Tabelle '{csv_name}'")
-        return {"imported": 0, "errors": 0, "skipped_dupes": 0}
+        return None
+    return [c[0] for c in table_def["columns"]]
+
+
+def notice_keys(df: pd.DataFrame) -> set[tuple[str, str]]:
+    """(notice_identifier, notice_version) aller Zeilen eines Quell-Chunks.
+
+    Gleiche Konvertierung wie beim Import (trim, Längenkürzung), damit die
+    Schlüssel exakt denen in SQL entsprechen. Gilt für alle Tabellen, da
+    jede CSV die Notice-Schlüssel trägt.
+    """
+    columns = _TABLE_DEFS["notice"]["columns"][:2]
+    if df.empty or any(src not in df.columns for src, *_ in columns):
+        return set()
+    keys = df[[src for src, *_ in columns]].drop_duplicates()
+    idents, versions = (_CONVERTERS[typ](keys[src], max_len) for src, _dst, typ, max_len in columns)
+    return {(i, v) for i, v in zip(idents, versions) if i is not None and v is not None}
+
+
+def delete_notice_rows(csv_name: str, keys: Iterable[tuple[str, str]],
+                       batch_size: int = config.IMPORT_BATCH_SIZE) -> int:
+    """Löscht die Zeilen einer Tabelle ohne Primärschlüssel für die gegebenen Notices.
+
+    Tabellen mit IDENTITY-Spalte haben keinen natürlichen Schlüssel, an dem
+    der Import Dubletten erkennen könnte. Vor einem Re-Import (Re-Export eines
+    Tages) werden deshalb die Zeilen der betroffenen Notices entfernt.
+
+    Returns:
+        Anzahl gelöschter Zeilen
+    """
+    table_def = _TABLE_DEFS[csv_name]
+    keys = list(keys)
+    if not keys or table_def.get("key"):
+        return 0
 
-    import pyodbc
     engine = db.get_engine()
     raw_conn = engine.raw_connection()
     cursor = raw_conn.cursor()
+    try:
+        cursor.execute("IF OBJECT_ID('tempdb..#purge_keys') IS NOT NULL DROP TABLE #purge_keys")
+        cursor.execute("SELECT TOP 0 notice_identifier, notice_version "
+                       "INTO #purge_keys FROM notices")
+        cursor.fast_executemany = True
+        for i in range(0, len(keys), batch_size):
+            cursor.executemany(
+                "INSERT INTO #purge_keys (notice_identifier, notice_version) VALUES (?, ?)",
+                keys[i : i + batch_size],
+            )
+        cursor.execute(f"""
+            DELETE t FROM {table_def['table']} t
+            JOIN #purge_keys k
+              ON k.notice_identifier = t.notice_identifier
+             AND k.notice_version = t.notice_version
+        """)
+        deleted = cursor.rowcount
+        cursor.execute("DROP TABLE #purge_keys")
+        raw_conn.commit()
+    finally:
+        cursor.close()
+        raw_conn.close()
+    return max(deleted, 0)
+
+
+def purge_stream(chunks: Iterable[tuple[str, pd.DataFrame]],
+                 tables: set[str]) -> Iterator[tuple[str, pd.DataFrame]]:
+    """Reicht (Tabelle, Chunk)-Paare durch und löscht vorher die alten Zeilen.
+
+    Für jede Tabelle ohne Primärschlüssel in `tables` werden pro Notice
+    einmalig die vorhandenen Zeilen entfernt (delete_notice_rows), bevor ihr
+    erster Chunk importiert wird. Spätere Chunks derselben Notice löschen
+    nichts mehr. Tabellen mit Schlüssel erkennt der Import selbst als Dubletten.
+    """
+    tables = {t for t in tables if not _TABLE_DEFS[t].get("key")}
+    purged: dict[str, set] = {}
+    for csv_name, chunk in chunks:
+        if csv_name in tables:
+            done = purged.setdefault(csv_name, set())
+            keys = notice_keys(chunk) - done
+            if keys:
+                deleted = delete_notice_rows(csv_name, keys)
+                done |= keys
+                if deleted:
+                    logger.info(f"Re-Import {csv_name}: {deleted} alte Zeilen entfernt")
+        yield csv_name, chunk
+
+
+def convert_frame(csv_name: str, df: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
+    """Konvertiert ausgewählte Spalten eines Quell-Chunks wie beim Import.
+
+    Args:
+        columns: Ziel-Spaltennamen (SQL), z.B. ["notice_identifier", "title"]
+
+    Returns:
+        DataFrame mit den Ziel-Spalten und denselben Werten, die in SQL landen
+    """
+    specs = {c[1]: c for c in _TABLE_DEFS[csv_name]["columns"]}
+    out = {}
+    for dst in columns:
+        src, _dst, typ, max_len = specs[dst]
+        if src in df.columns:
+            out[dst] = _CONVERTERS[typ](df[src], max_len)
+        else:
+            out[dst] = np.full(len(df), None, dtype=object)
+    return pd.DataFrame(out)
+
+
+def _convert_columns(table_def: dict, df: pd.DataFrame) -> list[np.ndarray]:
+    """Konvertiert alle Spalten laut Spec; fehlende CSV-Spalten werden NULL."""
+    arrays = []
+    for src, _dst, typ, max_len in table_def["columns"]:
+        if src in df.columns:
+            arrays.append(_CONVERTERS[typ](df[src], max_len))
+        else:
+            arrays.append(np.full(len(df), None, dtype=object))
+    return arrays
+
+
+def _build_params(table_def: dict, df: pd.DataFrame) -> list[tuple]:
+    """Konvertiert einen DataFrame spaltenweise in bindbare Parameter-Tupel."""
+    if df.empty:
+        return []
+    return list(zip(*(a.tolist() for a in _convert_columns(table_def, df))))
 
-    imported = 0
-    errors = 0
-    dupes = 0
 
-    for _, row in df.iterrows():
+def _insert_rows(cursor, csv_name: str, sql: str, rows: list[tuple], stats: dict):
+    """Fügt Zeilen einzeln ein und zählt Duplikate/FK-Fehler/sonstige Fehler."""
+    import pyodbc
+
+    for params in rows:
         try:
-            params = table_def["cols"](row)
-            cursor.execute(table_def["sql"], params)
-            imported += 1
+            cursor.execute(sql, params)
+            stats["imported"] += 1
         except pyodbc.IntegrityError as e:
             if "PRIMARY KEY" in str(e) or "UNIQUE" in str(e):
-                dupes += 1
+                stats["skipped_dupes"] += 1
             elif "FOREIGN KEY" in str(e):
-                dupes += 1  # Parent nicht vorhanden
+                stats["skipped_dupes"] += 1  # Parent nicht vorhanden
             else:
-                errors += 1
-                if errors <= 3:
+                stats["errors"] += 1
+                if stats["errors"] <= 3:
                     logger.warning(f"  {csv_name} Integrity: {str(e)[:100]}")
         except Exception as e:
-            errors += 1
-            if errors <= 3:
+            stats["errors"] += 1
+            if stats["errors"] <= 3:
                 logger.warning(f"  {csv_name} Error: {str(e)[:100]}")
 
+
+def import_table(csv_name: str, df: pd.DataFrame) -> dict:
+    """Importiert einen DataFrame in die entsprechende SQL-Tabelle.
+
+    Returns:
+        {"imported": int, "errors": int, "skipped_dupes": int}
+    """
+    table_def = _TABLE_DEFS.get(csv_name)
+    if not table_def:
+        logger.warning(f"Keine Definition für Tabelle '{csv_name}'")
+        return {"imported": 0, "errors": 0, "skipped_dupes": 0}
+
+    engine = db.get_engine()
+    raw_conn = engine.raw_connection()
+    cursor = raw_conn.cursor()
+
+    stats = {"imported": 0, "errors": 0, "skipped_dupes": 0}
+    _insert_rows(cursor, csv_name, table_def["sql"], _build_params(table_def, df), stats)
+
     raw_conn.commit()
     cursor.close()
     raw_conn.close()
 
-    logger.info(f"  {csv_name}: {imported} importiert, {dupes} dupes, {errors} fehler")
-    return {"imported": imported, "errors": errors, "skipped_dupes": dupes}
+    logger.info(f"  {csv_name}: {stats['imported']} importiert, "
+                f"{stats['skipped_dupes']} dupes, {stats['errors']} fehler")
+    return stats
 
 
-def import_all(data: dict[str, pd.DataFrame], import_order: list[str]) -> dict:
-    """Importiert alle Tabellen in FK-Reihenfolge.
+def import_table_bulk(csv_name: str, df: pd.DataFrame,
+                      batch_size: int = config.IMPORT_BATCH_SIZE) -> dict:
+    """Importiert einen DataFrame batchweise via pyodbc fast_executemany.
+
+    Jeder Batch geht in einem Round-Trip an den Server und wird einzeln
+    committed. Schlägt ein Batch fehl (Duplikat, fehlender Parent, ...),
+    wird nur dieser Batch zurückgerollt und zeilenweise wiederholt, damit
+    die Statistik der von import_table entspricht.
+
+    Returns:
+        {"imported": int, "errors": int, "skipped_dupes": int}
+    """
+    table_def = _TABLE_DEFS.get(csv_name)
+    if not table_def:
+        logger.warning(f"Keine Definition für Tabelle '{csv_name}'")
+        return {"imported": 0, "errors": 0, "skipped_dupes": 0}
+
+    import pyodbc
+    rows = _build_params(table_def, df)
+
+    engine = db.get_engine()
+    raw_conn = engine.raw_connection()
+    cursor = raw_conn.cursor()
+    cursor.fast_executemany = True
+
+    stats = {"imported": 0, "errors": 0, "skipped_dupes": 0}
+    fallback_batches = 0
+
+    for i in range(0, len(rows), batch_size):
+        batch = rows[i : i + batch_size]
+        try:
+            cursor.executemany(table_def["sql"], batch)
+            raw_conn.commit()
+            stats["imported"] += len(batch)
+        except pyodbc.Error:
+            # Batch verwerfen und zeilenweise wiederholen (Dupes/FK zählen)
+            raw_conn.rollback()
+            fallback_batches += 1
+            _insert_rows(cursor, csv_name, table_def["sql"], batch, stats)
+            raw_conn.commit()
+
+    cursor.close()
+    raw_conn.close()
+
+    logger.info(f"  {csv_name}: {stats['imported']} importiert, "
+                f"{stats['skipped_dupes']} dupes, {stats['errors']} fehler "
+                f"({fallback_batches} Batches zeilenweise)")
+    return stats
+
+
+def _merge_sql(table_def: dict, stage: str) -> str:
+    """INSERT…SELECT aus der Staging-Tabelle mit Anti-Join gegen Dupes und Waisen.
+
+    Tabellen mit Primärschlüssel: erste Zeile pro Key aus der Datei gewinnt,
+    bereits vorhandene Keys werden übersprungen. Alle Tabellen außer notices
+    brauchen einen Parent in notices (FK).
+    """
+    table = table_def["table"]
+    cols = ", ".join(c[1] for c in table_def["columns"])
+    key = table_def.get("key")
+    conditions = []
+    source = stage
+    if key:
+        partition = ", ".join(key)
+        source = (f"(SELECT *, ROW_NUMBER() OVER (PARTITION BY {partition} "
+                  f"ORDER BY stage_row) AS stage_rank FROM {stage})")
+        conditions.append("s.stage_rank = 1")
+        match = " AND ".join(f"t.{k} = s.{k}" for k in key)
+        conditions.append(f"NOT EXISTS (SELECT 1 FROM {table} t WHERE {match})")
+    if table != "notices":
+        conditions.append(
+            "EXISTS (SELECT 1 FROM notices p"
+            " WHERE p.notice_identifier = s.notice_identifier"
+            " AND p.notice_version = s.notice_version)"
+        )
+    where = " AND ".join(conditions) or "1 = 1"
+    # ORDER BY legt die Vergabe der IDENTITY-Werte fest (Dateireihenfolge)
+    return (f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {source} s "
+            f"WHERE {where} ORDER BY s.stage_row")
+
+
+def import_table_merge(csv_name: str, df: pd.DataFrame,
+                       batch_size: int = config.IMPORT_BATCH_SIZE) -> dict:
+    """Importiert einen DataFrame über eine Staging-Tabelle (set-based).
+
+    Alle Zeilen gehen per fast_executemany in eine temporäre Tabelle; Duplikate
+    und fehlende Parents werden danach mit einem einzigen INSERT…SELECT pro
+    Tabelle aufgelöst statt über IntegrityErrors pro Zeile. Zeilen mit NULL
+    in Pflicht-Schlüsseln zählen wie bisher als Fehler. Scheitert der Weg
+    über die Staging-Tabelle, fällt der Import auf import_table_bulk zurück.
+
+    Returns:
+        {"imported": int, "errors": int, "skipped_dupes": int}
+    """
+    table_def = _TABLE_DEFS.get(csv_name)
+    if not table_def:
+        logger.warning(f"Keine Definition für Tabelle '{csv_name}'")
+        return {"imported": 0, "errors": 0, "skipped_dupes": 0}
+
+    import pyodbc
+    rows = _build_params(table_def, df)
+    target_cols = [c[1] for c in table_def["columns"]]
+    required = [target_cols.index(k)
+                for k in table_def.get("key", ("notice_identifier", "notice_version"))]
+    staged = [(i,) + row for i, row in enumerate(rows)
+              if all(row[k] is not None for k in required)]
+    stats = {"imported": 0, "errors": len(rows) - len(staged), "skipped_dupes": 0}
+
+    if staged:
+        table = table_def["table"]
+        stage = f"#stage_{table}"
+        cols = ", ".join(target_cols)
+
+        engine = db.get_engine()
+        raw_conn = engine.raw_connection()
+        cursor = raw_conn.cursor()
+        fallback = False
+        try:
+            cursor.execute(f"IF OBJECT_ID('tempdb..{stage}') IS NOT NULL DROP TABLE {stage}")
+            cursor.execute(f"SELECT TOP 0 CAST(0 AS INT) AS stage_row, {cols} "
+                           f"INTO {stage} FROM {table}")
+            cursor.fast_executemany = True
+            insert_sql = (f"INSERT INTO {stage} (stage_row, {cols}) "
+                          f"VALUES ({', '.join('?' * (len(target_cols) + 1))})")
+            for i in range(0, len(staged), batch_size):
+                cursor.executemany(insert_sql, staged[i : i + batch_size])
+
+            cursor.execute(_merge_sql(table_def, stage))
+            stats["imported"] = cursor.rowcount
+            stats["skipped_dupes"] = len(staged) - stats["imported"]
+            cursor.execute(f"DROP TABLE {stage}")
+            raw_conn.commit()
+        except pyodbc.Error as e:
+            raw_conn.rollback()
+            logger.warning(f"  {csv_name} Staging fehlgeschlagen, Fallback auf Bulk: {str(e)[:100]}")
+            fallback = True
+        finally:
+            cursor.close()
+            raw_conn.close()
+
+        if fallback:
+            return import_table_bulk(csv_name, df, batch_size)
+
+    logger.info(f"  {csv_name}: {stats['imported']} importiert, "
+                f"{stats['skipped_dupes']} dupes, {stats['errors']} fehler")
+    return stats
+
+
+_IMPORTERS = {
+    "rows": import_table,
+    "bulk": import_table_bulk,
+    "merge": import_table_merge,
+}
+
+
+class _TableChain:
+    """Importiert die Chunks einer Tabelle strikt nacheinander in Dateireihenfolge.
+
+    Der nächste Chunk wird erst eingereicht, wenn der vorige fertig ist; so
+    blockiert kein Worker wartend und die IDENTITY-ids folgen der Datei.
+    """
+
+    def __init__(self, pool: ThreadPoolExecutor, run, csv_name: str,
+                 slots: threading.Semaphore, abort: threading.Event):
+        self._pool = pool
+        self._run = run
+        self._csv_name = csv_name
+        self._slots = slots
+        self._abort = abort
+        self._lock = threading.RLock()
+        self._pending = deque()
+        self._running = False
+        self._idle = threading.Event()
+        self._idle.set()
+        self.results = []
+        self.error = None
+
+    def submit(self, chunk: pd.DataFrame):
+        with self._lock:
+            self._pending.append(chunk)
+            self._idle.clear()
+            if not self._running:
+                self._next()
+
+    def _next(self):
+        chunk = self._pending.popleft()
+        self._running = True
+        future = self._pool.submit(self._run, self._csv_name, chunk)
+        future.add_done_callback(self._done)
+
+    def _done(self, future: Future):
+        with self._lock:
+            self._running = False
+            self._slots.release()
+            try:
+                self.results.append(future.result())
+            except BaseException as e:
+                self.error = e
+            if self._pending and (self.error is not None or self._abort.is_set()):
+                for _ in self._pending:
+                    self._slots.release()
+                self._pending.clear()
+            if self._pending:
+                self._next()
+            else:
+                self._idle.set()
+
+    def wait(self):
+        """Wartet, bis alle eingereichten Chunks importiert sind."""
+        self._idle.wait()
+        if self.error is not None:
+            raise self.error
+
+
+def import_stream(chunks: Iterable[tuple[str, pd.DataFrame]], import_order: list[str],
+                  mode: str | None = None, dependencies: dict[str, list[str]] | None = None,
+                  max_workers: int | None = None) -> dict:
+    """Importiert (Tabelle, Chunk)-Paare, unabhängige Tabellen parallel.
+
+    Die Chunks müssen in FK-Reihenfolge kommen (TenderSource.iter_chunks).
+    Ein Chunk startet erst, wenn alle Chunks seiner Abhängigkeiten importiert
+    sind; Chunks derselben Tabelle laufen nacheinander in Dateireihenfolge
+    (_TableChain). Jeder Worker nutzt eine eigene Pool-Verbindung. Der nächste
+    Chunk wird schon erzeugt, während importiert wird.
 
     Args:
-        data: Dict csv_name → DataFrame (von TenderSource.fetch())
-        import_order: Reihenfolge der CSV-Namen
+        chunks: Iterator von (csv_name, DataFrame)
+        import_order: Alle erwarteten CSV-Namen (für "missing"-Statistik)
+        mode: "rows", "bulk" oder "merge" (Default: config.IMPORT_MODE)
+        dependencies: csv_name → Tabellen, die vorher fertig sein müssen
+            (Default: strikte Kette entlang import_order)
+        max_workers: Parallele Tabellen-Importe (Default: config.IMPORT_WORKERS)
 
     Returns:
-        Dict mit Statistiken pro Tabelle
+        Dict mit Statistiken pro Tabelle (über alle Chunks summiert),
+        inkl. "rows" und "seconds" (Importzeit der Tabelle)
     """
+    import_fn = _IMPORTERS[mode or config.IMPORT_MODE]
+    max_workers = max_workers or config.IMPORT_WORKERS
+    if dependencies is None:
+        dependencies = {name: import_order[:i] for i, name in enumerate(import_order)}
+
+    chains: dict[str, _TableChain] = {}
+    # Speicher begrenzen: nicht mehr als 2 Chunks pro Worker eingereicht oder wartend
+    slots = threading.Semaphore(2 * max_workers)
+    abort = threading.Event()
+
+    def run(csv_name: str, chunk: pd.DataFrame):
+        logger.info(f"Importiere {csv_name} ({len(chunk)} Zeilen)...")
+        started = time.monotonic()
+        result = import_fn(csv_name, chunk)
+        return result, len(chunk), time.monotonic() - started
+
+    wall_start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="import") as pool:
+        try:
+            prefetched = prefetch(iter(chunks), config.IMPORT_PREFETCH_CHUNKS,
+                                  name="import-prefetch")
+            for csv_name, chunk in prefetched:
+                for dep in dependencies.get(csv_name, []):
+                    if dep in chains:
+                        chains[dep].wait()
+                for chain in chains.values():
+                    if chain.error is not None:
+                        raise chain.error
+                slots.acquire()
+                if csv_name not in chains:
+                    chains[csv_name] = _TableChain(pool, run, csv_name, slots, abort)
+                chains[csv_name].submit(chunk)
+            for chain in chains.values():
+                chain.wait()
+        except BaseException:
+            # Laufende Chunks fertig werden lassen, aber keine weiteren einreichen
+            abort.set()
+            raise
+    wall = time.monotonic() - wall_start
+
     stats = {}
+    for csv_name, chain in chains.items():
+        table_stats = {"imported": 0, "errors": 0, "skipped_dupes": 0, "rows": 0, "seconds": 0.0}
+        for result, rows, seconds in chain.results:
+            for key, value in result.items():
+                table_stats[key] += value
+            table_stats["rows"] += rows
+            table_stats["seconds"] += seconds
+        table_stats["seconds"] = round(table_stats["seconds"], 2)
+        stats[csv_name] = table_stats
+
     for csv_name in import_order:
-        if csv_name in data:
-            logger.info(f"Importiere {csv_name} ({len(data[csv_name])} Zeilen)...")
-            stats[csv_name] = import_table(csv_name, data[csv_name])
-        else:
+        if csv_name not in stats:
             logger.info(f"  {csv_name}: nicht vorhanden (optional)")
             stats[csv_name] = {"imported": 0, "errors": 0, "skipped_dupes": 0, "missing": True}
+
+    if chains:
+        busy = sum(s.get("seconds", 0) for s in stats.values())
+        timings = ", ".join(f"{name} {s['seconds']:.1f}s" for name, s in stats.items()
+                            if not s.get("missing"))
+        logger.info(f"Import: {wall:.1f}s Wall, {busy:.1f}s Tabellen-Zeit "
+                    f"({max_workers} Worker) — {timings}")
     return stats
+
+
+def import_all(data: Mapping[str, pd.DataFrame], import_order: list[str],
+               mode: str | None = None, dependencies: dict[str, list[str]] | None = None) -> dict:
+    """Importiert alle Tabellen in FK-Reihenfolge.
+
+    Adapter über import_stream: lazy Mappings (CsvZipArchive, LakeTables)
+    werden chunkweise gelesen und danach geschlossen.
+
+    Args:
+        data: Mapping csv_name → DataFrame (von TenderSource.fetch())
+        import_order: Reihenfolge der CSV-Namen
+        mode: "rows", "bulk" oder "merge" (Default: config.IMPORT_MODE)
+        dependencies: FK-Graph für parallelen Import (siehe import_stream)
+
+    Returns:
+        Dict mit Statistiken pro Tabelle
+    """
+    chunks = iter_table_chunks(data, import_order, config.IMPORT_CHUNK_SIZE)
+    return import_stream(chunks, import_order, mode, dependencies)
@@ -0,0 +1,36 @@
+"""Name des aktiven Suchindex, ohne Abhängigkeit zu SQL oder OpenAI.
+
+Ein Rebuild (indexer.rebuild_index) befüllt einen neuen Index
+config.INDEX_NAME-<Zeitstempel> und schaltet danach um, indem er dessen Namen
+in config.INDEX_STATE_PATH schreibt; erst dann wird der alte Index gelöscht.
+Leser wie app.py lesen nur diese Datei, statt alle Indizes aufzulisten.
+"""
+import json
+import os
+from datetime import datetime
+
+import config
+
+
+def stored_index_name() -> str | None:
+    """Gespeicherter Name des aktiven Index (None, wenn nie umgeschaltet wurde)."""
+    try:
+        with open(config.INDEX_STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)["live"]
+    except FileNotFoundError:
+        return None
+
+
+def live_index_name() -> str:
+    """Name des aktiven Index (config.INDEX_NAME, solange keiner gespeichert ist)."""
+    return stored_index_name() or config.INDEX_NAME
+
+
+def set_live_index_name(name: str):
+    """Schaltet atomar auf `name` um: Leser sehen den alten oder den neuen Namen."""
+    path = config.INDEX_STATE_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    state = {"live": name, "switched_at": datetime.now().isoformat(timespec="seconds")}
+    tmp.write_text(json.dumps(state), encoding="utf-8")
+    os.replace(tmp, path)
@@ -1,10 +1,19 @@
 """Azure AI Search Index: Erstellen und Befüllen.
 
 Erstellt den vergabe-radar-v2 Index mit Vector + Keyword + Semantic Config
-und pusht Dokumente mit Embeddings hinein.
+und pusht Dokumente mit Embeddings hinein. Kompression (Scalar/Binary
+Quantization mit Rescoring) und HNSW-Parameter kommen aus config.VECTOR_*
+bzw. config.HNSW_*; die Speichergröße pro Dokument zeigt --index-stats.
+
+Ein Rebuild legt einen neuen Index config.INDEX_NAME-<Zeitstempel> an und
+schaltet erst nach dem Befüllen um, indem er dessen Namen in
+config.INDEX_STATE_PATH speichert (pipeline.index_state); danach wird der alte
+Index gelöscht.
 """
 import json
 import logging
+import re
+import time
 from datetime import datetime
 from azure.core.credentials import AzureKeyCredential
 from azure.search.documents import SearchClient
@@ -17,7 +26,12 @@ from azure.search.documents.indexes.models import (
     SearchableField,
     VectorSearch,
     HnswAlgorithmConfiguration,
+    HnswParameters,
     VectorSearchProfile,
+    ScalarQuantizationCompression,
+    ScalarQuantizationParameters,
+    BinaryQuantizationCompression,
+    RescoringOptions,
     SemanticConfiguration,
     SemanticSearch,
     SemanticPrioritizedFields,
@@ -25,17 +39,81 @@ from azure.search.documents.indexes.models import (
 )
 import config
 import db
+from pipeline import embedder, index_state
+from pipeline.streaming import prefetch
 
 logger = logging.getLogger(__name__)
 
 
-def create_index():
-    """Erstellt den vergabe-radar-v2 Index (idempotent)."""
-    client = SearchIndexClient(
+def _index_client() -> SearchIndexClient:
+    return SearchIndexClient(
         endpoint=config.SEARCH_ENDPOINT,
         credential=AzureKeyCredential(config.SEARCH_KEY),
     )
 
+
+_GENERATION_RE = re.compile(rf"{re.escape(config.INDEX_NAME)}(?:-(\d{{14}}))?")
+
+
+def _index_generations(client: SearchIndexClient) -> list[str]:
+    """Vorhandene Indizes der Namensfamilie, älteste zuerst (ohne Suffix = Ur-Index)."""
+    found = []
+    for name in client.list_index_names():
+        m = _GENERATION_RE.fullmatch(name)
+        if m:
+            found.append((m.group(1) or "", name))
+    return [name for _, name in sorted(found)]
+
+
+def live_index_name(client: SearchIndexClient | None = None) -> str:
+    """Name des aktiven Index laut index_state.
+
+    Fehlt der gespeicherte Name (Rebuild vor Einführung von index_state),
+    gilt einmalig der älteste Index der Namensfamilie und wird gespeichert.
+    """
+    name = index_state.stored_index_name()
+    if name is None:
+        generations = _index_generations(client or _index_client())
+        name = generations[0] if generations else config.INDEX_NAME
+        index_state.set_live_index_name(name)
+    return name
+
+
+def _vector_compression():
+    """Kompressions-Konfiguration nach config.VECTOR_COMPRESSION (None = keine)."""
+    if not config.VECTOR_COMPRESSION:
+        return None
+    rescoring = RescoringOptions(
+        enable_rescoring=config.VECTOR_RESCORING,
+        default_oversampling=config.VECTOR_OVERSAMPLING if config.VECTOR_RESCORING else None,
+        rescore_storage_method=config.VECTOR_RESCORE_STORAGE,
+    )
+    if config.VECTOR_COMPRESSION == "scalar":
+        return ScalarQuantizationCompression(
+            compression_name="vergabe-sq",
+            parameters=ScalarQuantizationParameters(quantized_data_type="int8"),
+            rescoring_options=rescoring,
+        )
+    if config.VECTOR_COMPRESSION == "binary":
+        return BinaryQuantizationCompression(
+            compression_name="vergabe-bq",
+            rescoring_options=rescoring,
+        )
+    raise ValueError(f"Unbekannte VECTOR_COMPRESSION: {config.VECTOR_COMPRESSION!r}")
+
+
+def create_index(name: str | None = None):
+    """Erstellt den vergabe-radar-v2 Index (idempotent).
+
+    Geänderte Vektor-Einstellungen (Kompression, HNSW, Dimensionen) lassen sich
+    nicht auf einen bestehenden Index anwenden; dafür --rebuild-index nutzen.
+
+    Args:
+        name: Indexname (Default: der aktive Index)
+    """
+    client = _index_client()
+    name = name or live_index_name(client)
+
     fields = [
         SimpleField(name="id", type=SearchFieldDataType.String, key=True, filterable=True),
         SearchableField(name="title", type=SearchFieldDataType.String, analyzer_name="de.microsoft"),
@@ -54,19 +132,33 @@ def create_index():
             name="content_vector",
             type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
             searchable=True,
+            # Nur für die Vektorsuche; die App liest den Vektor nie aus
+            hidden=not config.VECTOR_STORED,
+            stored=config.VECTOR_STORED,
             vector_search_dimensions=config.OPENAI_EMBEDDING_DIMENSIONS,
             vector_search_profile_name="vergabe-vector-profile",
         ),
     ]
 
+    compression = _vector_compression()
     vector_search = VectorSearch(
         algorithms=[
-            HnswAlgorithmConfiguration(name="vergabe-hnsw"),
+            HnswAlgorithmConfiguration(
+                name="vergabe-hnsw",
+                parameters=HnswParameters(
+                    m=config.HNSW_M,
+                    ef_construction=config.HNSW_EF_CONSTRUCTION,
+                    ef_search=config.HNSW_EF_SEARCH,
+                    metric="cosine",
+                ),
+            ),
         ],
+        compressions=[compression] if compression else None,
         profiles=[
             VectorSearchProfile(
                 name="vergabe-vector-profile",
                 algorithm_configuration_name="vergabe-hnsw",
+                compression_name=compression.compression_name if compression else None,
             ),
         ],
     )
@@ -84,7 +176,7 @@ def create_index():
     )
 
     index = SearchIndex(
-        name=config.INDEX_NAME,
+        name=name,
         fields=fields,
         vector_search=vector_search,
         semantic_search=SemanticSearch(configurations=[semantic_config]),
@@ -95,6 +187,50 @@ def create_index():
     return result
 
 
+def index_stats() -> dict:
+    """Speicherverbrauch des Index pro Dokument und Auslastung des Service-Quotas.
+
+    Returns:
+        document_count, storage_size, vector_index_size (Bytes) sowie
+        bytes_per_document / vector_bytes_per_document
+    """
+    client = _index_client()
+    name = live_index_name(client)
+    stats = client.get_index_statistics(name)
+    docs = stats.get("document_count", 0)
+    storage = stats.get("storage_size", 0)
+    vector = stats.get("vector_index_size", 0)
+    result = {
+        "document_count": docs,
+        "storage_size": storage,
+        "vector_index_size": vector,
+        "bytes_per_document": storage / docs if docs else 0.0,
+        "vector_bytes_per_document": vector / docs if docs else 0.0,
+    }
+
+    logger.info(f"Index '{name}': {docs} Dokumente "
+                f"({config.OPENAI_EMBEDDING_DIMENSIONS} Dim., Kompression: "
+                f"{config.VECTOR_COMPRESSION or 'keine'})")
+    logger.info(f"  Speicher:     {storage / 1024**2:8.1f} MB  "
+                f"({result['bytes_per_document']:,.0f} Bytes/Dokument)")
+    logger.info(f"  Vektorindex:  {vector / 1024**2:8.1f} MB  "
+                f"({result['vector_bytes_per_document']:,.0f} Bytes/Dokument)")
+
+    # Quota des Service-Tiers: wie viele Dokumente passen bei diesem Verbrauch?
+    counters = client.get_service_statistics().get("counters", {})
+    for label, name, per_doc in (
+        ("Speicher", "storage_size_counter", result["bytes_per_document"]),
+        ("Vektorindex", "vector_index_size_counter", result["vector_bytes_per_document"]),
+    ):
+        counter = counters.get(name) or {}
+        quota = counter.get("quota")
+        if quota and per_doc:
+            usage = counter.get("usage", 0)
+            logger.info(f"  {label}-Quota: {usage / quota:.0%} belegt, "
+                        f"Platz für ~{int(quota / per_doc):,} Dokumente")
+    return result
+
+
 def _format_doc(doc: dict) -> dict:
     """Formatiert ein Dokument für den Azure Search Upload."""
     search_doc = {
@@ -144,57 +280,247 @@ def _format_doc(doc: dict) -> dict:
     return search_doc
 
 
+def _search_client(name: str | None = None) -> SearchClient:
+    return SearchClient(
+        endpoint=config.SEARCH_ENDPOINT,
+        index_name=name or live_index_name(),
+        credential=AzureKeyCredential(config.SEARCH_KEY),
+    )
+
+
+def _upload_batch(client: SearchClient, batch: list[dict], label) -> list[str]:
+    """Lädt einen Batch hoch und gibt die ids der erfolgreichen Dokumente zurück."""
+    formatted = [_format_doc(d) for d in batch]
+    try:
+        result = client.upload_documents(documents=formatted)
+    except Exception as e:
+        logger.error(f"Upload-Fehler bei Batch {label}: {e}")
+        return []
+
+    succeeded = [r.key for r in result if r.succeeded]
+    failed = len(result) - len(succeeded)
+    if failed > 0:
+        logger.warning(f"Batch {label}: {failed} fehlgeschlagen")
+        for r in result:
+            if not r.succeeded:
+                logger.warning(f"  Doc {r.key}: {r.error_message}")
+                break  # Nur ersten Fehler loggen
+    return succeeded
+
+
 def upload_documents(docs: list[dict], batch_size: int = 500) -> int:
     """Pusht Dokumente nach Azure AI Search.
 
     Args:
-        docs: Liste von Dokumenten (aus embedder.embed_and_collect)
+        docs: Liste von Dokumenten mit content_vector (aus embedder.iter_embedded)
         batch_size: Dokumente pro Upload-Batch
 
     Returns:
         Anzahl erfolgreich hochgeladener Dokumente
     """
-    client = SearchClient(
-        endpoint=config.SEARCH_ENDPOINT,
-        index_name=config.INDEX_NAME,
-        credential=AzureKeyCredential(config.SEARCH_KEY),
-    )
+    client = _search_client()
 
     total = 0
     for i in range(0, len(docs), batch_size):
-        batch = docs[i : i + batch_size]
-        formatted = [_format_doc(d) for d in batch]
+        total += len(_upload_batch(client, docs[i : i + batch_size], i))
+
+    logger.info(f"Search Index: {total}/{len(docs)} Dokumente hochgeladen")
+    return total
+
+
+def index_pending(chunk_size: int | None = None, batch_size: int = 500) -> tuple[int, int]:
+    """Embedding → Upload → mark_indexed als Stream über alle offenen Dokumente.
+
+    Ein Hintergrund-Thread liest und embeddet die nächsten Chunks (höchstens
+    config.INDEX_PREFETCH_CHUNKS im Voraus), während hier der aktuelle Chunk
+    hochgeladen wird. Als indexiert markiert werden nur Dokumente, deren
+    Upload erfolgreich war.
+
+    Returns:
+        (embedded, indexed)
+    """
+    client = _search_client()
+    embedded = indexed = 0
+    for docs in prefetch(embedder.iter_embedded(chunk_size), config.INDEX_PREFETCH_CHUNKS,
+                         name="index-prefetch"):
+        embedded += len(docs)
+        for i in range(0, len(docs), batch_size):
+            doc_ids = _upload_batch(client, docs[i : i + batch_size], embedded - len(docs) + i)
+            mark_indexed(doc_ids)
+            indexed += len(doc_ids)
+
+    if embedded:
+        logger.info(f"Search Index: {indexed}/{embedded} Dokumente hochgeladen")
+    else:
+        logger.info("Keine Dokumente zum Embedden + Indexen")
+    return embedded, indexed
+
+
+def rebuild_index(chunk_size: int | None = None, batch_size: int = 500) -> int:
+    """Baut den Index neu auf, ohne den aktiven Index vorher anzutasten.
+
+    Reiner I/O-Job ohne Embedding-API: Felder und Vektoren kommen aus
+    search_documents + search_vectors und gehen in einen neuen Index
+    config.INDEX_NAME-<Zeitstempel>. Erst wenn er befüllt ist, wird auf ihn
+    umgeschaltet (index_state), der alte Index nach
+    config.INDEX_STATE_CACHE_SECONDS gelöscht und der Index-Status in SQL
+    angepasst. Bricht der Rebuild ab, bleibt der alte Index unverändert aktiv.
+
+    Dokumente ohne gespeicherten Vektor, mit fehlgeschlagenem Upload oder
+    während des Rebuilds geändert bleiben offen (indexed_at IS NULL) und
+    werden beim nächsten Lauf embeddet.
+
+    Returns:
+        Anzahl hochgeladener Dokumente
+    """
+    index_client = _index_client()
+    live = live_index_name(index_client)
+    generations = _index_generations(index_client)
+    # Reste abgebrochener Rebuilds
+    for name in generations:
+        if name != live:
+            index_client.delete_index(name)
+            logger.info(f"Unvollständigen Index '{name}' gelöscht")
+    if live not in generations:
+        live = None
+
+    started = db.fetch_all("SELECT GETDATE()")[0][0]
+    new_name = f"{config.INDEX_NAME}-{datetime.now():%Y%m%d%H%M%S}"
+    create_index(new_name)
+
+    client = _search_client(new_name)
+    read = indexed = 0
+    failed = []
+    try:
+        for docs in prefetch(embedder.iter_stored(chunk_size), config.INDEX_PREFETCH_CHUNKS,
+                             name="index-prefetch"):
+            for i in range(0, len(docs), batch_size):
+                batch = docs[i : i + batch_size]
+                doc_ids = set(_upload_batch(client, batch, read + i))
+                failed.extend(d["id"] for d in batch if d["id"] not in doc_ids)
+                indexed += len(doc_ids)
+            read += len(docs)
+            logger.info(f"  {indexed}/{read} hochgeladen...")
+        if read and not indexed:
+            raise RuntimeError("kein Dokument hochgeladen")
+    except Exception as e:
+        logger.error(f"Index-Rebuild abgebrochen, '{live or config.INDEX_NAME}' bleibt aktiv: {e}")
+        index_client.delete_index(new_name)
+        raise
+
+    # Umschalten; den alten Index erst löschen, wenn Leser den neuen Namen sehen
+    index_state.set_live_index_name(new_name)
+    logger.info(f"Index '{new_name}' aktiv")
+    if live:
+        time.sleep(config.INDEX_STATE_CACHE_SECONDS)
+        index_client.delete_index(live)
+        logger.info(f"Alten Index '{live}' gelöscht")
+    _reset_index_state(started, failed)
+
+    pending = db.fetch_all("""
+        SELECT COUNT(*) FROM search_documents
+        WHERE indexed_at IS NULL AND embedding_text IS NOT NULL
+    """)[0][0]
+    logger.info(f"Index-Rebuild: {indexed} Dokumente aus gespeicherten Vektoren, "
+                f"{pending} offen (ohne Vektor oder Upload fehlgeschlagen)")
+    return indexed
+
+
+def _reset_index_state(started: datetime, failed: list[str],
+                       batch_size: int = config.IMPORT_BATCH_SIZE):
+    """Setzt indexed_at nach einem Rebuild auf den Inhalt des neuen Index.
+
+    Indexiert ist, was iter_stored geliefert hat (gespeicherter Vektor) und
+    seit Rebuild-Beginn unverändert ist, abzüglich fehlgeschlagener Uploads.
+    Vorgemerkte Löschungen sind gegenstandslos.
+    """
+    engine = db.get_engine()
+    raw_conn = engine.raw_connection()
+    cursor = raw_conn.cursor()
+    try:
+        cursor.execute("""
+            UPDATE sd SET indexed_at = CASE
+                WHEN (sd.updated_at IS NULL OR sd.updated_at <= ?) AND EXISTS (
+                    SELECT 1 FROM search_vectors sv
+                    WHERE sv.embedding_hash = sd.embedding_hash
+                      AND sv.model = ? AND sv.dims = ?
+                ) THEN GETDATE()
+            END
+            FROM search_documents sd
+        """, started, config.OPENAI_EMBEDDING_DEPLOYMENT, config.OPENAI_EMBEDDING_DIMENSIONS)
+        if failed:
+            cursor.fast_executemany = True
+            for i in range(0, len(failed), batch_size):
+                cursor.executemany(
+                    "UPDATE search_documents SET indexed_at = NULL WHERE id = ?",
+                    [(doc_id,) for doc_id in failed[i : i + batch_size]],
+                )
+        cursor.execute("DELETE FROM search_deletions")
+        raw_conn.commit()
+    finally:
+        cursor.close()
+        raw_conn.close()
+
+
+def process_deletions(batch_size: int = 1000) -> int:
+    """Löscht abgelöste Dokument-Versionen aus dem Index (Queue: search_deletions).
+
+    Erfolgreich gelöschte ids werden aus der Queue entfernt; fehlgeschlagene
+    bleiben für den nächsten Lauf stehen.
+
+    Returns:
+        Anzahl gelöschter Dokumente
+    """
+    client = _search_client()
+
+    total = 0
+    while True:
+        rows = db.fetch_all(
+            "SELECT TOP (:n) id FROM search_deletions ORDER BY enqueued_at",
+            {"n": batch_size},
+        )
+        if not rows:
+            break
 
         try:
-            result = client.upload_documents(documents=formatted)
-            succeeded = sum(1 for r in result if r.succeeded)
-            failed = sum(1 for r in result if not r.succeeded)
-            total += succeeded
-            if failed > 0:
-                logger.warning(f"Batch {i}: {failed} fehlgeschlagen")
-                for r in result:
-                    if not r.succeeded:
-                        logger.warning(f"  Doc {r.key}: {r.error_message}")
-                        break  # Nur ersten Fehler loggen
+            result = client.delete_documents(documents=[{"id": r[0]} for r in rows])
         except Exception as e:
-            logger.error(f"Upload-Fehler bei Batch {i}: {e}")
+            logger.error(f"Lösch-Fehler: {e}")
+            break
+        done = [r.key for r in result if r.succeeded]
+        if done:
+            engine = db.get_engine()
+            raw_conn = engine.raw_connection()
+            cursor = raw_conn.cursor()
+            cursor.fast_executemany = True
+            cursor.executemany("DELETE FROM search_deletions WHERE id = ?", [(k,) for k in done])
+            raw_conn.commit()
+            cursor.close()
+            raw_conn.close()
+        total += len(done)
+        if len(done) < len(rows):
+            logger.warning(f"Search Index: {len(rows) - len(done)} Löschungen fehlgeschlagen")
+            break
 
-    logger.info(f"Search Index: {total}/{len(docs)} Dokumente hochgeladen")
+    if total:
+        logger.info(f"Search Index: {total} abgelöste Versionen gelöscht")
     return total
 
 
 def mark_indexed(doc_ids: list[str]):
-    """Markiert Dokumente als erfolgreich indexiert."""
+    """Markiert Dokumente als erfolgreich indexiert (ein executemany pro Aufruf)."""
+    if not doc_ids:
+        return
     engine = db.get_engine()
     raw_conn = engine.raw_connection()
     cursor = raw_conn.cursor()
-
-    for doc_id in doc_ids:
-        cursor.execute(
+    cursor.fast_executemany = True
+    try:
+        cursor.executemany(
             "UPDATE search_documents SET indexed_at = GETDATE() WHERE id = ?",
-            doc_id,
+            [(doc_id,) for doc_id in doc_ids],
         )
-
-    raw_conn.commit()
-    cursor.close()
-    raw_conn.close()
+        raw_conn.commit()
+    finally:
+        cursor.close()
+        raw_conn.close()
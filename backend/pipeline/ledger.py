@@ -0,0 +1,77 @@
+"""Import-Ledger: welche Tage/Tabellen mit welchem Inhalt schon importiert sind.
+
+Schlüssel ist (source, import_date, table_name); gespeichert werden
+Content-Hash, Zeilenzahlen, Fehler und Dauer. Damit überspringt run_daily
+Tage, deren Export sich nicht geändert hat, und importiert bei Re-Exporten
+nur die Tabellen mit neuem Hash oder Fehlern. Tabelle: migrations.py
+"""
+import logging
+from datetime import date
+import db
+
+logger = logging.getLogger(__name__)
+
+
+def _recorded(source: str, target_date: date) -> dict[str, tuple[str, int]]:
+    """table_name → (content_hash, errors) der bereits importierten Tabellen eines Tages."""
+    rows = db.fetch_all(
+        "SELECT table_name, content_hash, errors FROM import_ledger "
+        "WHERE source = :source AND import_date = :d",
+        {"source": source, "d": target_date},
+    )
+    return {r[0]: (r[1], r[2]) for r in rows}
+
+
+def changed_tables(source: str, target_date: date, hashes: dict[str, str]) -> list[str]:
+    """Tabellen, die (erneut) importiert werden müssen.
+
+    Das sind neue Tabellen, solche mit abweichendem Hash und solche, deren
+    letzter Import Fehler hatte.
+    """
+    known = _recorded(source, target_date)
+    return [
+        name for name, h in hashes.items()
+        if name not in known or known[name][0] != h or known[name][1] > 0
+    ]
+
+
+def record(source: str, target_date: date, import_stats: dict, hashes: dict[str, str]):
+    """Schreibt/aktualisiert die Ledger-Einträge der importierten Tabellen.
+
+    Tabellen mit Fehlern werden mit ihrer Fehlerzahl vermerkt; changed_tables
+    liefert sie beim nächsten Lauf erneut zum Import.
+    """
+    entries = [
+        {
+            "source": source,
+            "d": target_date,
+            "table_name": name,
+            "content_hash": hashes[name],
+            "row_count": s.get("rows", 0),
+            "imported": s.get("imported", 0),
+            "skipped_dupes": s.get("skipped_dupes", 0),
+            "errors": s.get("errors", 0),
+            "duration_ms": int(s.get("seconds", 0) * 1000),
+        }
+        for name, s in import_stats.items()
+        if name in hashes and not s.get("missing")
+    ]
+    if not entries:
+        return
+
+    db.execute("""
+        MERGE import_ledger AS t
+        USING (SELECT :source AS source, :d AS import_date, :table_name AS table_name) AS s
+            ON t.source = s.source AND t.import_date = s.import_date
+           AND t.table_name = s.table_name
+        WHEN MATCHED THEN UPDATE SET
+            content_hash = :content_hash, row_count = :row_count, imported = :imported,
+            skipped_dupes = :skipped_dupes, errors = :errors, duration_ms = :duration_ms,
+            imported_at = SYSUTCDATETIME()
+        WHEN NOT MATCHED THEN INSERT
+            (source, import_date, table_name, content_hash, row_count, imported,
+             skipped_dupes, errors, duration_ms)
+            VALUES (:source, :d, :table_name, :content_hash, :row_count, :imported,
+                    :skipped_dupes, :errors, :duration_ms);
+    """, entries)
+    logger.info(f"Import-Ledger: {len(entries)} Tabellen für {target_date} vermerkt")
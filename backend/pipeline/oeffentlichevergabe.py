@@ -2,14 +2,21 @@
 
 Lädt tägliche CSV-Exporte mit 9 Tabellen pro Tag.
 """
-import io
-import zipfile
 import logging
+import tempfile
+import threading
+import zipfile
+from collections.abc import Mapping
 from datetime import date
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import config
+from pipeline.archive_cache import ArchiveCache, check_zip
 from pipeline.base_source import TenderSource
+from pipeline.csv_archive import CsvZipArchive
+from pipeline.importer import source_columns
 
 logger = logging.getLogger(__name__)
 
@@ -33,51 +40,191 @@ IMPORT_ORDER = [
     "submissionTerms", "tender",
 ]
 
+# Abhängigkeitsgraph: nach notice (und lot für Lot-bezogene Tabellen)
+# sind die übrigen Tabellen voneinander unabhängig
+IMPORT_DEPENDENCIES = {
+    "notice": [],
+    "procedure": ["notice"],
+    "lot": ["notice"],
+    "purpose": ["notice", "lot"],
+    "classification": ["notice", "lot"],
+    "organisation": ["notice"],
+    "placeOfPerformance": ["notice", "lot"],
+    "submissionTerms": ["notice", "lot"],
+    "tender": ["notice", "lot"],
+}
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Geteilte HTTP-Session (lazy init, thread-safe)
+_session = None
+_session_lock = threading.Lock()
+
+
+def _get_session() -> requests.Session:
+    """Session mit Keep-Alive-Pool und Retry/Backoff für 429/5xx."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            retry = Retry(
+                total=config.HTTP_RETRIES,
+                backoff_factor=config.HTTP_BACKOFF,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET"],
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=config.HTTP_POOL_SIZE, max_retries=retry
+            )
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
 
 class OeffentlicheVergabeSource(TenderSource):
-    """Datenquelle: oeffentlichevergabe.de CSV-Export API."""
+    """Datenquelle: oeffentlichevergabe.de CSV-Export API.
+
+    Args:
+        offline: Nur aus dem Archiv-Cache lesen, nie herunterladen
+        use_cache: Archiv-Cache (config.ARCHIVE_CACHE_DIR) verwenden
+    """
+
+    def __init__(self, offline: bool = False, use_cache: bool = True):
+        self.cache = None
+        if use_cache and config.ARCHIVE_CACHE_DIR:
+            revalidate = config.ARCHIVE_CACHE_REVALIDATE_HOURS
+            self.cache = ArchiveCache(
+                config.ARCHIVE_CACHE_DIR, config.ARCHIVE_CACHE_MAX_MB * 1024 * 1024,
+                revalidate_after=revalidate * 3600 if revalidate is not None else None,
+            )
+        if offline and self.cache is None:
+            raise ValueError("Offline-Modus braucht den Archiv-Cache (config.ARCHIVE_CACHE_DIR)")
+        self.offline = offline
 
     @property
     def name(self) -> str:
         return "oeffentlichevergabe"
 
-    def fetch(self, target_date: date) -> dict[str, pd.DataFrame]:
-        """Lädt CSV-Export für einen Tag und gibt DataFrames zurück."""
+    def fetch(self, target_date: date) -> Mapping[str, pd.DataFrame]:
+        """Lädt den CSV-Export für einen Tag (Cache zuerst).
+
+        Zurück kommt ein CsvZipArchive, das jede CSV erst beim Zugriff parst;
+        der Aufrufer schließt es nach dem Import mit close(). Veraltete
+        Cache-Einträge werden per Conditional GET geprüft (Re-Exporte).
+        """
         date_str = target_date.isoformat()
-        url = config.API_BASE_URL
-        params = {"pubDay": date_str, "format": "csv.zip"}
 
-        logger.info(f"Download {date_str} von {url}")
-        try:
-            resp = requests.get(url, params=params, timeout=120)
-        except requests.RequestException as e:
-            logger.error(f"Download fehlgeschlagen: {e}")
+        cached = None
+        if self.cache is not None:
+            cached = self.cache.lookup(self.name, target_date)
+            fresh = self.offline or not self.cache.is_stale(self.name, target_date)
+            if cached is not None and fresh:
+                logger.info(f"Archiv-Cache: {date_str} ({cached.name[:12]}...)")
+                return self._open_archive(open(cached, "rb"))
+            if cached is None and fresh and self.cache.is_empty_day(self.name, target_date):
+                logger.info(f"Keine Daten für {date_str} (Archiv-Cache)")
+                return {}
+
+        if self.offline:
+            logger.warning(f"{date_str} nicht im Archiv-Cache (offline)")
             return {}
 
-        if resp.status_code == 400:
-            logger.info(f"Keine Daten für {date_str} (Wochenende/Feiertag)")
+        fileobj = self._download(target_date, cached)
+        return self._open_archive(fileobj) if fileobj is not None else {}
+
+    def _open_archive(self, fileobj) -> CsvZipArchive:
+        """Öffnet das ZIP; importierte Tabellen werden nur mit ihren Import-Spalten geparst."""
+        columns = {name: source_columns(name) for name in IMPORT_ORDER}
+        return CsvZipArchive(fileobj, columns=columns)
+
+    def table_hashes(self, target_date: date) -> dict[str, str]:
+        """CRC32/Größe pro CSV aus dem ZIP-Verzeichnis.
+
+        Nur mit Archiv-Cache: der anschließende Import liest dann dasselbe
+        Archiv aus dem Cache, statt ein zweites Mal herunterzuladen.
+        """
+        if self.cache is None:
             return {}
-        if resp.status_code != 200:
-            logger.error(f"HTTP {resp.status_code} für {date_str}")
+        data = self.fetch(target_date)
+        if not data:
             return {}
+        try:
+            return {name: h for name, h in data.table_hashes().items() if name in IMPORT_ORDER}
+        finally:
+            data.close()
+
+    def _download(self, target_date: date, cached=None):
+        """Streamt den Export in den Archiv-Cache bzw. eine SpooledTemporaryFile.
+
+        Ohne Cache wird ab config.DOWNLOAD_SPOOL_MAX_MB auf Platte ausgelagert.
+        Mit `cached` (Revalidierung) gehen ETag/Last-Modified als Conditional
+        Request mit; bei 304 oder Netzwerkfehler bleibt das gecachte Archiv.
 
-        size_mb = len(resp.content) / (1024 * 1024)
-        logger.info(f"  {size_mb:.2f} MB heruntergeladen")
+        Returns:
+            Lesbares Datei-Objekt am Anfang des ZIPs, None ohne Daten
+        """
+        date_str = target_date.isoformat()
+        url = config.API_BASE_URL
+        params = {"pubDay": date_str, "format": "csv.zip"}
+        headers = {}
+        if cached is not None:
+            validators = self.cache.validators(self.name, target_date)
+            if "etag" in validators:
+                headers["If-None-Match"] = validators["etag"]
+            if "last_modified" in validators:
+                headers["If-Modified-Since"] = validators["last_modified"]
 
-        # ZIP entpacken → DataFrames
-        result = {}
-        with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
-            csv_files = {f.replace(".csv", ""): f for f in zf.namelist() if f.endswith(".csv")}
-            for csv_name, filename in csv_files.items():
-                with zf.open(filename) as f:
-                    df = pd.read_csv(f)
-                    result[csv_name] = df
-                    logger.info(f"  {csv_name}: {len(df)} Zeilen")
+        logger.info(f"Download {date_str} von {url}" + (" (Revalidierung)" if cached else ""))
+        try:
+            with _get_session().get(url, params=params, headers=headers,
+                                    timeout=120, stream=True) as resp:
+                if resp.status_code == 304 and cached is not None:
+                    logger.info(f"  {date_str} unverändert (304), Archiv-Cache")
+                    self.cache.mark_checked(self.name, target_date)
+                    return open(cached, "rb")
+                if resp.status_code == 400:
+                    logger.info(f"Keine Daten für {date_str} (Wochenende/Feiertag)")
+                    # Nur abgeschlossene Tage merken, heute kann noch etwas kommen
+                    if self.cache is not None and target_date < date.today():
+                        self.cache.mark_empty(self.name, target_date)
+                    return None
+                if resp.status_code != 200:
+                    logger.error(f"HTTP {resp.status_code} für {date_str}")
+                    return open(cached, "rb") if cached is not None else None
 
-        return result
+                chunks = resp.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE)
+                if self.cache is not None:
+                    validators = {"etag": resp.headers.get("ETag"),
+                                  "last_modified": resp.headers.get("Last-Modified")}
+                    path = self.cache.store(self.name, target_date, chunks, validators)
+                    if cached is not None and path == cached:
+                        logger.info(f"  {date_str} inhaltlich unverändert")
+                    fileobj = open(path, "rb")
+                    size = path.stat().st_size
+                else:
+                    fileobj = tempfile.SpooledTemporaryFile(
+                        max_size=config.DOWNLOAD_SPOOL_MAX_MB * 1024 * 1024
+                    )
+                    size = 0
+                    for chunk in chunks:
+                        fileobj.write(chunk)
+                        size += len(chunk)
+                    fileobj.seek(0)
+                    check_zip(fileobj)
+        except (requests.RequestException, zipfile.BadZipFile) as e:
+            logger.error(f"Download fehlgeschlagen: {e}")
+            return open(cached, "rb") if cached is not None else None
+
+        logger.info(f"  {size / (1024 * 1024):.2f} MB heruntergeladen")
+        return fileobj
 
     def get_import_order(self) -> list[str]:
         return IMPORT_ORDER
 
+    def get_import_dependencies(self) -> dict[str, list[str]]:
+        return IMPORT_DEPENDENCIES
+
     def get_table_name(self, csv_name: str) -> str:
         return TABLE_MAP.get(csv_name, csv_name)
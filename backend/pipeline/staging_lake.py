@@ -0,0 +1,138 @@
+"""Parquet-Staging-Lake für geparste Quelltabellen.
+
+Jeder Tag wird beim Import (als Durchreiche der Chunks) als Parquet abgelegt:
+  <root>/source=<name>/table=<csv_name>/date=<YYYY-MM-DD>/part-0.parquet
+
+Re-Importe, Schema-Migrationen und Analysen lesen danach nur noch den Lake
+(spaltenweise, komprimiert) statt erneut die API. Das Hive-Layout kann
+direkt mit pyarrow.dataset / pandas.read_parquet gelesen werden.
+"""
+import importlib.util
+import logging
+import os
+from collections.abc import Iterator, Mapping
+from datetime import date
+from pathlib import Path
+import pandas as pd
+import config
+from pipeline.base_source import TenderSource
+
+logger = logging.getLogger(__name__)
+
+PART_FILE = "part-0.parquet"
+
+
+def is_enabled() -> bool:
+    """Lake ist konfiguriert und pyarrow installiert."""
+    return bool(config.STAGING_LAKE_DIR) and importlib.util.find_spec("pyarrow") is not None
+
+
+def _part_path(source_name: str, csv_name: str, target_date: date) -> Path:
+    return (Path(config.STAGING_LAKE_DIR) / f"source={source_name}" / f"table={csv_name}"
+            / f"date={target_date.isoformat()}" / PART_FILE)
+
+
+def tee(source_name: str, target_date: date,
+        chunks: Iterator[tuple[str, pd.DataFrame]]) -> Iterator[tuple[str, pd.DataFrame]]:
+    """Reicht (Tabelle, Chunk)-Paare durch und schreibt sie dabei in den Lake.
+
+    Pro Tabelle entsteht eine Parquet-Datei mit einer Row-Group je Chunk; sie
+    wird erst nach dem letzten Chunk atomar an ihren Platz verschoben. Bricht
+    der Verbraucher ab, bleibt der bisherige Stand des Tages unverändert.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writers = {}
+    rows = {}
+    completed = False
+    try:
+        for csv_name, chunk in chunks:
+            writer = writers.get(csv_name)
+            if writer is None:
+                path = _part_path(source_name, csv_name, target_date)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+                # Komplett leere Spalten im ersten Chunk als String anlegen
+                schema = pa.schema([f.with_type(pa.string()) if pa.types.is_null(f.type) else f
+                                    for f in schema], metadata=schema.metadata)
+                writer = pq.ParquetWriter(path.with_suffix(".tmp"), schema, compression="zstd")
+                writers[csv_name] = writer
+                rows[csv_name] = 0
+            writer.write_table(pa.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False))
+            rows[csv_name] += len(chunk)
+            yield csv_name, chunk
+        completed = True
+    finally:
+        for csv_name, writer in writers.items():
+            writer.close()
+            path = _part_path(source_name, csv_name, target_date)
+            if completed:
+                os.replace(path.with_suffix(".tmp"), path)
+            else:
+                path.with_suffix(".tmp").unlink(missing_ok=True)
+
+    logger.info(f"Staging-Lake: {target_date} ({sum(rows.values())} Zeilen in {len(rows)} Tabellen)")
+
+
+class LakeTables(Mapping):
+    """Lazy Mapping csv_name → DataFrame für einen Tag im Lake."""
+
+    def __init__(self, source_name: str, target_date: date, tables: list[str]):
+        self._paths = {}
+        for csv_name in tables:
+            path = _part_path(source_name, csv_name, target_date)
+            if path.exists():
+                self._paths[csv_name] = path
+
+    def __getitem__(self, csv_name: str) -> pd.DataFrame:
+        return pd.read_parquet(self._paths[csv_name])
+
+    def iter_chunks(self, csv_name: str, chunk_size: int):
+        """Streamt eine Tabelle in Row-Batches aus der Parquet-Datei."""
+        import pyarrow.parquet as pq
+
+        parquet = pq.ParquetFile(self._paths[csv_name])
+        yielded = False
+        for batch in parquet.iter_batches(batch_size=chunk_size):
+            yielded = True
+            yield batch.to_pandas()
+        if not yielded:
+            yield parquet.schema_arrow.empty_table().to_pandas()
+
+    def __contains__(self, csv_name) -> bool:
+        return csv_name in self._paths
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+
+class LakeSource(TenderSource):
+    """Datenquelle, die Tage aus dem Staging-Lake wiederholt (kein Netzwerk).
+
+    Args:
+        source: Ursprüngliche Quelle (liefert Name und Import-Reihenfolge)
+    """
+
+    def __init__(self, source: TenderSource):
+        self._source = source
+
+    @property
+    def name(self) -> str:
+        return self._source.name
+
+    def fetch(self, target_date: date) -> Mapping[str, pd.DataFrame]:
+        tables = LakeTables(self.name, target_date, self.get_import_order())
+        if not tables:
+            logger.info(f"Staging-Lake: keine Daten für {target_date}")
+            return {}
+        return tables
+
+    def get_import_order(self) -> list[str]:
+        return self._source.get_import_order()
+
+    def get_import_dependencies(self) -> dict[str, list[str]]:
+        return self._source.get_import_dependencies()
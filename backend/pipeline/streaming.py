@@ -0,0 +1,53 @@
+"""Hilfen für Generator-Pipelines (Vorladen in einem Hintergrund-Thread)."""
+import queue
+import threading
+from collections.abc import Iterator
+
+
+def prefetch(items: Iterator, depth: int, name: str = "prefetch") -> Iterator:
+    """Erzeugt die nächsten `depth` Elemente in einem Hintergrund-Thread vor.
+
+    So laufen z.B. Download/Parsen des nächsten Chunks und der SQL-Import des
+    aktuellen Chunks gleichzeitig. Fehler des Erzeugers werden beim
+    Verbraucher erneut geworfen. Bricht der Verbraucher ab, beendet sich der
+    Thread beim nächsten Versuch, in den vollen Puffer zu schreiben.
+    """
+    done = object()
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(entry) -> bool:
+        """Schreibt in den Puffer, solange der Verbraucher noch liest."""
+        while not stop.is_set():
+            try:
+                buffer.put(entry, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except BaseException as e:
+            put((done, e))
+        finally:
+            # Quelle sauber schließen (Archive, Lake-Writer), auch bei Abbruch
+            if hasattr(items, "close"):
+                items.close()
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = buffer.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,253 @@
+"""Content-adressierter Cache für Embedding-Vektoren.
+
+Schlüssel ist (embedding_hash, Modell, Dimensionen): gleicher Text ergibt
+denselben Vektor, egal ob neue Notice-Version, Re-Run oder Index-Rebuild.
+Nur Cache-Misses kosten API-Calls.
+
+Layout pro Modell/Dimension:
+  <root>/<model>-<dims>/vectors.f16   feste Records, float16 (dims * 2 Bytes)
+  <root>/<model>-<dims>/index.npy     (hash S32, slot u4, used f8) je Eintrag
+  <root>/<model>-<dims>/cache.lock    Lock-Datei mit Generationszähler
+
+Neue Vektoren werden sofort angehängt, der Index wird mit flush() atomar
+geschrieben. Überschreitet der Cache config.VECTOR_CACHE_MAX_MB, werden die
+am längsten nicht genutzten Einträge verworfen und die Datei kompaktiert.
+
+Mehrere Prozesse (z.B. parallele Pipeline-Läufe) dürfen denselben Cache
+nutzen: Anhängen, Lesen, flush() und Verdrängen laufen unter einer
+Datei-Sperre. Kompaktieren oder Kürzen erhöht die Generation in der
+Lock-Datei; andere Prozesse laden daraufhin den Index neu, statt mit
+veralteten Slots zu lesen.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import config
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+logger = logging.getLogger(__name__)
+
+INDEX_DTYPE = np.dtype([("hash", "S32"), ("slot", "<u4"), ("used", "<f8")])
+VECTOR_DTYPE = np.dtype("<f2")
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def pack_vector(vector: list[float]) -> bytes:
+    """Vektor als float16-Bytes (Format von Cache und search_vectors)."""
+    return np.asarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+
+def unpack_vector(data: bytes) -> list[float]:
+    """Gegenstück zu pack_vector."""
+    return np.frombuffer(data, dtype=VECTOR_DTYPE).astype(np.float32).tolist()
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """Exklusive, prozessübergreifende Sperre; liefert den Dateideskriptor."""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if os.name == "nt":
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield fd
+        finally:
+            if os.name == "nt":
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+class VectorCache:
+    """Vektor-Store für ein Modell und eine Dimension.
+
+    Args:
+        root: Basisverzeichnis des Caches
+        model: Deployment-/Modellname
+        dims: Vektordimension
+        max_bytes: Obergrenze für die Vektordatei
+    """
+
+    def __init__(self, root: Path, model: str, dims: int, max_bytes: int):
+        self.dir = Path(root) / f"{model}-{dims}"
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.dims = dims
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._record = dims * VECTOR_DTYPE.itemsize
+        self._vectors_path = self.dir / "vectors.f16"
+        self._index_path = self.dir / "index.npy"
+        self._lock_path = self.dir / "cache.lock"
+        self._lock = threading.Lock()
+
+        # hash (bytes) → [slot, used]
+        self._index = {}
+        self._generation = None
+        with self._locked() as fd:
+            self._vectors_path.touch()
+            self._truncate(fd)
+
+    @contextmanager
+    def _locked(self):
+        """Thread- und Prozess-Sperre; lädt den Index neu, wenn ein anderer
+        Prozess die Vektordatei seit dem letzten Zugriff umgeschrieben hat."""
+        with self._lock, _file_lock(self._lock_path) as fd:
+            generation = self._read_generation(fd)
+            if generation != self._generation:
+                self._index = self._load_index()
+                self._generation = generation
+            yield fd
+
+    @staticmethod
+    def _read_generation(fd: int) -> int:
+        os.lseek(fd, 0, os.SEEK_SET)
+        data = os.read(fd, 32).strip()
+        return int(data) if data.isdigit() else 0
+
+    def _bump_generation(self, fd: int):
+        """Markiert Slots als ungültig für alle anderen Prozesse."""
+        self._generation += 1
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, str(self._generation).encode())
+
+    def _load_index(self) -> dict:
+        index = {}
+        if self._index_path.exists():
+            for entry in np.load(self._index_path):
+                # S32 schneidet abschließende Null-Bytes ab
+                key = bytes(entry["hash"]).ljust(32, b"\0")
+                index[key] = [int(entry["slot"]), float(entry["used"])]
+        return index
+
+    def _truncate(self, fd: int):
+        """Kürzt die Vektordatei auf die indizierten Records.
+
+        Entfernt angehängte, aber nie in den Index geschriebene Vektoren
+        (Abbruch vor flush()) und halbe Records eines abgebrochenen
+        Schreibvorgangs, an denen sonst alle folgenden Slots verrutschen.
+        """
+        size = self._vectors_path.stat().st_size
+        records = max((slot for slot, _ in self._index.values()), default=-1) + 1
+        if size > records * self._record:
+            os.truncate(self._vectors_path, records * self._record)
+            self._bump_generation(fd)
+            logger.info(f"Vektor-Cache: {size - records * self._record} Bytes ohne Index entfernt")
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_many(self, hashes: list[str]) -> list[list[float] | None]:
+        """Vektoren zu den Hashes (hex); None für Misses."""
+        keys = [bytes.fromhex(h) for h in hashes]
+        now = time.time()
+        with self._locked():
+            slots = []
+            for key in keys:
+                entry = self._index.get(key)
+                if entry is not None:
+                    entry[1] = now
+                slots.append(None if entry is None else entry[0])
+            found = [s for s in slots if s is not None]
+            self.hits += len(found)
+            self.misses += len(slots) - len(found)
+            if not found:
+                return [None] * len(keys)
+            store = np.memmap(self._vectors_path, dtype=VECTOR_DTYPE, mode="r")
+            store = store.reshape(-1, self.dims)
+            rows = store[np.array(found)].astype(np.float32)
+
+        result, it = [], iter(rows)
+        for slot in slots:
+            result.append(None if slot is None else next(it).tolist())
+        return result
+
+    def put_many(self, hashes: list[str], vectors: list[list[float]]):
+        """Hängt neue Vektoren an (bereits vorhandene Hashes werden übersprungen)."""
+        now = time.time()
+        with self._locked():
+            new = [(bytes.fromhex(h), v) for h, v in zip(hashes, vectors)
+                   if bytes.fromhex(h) not in self._index]
+            if not new:
+                return
+            data = np.asarray([v for _, v in new], dtype=VECTOR_DTYPE)
+            with open(self._vectors_path, "ab") as f:
+                slot = f.tell() // self._record
+                f.write(data.tobytes())
+            for i, (key, _) in enumerate(new):
+                self._index[key] = [slot + i, now]
+
+    def flush(self):
+        """Verdrängt bei Bedarf (LRU) und schreibt den Index atomar.
+
+        Einträge, die andere Prozesse inzwischen in den Index geschrieben
+        haben, werden übernommen statt überschrieben.
+        """
+        with self._locked() as fd:
+            for key, (slot, used) in self._load_index().items():
+                entry = self._index.setdefault(key, [slot, used])
+                entry[1] = max(entry[1], used)
+            if len(self._index) * self._record > self.max_bytes:
+                self._evict(fd)
+            entries = np.array(
+                [(key, slot, used) for key, (slot, used) in self._index.items()],
+                dtype=INDEX_DTYPE,
+            )
+            tmp = self._index_path.with_suffix(".tmp")
+            with open(tmp, "wb") as f:
+                np.save(f, entries)
+            os.replace(tmp, self._index_path)
+
+    def _evict(self, fd: int):
+        """Behält die zuletzt genutzten Einträge und kompaktiert die Vektordatei."""
+        keep = int(self.max_bytes * 0.9) // self._record
+        ranked = sorted(self._index.items(), key=lambda kv: kv[1][1], reverse=True)[:keep]
+        store = np.memmap(self._vectors_path, dtype=VECTOR_DTYPE, mode="r").reshape(-1, self.dims)
+        tmp = self._vectors_path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            for start in range(0, len(ranked), 10_000):
+                part = ranked[start : start + 10_000]
+                f.write(np.ascontiguousarray(store[[slot for _, (slot, _) in part]]).tobytes())
+        del store
+        os.replace(tmp, self._vectors_path)
+
+        removed = len(self._index) - len(ranked)
+        self._index = {key: [i, used] for i, (key, (_slot, used)) in enumerate(ranked)}
+        self._bump_generation(fd)
+        logger.info(f"Vektor-Cache: {removed} Einträge verdrängt, {len(self._index)} behalten")
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def get_cache() -> VectorCache | None:
+    """Geteilter Cache für das konfigurierte Modell (None = deaktiviert)."""
+    global _cache
+    if not config.VECTOR_CACHE_DIR:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = VectorCache(
+                config.VECTOR_CACHE_DIR,
+                config.OPENAI_EMBEDDING_DEPLOYMENT,
+                config.OPENAI_EMBEDDING_DIMENSIONS,
+                config.VECTOR_CACHE_MAX_MB * 1024 * 1024,
+            )
+    return _cache
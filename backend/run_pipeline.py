@@ -12,16 +12,32 @@ Usage:
   python run_pipeline.py                        # Gestern
   python run_pipeline.py --date 2025-12-30      # Bestimmter Tag
   python run_pipeline.py --create-index         # Nur Index erstellen
+  python run_pipeline.py --rebuild-index        # Index neu aufbauen aus search_vectors (ohne API)
+  python run_pipeline.py --index-stats          # Speicher pro Dokument und Quota-Auslastung
+  python run_pipeline.py --migrate              # Schema-Migrationen anwenden
+  python run_pipeline.py --verify-schema        # Schema-Stand prüfen
+  python run_pipeline.py --build-gazetteer      # PLZ-Gazetteer + Präfix-Schwerpunkte bauen
   python run_pipeline.py --backfill 2025-01-01 2025-01-31  # Datumsbereich
+  python run_pipeline.py --import-mode rows     # Zeilenweiser Import (Debugging)
+  python run_pipeline.py --offline --backfill 2025-01-01 2025-01-31  # Nur aus Archiv-Cache
+  python run_pipeline.py --backfill 2025-01-01 2025-12-31 --workers 8  # Parallele Downloads
+  python run_pipeline.py --replay 2025-01-01 2025-01-31   # Re-Import aus dem Parquet-Lake
 """
 import argparse
 import logging
 import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import date, datetime, timedelta
 
 # Pipeline-Module
+import config
+import migrations
+from pipeline.base_source import TenderSource, iter_table_chunks
 from pipeline.oeffentlichevergabe import OeffentlicheVergabeSource
-from pipeline import importer, enricher, denormalizer, embedder, indexer
+from pipeline import importer, enricher, denormalizer, indexer, ledger, staging_lake
+from pipeline import gazetteer
 
 logging.basicConfig(
     level=logging.INFO,
@@ -31,86 +47,269 @@ logging.basicConfig(
 logger = logging.getLogger("pipeline")
 
 
-def run_daily(target_date: date) -> dict:
+def run_daily(target_date: date, source: TenderSource | None = None,
+              import_mode: str | None = None, force: bool = False) -> dict:
     """Führt die Pipeline für einen Tag aus.
 
+    Args:
+        target_date: Tag der Veröffentlichung
+        source: Datenquelle (Default: OeffentlicheVergabeSource)
+        import_mode: "rows", "bulk" oder "merge" (Default: config.IMPORT_MODE)
+        force: Import-Ledger ignorieren und alle Tabellen importieren
+
     Returns:
         Dict mit Statistiken
     """
     logger.info(f"=== Pipeline Start: {target_date} ===")
-    stats = {"date": target_date.isoformat()}
+    source = source or OeffentlicheVergabeSource()
+
+    # 1. + 2. Download und Import laufen gestreamt ineinander
+    stats = _import_day(source, target_date, import_mode, force=force)
+    if stats["status"] == "no_data":
+        return stats
 
-    # 1. Download
-    logger.info("--- Schritt 1: Download ---")
-    source = OeffentlicheVergabeSource()
-    data = source.fetch(target_date)
+    # Auch unveränderte Tage arbeiten offene Dokumente früherer Läufe ab
+    # (z.B. nach Embedding- oder Upload-Fehlern)
+    _process_documents(stats)
 
-    if not data:
+    if stats["status"] != "unchanged":
+        stats["status"] = "ok"
+    logger.info(f"=== Pipeline fertig: {target_date} ===")
+    _print_summary(stats)
+    return stats
+
+
+def _import_day(source: TenderSource, target_date: date, import_mode: str | None,
+                data=None, force: bool = False) -> dict:
+    """Schritte 1+2: Streamt die Tabellen eines Tages nach SQL.
+
+    Vorher wird das Import-Ledger geprüft: unveränderte Tage werden komplett
+    übersprungen, bei Re-Exporten nur Tabellen mit neuem Hash (oder Fehlern
+    im letzten Lauf) importiert. Zeilen ohne Primärschlüssel werden vor jedem
+    Import pro Notice gelöscht, auch ohne Ledger-Eintrag (ältere Importe).
+
+    Args:
+        data: Bereits geladenes Mapping (Backfill), sonst source.iter_chunks()
+        force: Ledger ignorieren
+
+    Returns:
+        Dict mit Statistiken, status "no_data", "unchanged" oder "imported"
+    """
+    stats = {"date": target_date.isoformat()}
+    logger.info(f"--- Schritt 1+2: Download + Import nach SQL ({target_date}) ---")
+
+    # Replays aus dem Lake sind explizit gewollt und laufen am Ledger vorbei
+    is_replay = isinstance(source, staging_lake.LakeSource)
+    hashes = {} if force or is_replay else source.table_hashes(target_date)
+    tables = source.get_import_order()
+    if hashes:
+        changed = set(ledger.changed_tables(source.name, target_date, hashes))
+        tables = [t for t in tables if t in changed]
+        if not tables:
+            logger.info(f"{target_date} unverändert (Import-Ledger), übersprungen")
+            if hasattr(data, "close"):
+                data.close()
+            stats["status"] = "unchanged"
+            return stats
+        logger.info(f"Import-Ledger: {len(tables)} Tabellen geändert ({', '.join(tables)})")
+
+    if data is None:
+        chunks = source.iter_chunks(target_date, config.IMPORT_CHUNK_SIZE, tables=tables)
+    else:
+        chunks = iter_table_chunks(data, tables, config.IMPORT_CHUNK_SIZE)
+
+    # Tag nebenbei im Parquet-Lake ablegen (nicht beim Replay aus dem Lake)
+    if staging_lake.is_enabled() and not is_replay:
+        chunks = staging_lake.tee(source.name, target_date, chunks)
+
+    # Tabellen ohne Primärschlüssel würden bei jedem Re-Import doppelt angehängt
+    chunks = importer.purge_stream(chunks, set(tables))
+
+    # Importierte Notice-Schlüssel für die Denormalisierung vormerken
+    notice_keys = set()
+    chunks = denormalizer.collect_keys(chunks, notice_keys)
+
+    # Im frames-Modus Dokumente direkt aus den Tages-Tabellen bauen; nur
+    # möglich, wenn alle dafür nötigen Tabellen dieses Mal importiert werden
+    collector = None
+    if config.DENORMALIZE_MODE == "frames" and set(denormalizer.FRAME_COLUMNS) <= set(tables):
+        collector = denormalizer.FrameCollector()
+        chunks = collector.tap(chunks)
+
+    import_stats = importer.import_stream(
+        chunks, tables, mode=import_mode,
+        dependencies=source.get_import_dependencies(),
+    )
+    if all(s.get("missing") for s in import_stats.values()):
         logger.info(f"Keine Daten für {target_date} (Wochenende/Feiertag?)")
         stats["status"] = "no_data"
         return stats
 
-    stats["download"] = {name: len(df) for name, df in data.items()}
+    if collector is not None:
+        stats["denormalized"] = denormalizer.refresh_from_frames(collector, notice_keys, import_stats)
+    else:
+        denormalizer.enqueue(notice_keys)
+
+    if hashes:
+        ledger.record(source.name, target_date, import_stats, hashes)
 
-    # 2. Import nach SQL
-    logger.info("--- Schritt 2: Import nach SQL ---")
-    import_stats = importer.import_all(data, source.get_import_order())
     stats["import"] = import_stats
+    stats["download"] = {
+        name: s["rows"] for name, s in import_stats.items() if not s.get("missing")
+    }
+    stats["status"] = "imported"
+    return stats
+
 
+def _process_documents(stats: dict):
+    """Schritte 3-6: arbeiten auf allen offenen search_documents, nicht pro Tag."""
     # 3. Denormalisierung → search_documents
     logger.info("--- Schritt 3: Denormalisierung ---")
+    # (im frames-Modus ist der Tag schon beim Import denormalisiert)
     new_docs = denormalizer.refresh()
-    stats["denormalized"] = new_docs
+    stats["denormalized"] = stats.get("denormalized", 0) + new_docs
 
     # 4. Geocoding
     logger.info("--- Schritt 4: Geocoding ---")
     geocoded = enricher.geocode_new_records()
     stats["geocoded"] = geocoded
 
-    # 5. Embedding + Indexing
-    logger.info("--- Schritt 5: Embedding + Indexing ---")
-    docs_with_vectors = embedder.embed_and_collect()
-    stats["embedded"] = len(docs_with_vectors)
+    # 5+6. Embedding + Push to Azure AI Search (als Stream, Upload parallel zum Embedding)
+    logger.info("--- Schritt 5+6: Embedding + Push to Search ---")
+    stats["embedded"], stats["indexed"] = indexer.index_pending()
 
-    if docs_with_vectors:
-        # 6. Push to Azure AI Search
-        logger.info("--- Schritt 6: Push to Search ---")
-        indexed = indexer.upload_documents(docs_with_vectors)
-        stats["indexed"] = indexed
+    # Durch neuere Versionen ersetzte Dokumente aus dem Index entfernen
+    stats["deleted"] = indexer.process_deletions()
 
-        # Dokumente als indexiert markieren
-        indexed_ids = [d["id"] for d in docs_with_vectors]
-        indexer.mark_indexed(indexed_ids)
-    else:
-        stats["indexed"] = 0
-
-    stats["status"] = "ok"
-    logger.info(f"=== Pipeline fertig: {target_date} ===")
-    _print_summary(stats)
-    return stats
 
+def run_backfill(start_date: date, end_date: date, source: TenderSource | None = None,
+                 import_mode: str | None = None, workers: int | None = None,
+                 force: bool = False):
+    """Führt die Pipeline für einen Datumsbereich aus.
 
-def run_backfill(start_date: date, end_date: date):
-    """Führt die Pipeline für einen Datumsbereich aus."""
+    Mit workers > 1 laden bis zu `workers` Tage gleichzeitig herunter, während
+    höchstens config.BACKFILL_DB_WORKERS Tage parallel nach SQL importieren.
+    Denormalisierung, Geocoding, Embedding und Indexing laufen danach einmal
+    für den ganzen Bereich.
+    """
     logger.info(f"=== Backfill: {start_date} bis {end_date} ===")
-    current = start_date
-    results = []
-
-    while current <= end_date:
-        try:
-            stats = run_daily(current)
-            results.append(stats)
-        except Exception as e:
-            logger.error(f"Fehler bei {current}: {e}")
-            results.append({"date": current.isoformat(), "status": "error", "error": str(e)})
-
-        current += timedelta(days=1)
+    source = source or OeffentlicheVergabeSource()
+    workers = workers or config.BACKFILL_FETCH_WORKERS
+
+    if workers <= 1:
+        results = []
+        current = start_date
+        while current <= end_date:
+            try:
+                stats = run_daily(current, source=source, import_mode=import_mode, force=force)
+                results.append(stats)
+            except Exception as e:
+                logger.error(f"Fehler bei {current}: {e}")
+                results.append({"date": current.isoformat(), "status": "error", "error": str(e)})
+
+            current += timedelta(days=1)
+    else:
+        results = _run_backfill_concurrent(start_date, end_date, source, import_mode, workers, force)
 
     # Zusammenfassung
     ok = sum(1 for r in results if r.get("status") == "ok")
     no_data = sum(1 for r in results if r.get("status") == "no_data")
+    unchanged = sum(1 for r in results if r.get("status") == "unchanged")
     errors = sum(1 for r in results if r.get("status") == "error")
-    logger.info(f"=== Backfill fertig: {ok} OK, {no_data} keine Daten, {errors} Fehler ===")
+    # Importiert, aber Schritt 3-6 fehlgeschlagen (holt der nächste Lauf nach)
+    unprocessed = sum(1 for r in results if r.get("status") == "imported")
+    logger.info(f"=== Backfill fertig: {ok} OK, {no_data} keine Daten, "
+                f"{unchanged} unverändert, {errors} Fehler"
+                + (f", {unprocessed} ohne Schritt 3-6" if unprocessed else "") + " ===")
+
+
+def _run_backfill_concurrent(start_date: date, end_date: date, source: TenderSource,
+                             import_mode: str | None, workers: int, force: bool) -> list[dict]:
+    """Backfill mit Download-Pool und begrenzter Anzahl paralleler DB-Importe."""
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    gauge = {"active": 0, "peak": 0}
+    gauge_lock = threading.Lock()
+
+    def fetch(day: date):
+        with gauge_lock:
+            gauge["active"] += 1
+            gauge["peak"] = max(gauge["peak"], gauge["active"])
+        try:
+            return source.fetch(day)
+        finally:
+            with gauge_lock:
+                gauge["active"] -= 1
+
+    results = []
+    started = time.monotonic()
+    # Geladene Tage liegen bis zum Import im Speicher: höchstens so viele
+    # Downloads vorziehen, wie Download- und Import-Worker abarbeiten
+    max_pending = workers + config.BACKFILL_DB_WORKERS
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch") as fetch_pool, \
+            ThreadPoolExecutor(max_workers=config.BACKFILL_DB_WORKERS, thread_name_prefix="import") as db_pool:
+        pending_days = iter(days)
+        fetches, imports = {}, {}
+        imported = []
+
+        def submit_fetches():
+            while len(fetches) + len(imports) < max_pending:
+                day = next(pending_days, None)
+                if day is None:
+                    return
+                fetches[fetch_pool.submit(fetch, day)] = day
+
+        submit_fetches()
+        while fetches or imports:
+            done, _ = wait(list(fetches) + list(imports), return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetches:
+                    day = fetches.pop(future)
+                    try:
+                        data = future.result()
+                    except Exception as e:
+                        logger.error(f"Download-Fehler bei {day}: {e}")
+                        results.append({"date": day.isoformat(), "status": "error", "error": str(e)})
+                        continue
+                    imports[db_pool.submit(_import_day, source, day, import_mode, data, force)] = day
+                    continue
+
+                day = imports.pop(future)
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    logger.error(f"Import-Fehler bei {day}: {e}")
+                    results.append({"date": day.isoformat(), "status": "error", "error": str(e)})
+                    continue
+                results.append(stats)
+                if stats["status"] in ("imported", "unchanged"):
+                    imported.append(stats)
+            submit_fetches()
+
+    logger.info(f"Download + Import: {len(days)} Tage in {time.monotonic() - started:.1f}s "
+                f"(max. {gauge['peak']} Downloads parallel)")
+
+    if imported:
+        total = {"download": {}, "import": {}, "denormalized": 0}
+        for stats in imported:
+            total["denormalized"] += stats.get("denormalized", 0)
+            for name, rows in stats.get("download", {}).items():
+                total["download"][name] = total["download"].get(name, 0) + rows
+            for name, s in stats.get("import", {}).items():
+                agg = total["import"].setdefault(name, {"imported": 0})
+                agg["imported"] += s.get("imported", 0)
+        try:
+            _process_documents(total)
+        except Exception as e:
+            # Importe sind durch; offene Dokumente holt der nächste Lauf nach
+            logger.error(f"Fehler bei Schritt 3-6: {e}")
+            total["error"] = str(e)
+        _print_summary(total)
+        if "error" not in total:
+            for stats in imported:
+                if stats["status"] == "imported":
+                    stats["status"] = "ok"
+
+    return sorted(results, key=lambda r: r["date"])
 
 
 def _print_summary(stats: dict):
@@ -125,18 +324,38 @@ def _print_summary(stats: dict):
 
     logger.info(f"  Download:   {total_rows} Zeilen in {len(dl)} Tabellen")
     logger.info(f"  Importiert: {total_imported} Zeilen nach SQL")
-    logger.info(f"  Denormalisiert: {stats.get('denormalized', 0)} neue Dokumente")
+    logger.info(f"  Denormalisiert: {stats.get('denormalized', 0)} neue/geänderte Dokumente")
     logger.info(f"  Geocoded:   {stats.get('geocoded', 0)}")
     logger.info(f"  Embedded:   {stats.get('embedded', 0)}")
     logger.info(f"  Indexiert:  {stats.get('indexed', 0)}")
+    logger.info(f"  Gelöscht:   {stats.get('deleted', 0)} abgelöste Versionen")
 
 
 def main():
     parser = argparse.ArgumentParser(description="Vergabe-Radar Ingest Pipeline")
     parser.add_argument("--date", type=str, help="Datum im Format YYYY-MM-DD (Default: gestern)")
     parser.add_argument("--create-index", action="store_true", help="Nur Search Index erstellen")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="Neuen Index aus gespeicherten Vektoren aufbauen und danach umschalten")
+    parser.add_argument("--index-stats", action="store_true",
+                        help="Speicherverbrauch des Index pro Dokument anzeigen")
+    parser.add_argument("--migrate", action="store_true", help="Offene Schema-Migrationen anwenden")
+    parser.add_argument("--build-gazetteer", action="store_true",
+                        help="PLZ-Gazetteer-Datei und PLZ-Präfix-Schwerpunkte aus plz_coordinates bauen")
+    parser.add_argument("--verify-schema", action="store_true",
+                        help="Schema-Stand prüfen (Exit-Code 1 bei Abweichung)")
     parser.add_argument("--backfill", nargs=2, metavar=("START", "END"),
                         help="Backfill für Datumsbereich START END (YYYY-MM-DD)")
+    parser.add_argument("--replay", nargs=2, metavar=("START", "END"),
+                        help="Datumsbereich aus dem Parquet-Staging-Lake neu importieren")
+    parser.add_argument("--import-mode", choices=["rows", "bulk", "merge"],
+                        help="SQL-Import zeilenweise, per fast_executemany oder über Staging-Tabelle (Default: config)")
+    parser.add_argument("--force", action="store_true",
+                        help="Import-Ledger ignorieren, unveränderte Tage erneut importieren")
+    parser.add_argument("--offline", action="store_true",
+                        help="Nur gecachte Archive verwenden, keine Downloads")
+    parser.add_argument("--workers", type=int,
+                        help="Parallele Downloads im Backfill (Default: config.BACKFILL_FETCH_WORKERS)")
 
     args = parser.parse_args()
 
@@ -146,10 +365,45 @@ def main():
         logger.info("Index erstellt!")
         return
 
+    if args.rebuild_index:
+        indexer.rebuild_index()
+        return
+
+    if args.index_stats:
+        indexer.index_stats()
+        return
+
+    if args.migrate:
+        migrations.apply()
+        return
+
+    if args.build_gazetteer:
+        gazetteer.build()
+        enricher.refresh_prefix_centroids()
+        return
+
+    if args.verify_schema:
+        if migrations.verify():
+            sys.exit(1)
+        return
+
+    source = OeffentlicheVergabeSource(offline=args.offline)
+
+    if args.replay:
+        if not staging_lake.is_enabled():
+            logger.error("Staging-Lake nicht verfügbar (config.STAGING_LAKE_DIR / pyarrow)")
+            sys.exit(1)
+        start = datetime.strptime(args.replay[0], "%Y-%m-%d").date()
+        end = datetime.strptime(args.replay[1], "%Y-%m-%d").date()
+        run_backfill(start, end, source=staging_lake.LakeSource(source),
+                     import_mode=args.import_mode, workers=args.workers, force=True)
+        return
+
     if args.backfill:
         start = datetime.strptime(args.backfill[0], "%Y-%m-%d").date()
         end = datetime.strptime(args.backfill[1], "%Y-%m-%d").date()
-        run_backfill(start, end)
+        run_backfill(start, end, source=source, import_mode=args.import_mode,
+                     workers=args.workers, force=args.force)
         return
 
     # Einzelner Tag
@@ -158,7 +412,7 @@ def main():
     else:
         target = date.today() - timedelta(days=1)
 
-    run_daily(target)
+    run_daily(target, source=source, import_mode=args.import_mode, force=args.force)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,104 @@
+"""Durchsatz des EmbeddingSchedulers gegen einen simulierten Azure-OpenAI-Endpunkt.
+
+Der Mock rechnet das TPM-Quota wie Azure über 10-s-Fenster ab (429 bei
+Überschreitung), streut 5xx-Fehler ein und lehnt einen Text als zu lang ab
+(400). Ausgegeben werden erreichte Tokens/min im Verhältnis zum Limit,
+429/5xx-Zähler und fehlgeschlagene Texte.
+
+Usage (aus backend/):
+  python scripts/bench_embedding_scheduler.py
+  python scripts/bench_embedding_scheduler.py --tpm 300000 --texts 1000 --workers 8
+"""
+import argparse
+import collections
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# Nur der Scheduler wird gebraucht; config.py verlangt trotzdem die Variablen
+for _name in ("VERGABE_SQL_SERVER", "VERGABE_SQL_DATABASE", "VERGABE_SQL_USER",
+              "VERGABE_SQL_PASSWORD", "VERGABE_SEARCH_ENDPOINT", "VERGABE_SEARCH_KEY",
+              "VERGABE_OPENAI_ENDPOINT", "VERGABE_OPENAI_KEY"):
+    os.environ.setdefault(_name, "bench")
+
+from pipeline.embedding_scheduler import EmbeddingScheduler, estimate_tokens  # noqa: E402
+
+WINDOW_S = 10
+
+
+class MockApiError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(status_code)
+        self.status_code = status_code
+
+
+class MockEmbeddings:
+    """Embedding-Endpunkt mit TPM-Quota, Latenz und zufälligen 5xx."""
+
+    def __init__(self, tpm: int, error_rate: float):
+        self.tpm = tpm
+        self.error_rate = error_rate
+        self.counts = collections.Counter()
+        self._window = collections.deque()
+        self._lock = threading.Lock()
+
+    def __call__(self, texts: list[str]) -> list[list[float]]:
+        time.sleep(0.05 + random.random() * 0.1)
+        tokens = sum(estimate_tokens(t) for t in texts)
+        if any("TOO_LONG" in t for t in texts):
+            self.counts["400"] += 1
+            raise MockApiError(400)
+        if random.random() < self.error_rate:
+            self.counts["5xx"] += 1
+            raise MockApiError(500)
+        with self._lock:
+            now = time.monotonic()
+            while self._window and self._window[0][0] < now - WINDOW_S:
+                self._window.popleft()
+            used = sum(t for _, t in self._window)
+            if used + tokens > self.tpm * WINDOW_S / 60 * 1.05:
+                self.counts["429"] += 1
+                raise MockApiError(429)
+            self._window.append((now, tokens))
+        return [[float(len(t))] for t in texts]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tpm", type=int, default=600_000)
+    parser.add_argument("--rpm", type=int, default=10_000)
+    parser.add_argument("--texts", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--error-rate", type=float, default=0.03)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    items = [(i, "x" * random.randint(300, 3000) + ("TOO_LONG" if i == args.texts // 2 else ""))
+             for i in range(args.texts)]
+    total = sum(estimate_tokens(t) for _, t in items)
+    mock = MockEmbeddings(args.tpm, args.error_rate)
+    scheduler = EmbeddingScheduler(
+        mock, lambda e: e.status_code == 429 or e.status_code >= 500,
+        workers=args.workers, tpm=args.tpm, rpm=args.rpm,
+    )
+
+    started = time.monotonic()
+    received = 0
+    for keys, vectors in scheduler.run(items):
+        assert all(v[0] == len(items[k][1]) for k, v in zip(keys, vectors))
+        received += len(keys)
+    elapsed = time.monotonic() - started
+
+    print(f"{total:,} Tokens in {elapsed:.1f}s: {total / elapsed * 60:,.0f}/min "
+          f"({total / elapsed * 60 / args.tpm:.0%} von {args.tpm:,} TPM)")
+    print(f"{received} Texte, fehlgeschlagen: {scheduler.failed}, Mock: {dict(mock.counts)}")
+    scheduler.log_stats()
+
+
+if __name__ == "__main__":
+    main()
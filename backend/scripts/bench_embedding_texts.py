@@ -0,0 +1,67 @@
+"""Durchsatz beim Aufbau der Embedding-Texte (Schritt 3, Denormalisierung).
+
+Misst build_embedding_texts (spaltenweise) + embedding_hashes gegen die
+skalare Referenz _build_embedding_text, die wie früher Zeile für Zeile über
+dasselbe DataFrame läuft, und prüft, dass beide dieselben Texte liefern.
+
+Usage (aus backend/):
+  python scripts/bench_embedding_texts.py
+  python scripts/bench_embedding_texts.py --docs 500000
+"""
+import argparse
+import random
+import time
+
+from synthetic_export import CITIES, WORDS
+from pipeline.denormalizer import _build_embedding_text, build_embedding_texts, embedding_hashes
+
+import pandas as pd
+
+COLUMNS = ["title", "description", "buyer_name", "buyer_city", "cpv_code_main", "contract_nature"]
+
+
+def _rows(count: int) -> list[tuple]:
+    rng = random.Random(0)
+
+    def words(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n))
+
+    def maybe(value):
+        return value if rng.random() > 0.1 else rng.choice([None, ""])
+
+    return [(maybe(words(5)), maybe(words(rng.randint(20, 400))), maybe("Stadt " + rng.choice(CITIES)),
+             maybe(rng.choice(CITIES)), maybe(f"{rng.randint(3_000_000, 98_000_000):08d}"),
+             maybe(rng.choice(["works", "services", "supplies"])))
+            for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rows = _rows(args.docs)
+    docs = pd.DataFrame(rows, columns=COLUMNS)
+
+    started = time.perf_counter()
+    texts = build_embedding_texts(docs)
+    t_texts = time.perf_counter() - started
+    started = time.perf_counter()
+    embedding_hashes(texts)
+    t_hashes = time.perf_counter() - started
+
+    started = time.perf_counter()
+    values = docs.astype(object).where(docs.notna(), None)
+    scalar = [_build_embedding_text(*row) for row in values.itertuples(index=False)]
+    t_scalar = time.perf_counter() - started
+
+    assert texts.tolist() == scalar == [_build_embedding_text(*row) for row in rows], "spaltenweise und skalare Texte weichen ab"
+    print(f"{len(docs):,} Dokumente:")
+    print(f"  build_embedding_texts: {t_texts:6.2f}s ({len(docs) / t_texts:,.0f} Dok./s)")
+    print(f"  embedding_hashes:      {t_hashes:6.2f}s ({len(docs) / t_hashes:,.0f} Dok./s)")
+    print(f"  skalar:                {t_scalar:6.2f}s ({len(docs) / t_scalar:,.0f} Dok./s), "
+          f"Faktor {t_scalar / t_texts:.1f}")
+
+
+if __name__ == "__main__":
+    main()
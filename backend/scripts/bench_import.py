@@ -0,0 +1,101 @@
+"""Import-Benchmark: 100k Zeilen Konvertierung und (optional) SQL-Import.
+
+Ohne --db wird nur die Konvertierung gemessen: spaltenweise Konverter
+(_build_params, wie im Bulk-/Merge-Import) gegen die skalaren Helfer
+(_s/_dec/_int/_bool/_dt pro Zelle, wie früher im Zeilen-Import).
+
+Mit --db importiert der Benchmark synthetische Notices in die konfigurierte
+Datenbank, misst rows/bulk/merge für eine Kind-Tabelle und löscht die
+Testzeilen danach wieder. Nur gegen eine Test-Datenbank verwenden.
+
+Usage (aus backend/):
+  python scripts/bench_import.py
+  python scripts/bench_import.py --rows 100000 --table organisation
+  python scripts/bench_import.py --db --modes bulk merge
+"""
+import argparse
+import logging
+import time
+
+from synthetic_export import table
+from pipeline import importer
+
+SEED = 9999  # Notice-Präfix '9999-notice-' der Testzeilen
+
+SCALAR = {
+    "str": importer._s,
+    "num_str": importer._num_str,
+    "dec": lambda v, _max_len: importer._dec(v),
+    "int": lambda v, _max_len: importer._int(v),
+    "bool": lambda v, _max_len: importer._bool(v),
+    "dt": lambda v, _max_len: importer._dt(v),
+}
+
+
+def _scalar_params(table_def: dict, df) -> list[tuple]:
+    columns = [(df[src].tolist(), SCALAR[typ], max_len)
+               for src, _dst, typ, max_len in table_def["columns"]]
+    return [tuple(fn(values[i], max_len) for values, fn, max_len in columns)
+            for i in range(len(df))]
+
+
+def bench_convert(csv_name: str, df):
+    table_def = importer._TABLE_DEFS[csv_name]
+    started = time.perf_counter()
+    vectorised = importer._build_params(table_def, df)
+    t_vec = time.perf_counter() - started
+
+    started = time.perf_counter()
+    scalar = _scalar_params(table_def, df)
+    t_scalar = time.perf_counter() - started
+
+    assert vectorised == scalar, "spaltenweise und skalare Konvertierung weichen ab"
+    print(f"Konvertierung {csv_name}, {len(df):,} Zeilen:")
+    print(f"  spaltenweise: {t_vec:6.2f}s ({len(df) / t_vec:,.0f} Zeilen/s)")
+    print(f"  skalar:       {t_scalar:6.2f}s ({len(df) / t_scalar:,.0f} Zeilen/s), "
+          f"Faktor {t_scalar / t_vec:.1f}")
+
+
+def bench_db(csv_name: str, df, notices, modes: list[str]):
+    import db
+
+    def cleanup():
+        for name in reversed(importer._TABLE_DEFS):
+            db.execute(f"DELETE FROM {importer._TABLE_DEFS[name]['table']} "
+                       f"WHERE notice_identifier LIKE '{SEED:04d}-notice-%'")
+
+    cleanup()
+    try:
+        importer.import_table_bulk("notice", notices)
+        for mode in modes:
+            started = time.perf_counter()
+            stats = importer._IMPORTERS[mode](csv_name, df)
+            elapsed = time.perf_counter() - started
+            print(f"SQL-Import {csv_name} ({mode}): {stats['imported']:,} Zeilen in "
+                  f"{elapsed:.1f}s ({len(df) / elapsed:,.0f} Zeilen/s), "
+                  f"{stats['errors']} Fehler")
+            db.execute(f"DELETE FROM {importer._TABLE_DEFS[csv_name]['table']} "
+                       f"WHERE notice_identifier LIKE '{SEED:04d}-notice-%'")
+    finally:
+        cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--notices", type=int, default=20_000)
+    parser.add_argument("--table", default="purpose", choices=sorted(importer._TABLE_DEFS))
+    parser.add_argument("--db", action="store_true", help="Zusätzlich in die Test-DB importieren")
+    parser.add_argument("--modes", nargs="+", default=["rows", "bulk", "merge"],
+                        choices=sorted(importer._IMPORTERS))
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    df = table(args.table, args.rows, args.notices, SEED)
+    bench_convert(args.table, df)
+    if args.db:
+        bench_db(args.table, df, table("notice", args.notices, args.notices, SEED), args.modes)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Stub für die Export-API von oeffentlichevergabe.de (Backfill-Downloads).
+
+Liefert pro pubDay ein synthetisches csv.zip (scripts/synthetic_export.py)
+mit künstlicher Latenz, 400 für Wochenenden und ETag/304 für Conditional
+GETs. Der Server zählt gleichzeitig laufende Requests.
+
+Server für einen echten Pipeline-Lauf gegen den Stub:
+  python scripts/stub_export_server.py --serve
+  VERGABE_API_BASE_URL=http://127.0.0.1:8765/api/notice-exports \\
+      python run_pipeline.py --backfill 2025-01-01 2025-01-31 --workers 8
+
+Ohne DB: Downloads eines Bereichs parallel prüfen (Peak, Dauer, 304):
+  python scripts/stub_export_server.py --check 2025-01-01 2025-01-31 --workers 8
+"""
+import argparse
+import hashlib
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+from synthetic_export import export_zip
+import config
+
+
+class StubState:
+    def __init__(self, latency: float, notices: int):
+        self.latency = latency
+        self.notices = notices
+        self.active = 0
+        self.peak = 0
+        self.requests = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        self._archives = {}
+
+    def archive(self, day: date) -> bytes:
+        with self._lock:
+            if day not in self._archives:
+                self._archives[day] = export_zip(self.notices, seed=day.toordinal() % 10_000)
+            return self._archives[day]
+
+
+def make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            with state._lock:
+                state.active += 1
+                state.requests += 1
+                state.peak = max(state.peak, state.active)
+            try:
+                time.sleep(state.latency)
+                self._respond()
+            finally:
+                with state._lock:
+                    state.active -= 1
+
+        def _respond(self):
+            query = parse_qs(urlparse(self.path).query)
+            try:
+                day = date.fromisoformat(query["pubDay"][0])
+            except (KeyError, ValueError):
+                self.send_error(400)
+                return
+            if day.weekday() >= 5:
+                self.send_error(400, "no data")
+                return
+            body = state.archive(day)
+            etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+            if self.headers.get("If-None-Match") == etag:
+                with state._lock:
+                    state.not_modified += 1
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def check(start: date, end: date, workers: int, state: StubState):
+    """Lädt den Bereich zweimal: parallel ohne Cache, dann mit Cache + Revalidierung."""
+    from pipeline.oeffentlichevergabe import OeffentlicheVergabeSource
+
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+    def fetch_all(source) -> tuple[float, int]:
+        def fetch(day):
+            data = source.fetch(day)
+            if not data:  # Wochenende: {}
+                return 0
+            rows = len(data["notice"])
+            data.close()
+            return rows
+        started = time.monotonic()
+        with ThreadPoolExecutor(workers) as pool:
+            rows = sum(pool.map(fetch, days))
+        return time.monotonic() - started, rows
+
+    elapsed, rows = fetch_all(OeffentlicheVergabeSource(use_cache=False))
+    print(f"{len(days)} Tage, {rows:,} Notices in {elapsed:.1f}s mit {workers} Workern "
+          f"(seriell ~{len(days) * state.latency:.1f}s Latenz), "
+          f"max. {state.peak} Downloads parallel")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config.ARCHIVE_CACHE_DIR = Path(tmp)
+        config.ARCHIVE_CACHE_REVALIDATE_HOURS = 0
+        source = OeffentlicheVergabeSource()
+        fetch_all(source)
+        before = state.not_modified
+        elapsed, _ = fetch_all(source)
+        print(f"Revalidierung aus dem Cache: {elapsed:.1f}s, "
+              f"{state.not_modified - before} × 304 Not Modified")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument("--serve", action="store_true")
+    mode.add_argument("--check", nargs=2, metavar=("START", "END"))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.5, help="Sekunden pro Request")
+    parser.add_argument("--notices", type=int, default=500, help="Notices pro Tag")
+    args = parser.parse_args()
+
+    config.API_BASE_URL = f"http://127.0.0.1:{args.port}/api/notice-exports"
+    state = StubState(args.latency, args.notices)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(state))
+
+    if args.serve:
+        print(f"Stub läuft auf {config.API_BASE_URL}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        print(f"{state.requests} Requests, max. {state.peak} gleichzeitig")
+        return
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        check(date.fromisoformat(args.check[0]), date.fromisoformat(args.check[1]),
+              args.workers, state)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
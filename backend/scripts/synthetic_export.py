@@ -0,0 +1,77 @@
+"""Synthetische Tagesexporte im Format von oeffentlichevergabe.de (csv.zip).
+
+Spalten und Typen kommen aus importer._TABLE_DEFS, damit Benchmarks und
+Stub-Server dieselben Tabellen liefern, die der Importer erwartet. Jede
+Kind-Tabelle verweist auf eine der erzeugten Notices (FK-gültig).
+"""
+import io
+import os
+import random
+import sys
+import zipfile
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# config.py verlangt die Variablen; Benchmarks ohne --db erreichen keinen Dienst
+for _name in ("VERGABE_SQL_SERVER", "VERGABE_SQL_DATABASE", "VERGABE_SQL_USER",
+              "VERGABE_SQL_PASSWORD", "VERGABE_SEARCH_ENDPOINT", "VERGABE_SEARCH_KEY",
+              "VERGABE_OPENAI_ENDPOINT", "VERGABE_OPENAI_KEY"):
+    os.environ.setdefault(_name, "bench")
+
+from pipeline import importer  # noqa: E402
+
+CITIES = ["Berlin", "Hamburg", "München", "Köln", "Frankfurt a.M.", "Dresden", "Halle (Saale)"]
+WORDS = ["Neubau", "Sanierung", "Lieferung", "Reinigung", "Beratung", "Software",
+         "Schule", "Brücke", "Rahmenvertrag", "Wartung", "Fahrzeuge", "Kita"]
+
+
+def _value(src: str, typ: str, i: int, rng: random.Random) -> str:
+    if typ == "dec":
+        return f"{rng.randint(1_000, 5_000_000)}.{rng.randint(0, 99):02d}"
+    if typ == "int":
+        return str(rng.randint(1, 10))
+    if typ == "bool":
+        return rng.choice(["true", "false", ""])
+    if typ == "dt":
+        return f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T10:00:00+01:00"
+    lower = src.lower()
+    if "postcode" in lower:
+        return f"{rng.randint(1067, 99998):05d}"
+    if "city" in lower or src == "town":
+        return rng.choice(CITIES)
+    if src in ("title", "description", "organisationName"):
+        count = 40 if src == "description" else 4
+        return " ".join(rng.choice(WORDS) for _ in range(count))
+    if src == "noticeType":
+        return rng.choice(["cn-standard", "cn-social", "can-standard"])
+    return f"{src}-{i}"
+
+
+def table(csv_name: str, rows: int, notices: int, seed: int = 0) -> pd.DataFrame:
+    """Eine Tabelle mit `rows` Zeilen, alle Werte als Strings wie in der CSV."""
+    rng = random.Random(f"{seed}-{csv_name}")
+    data = {}
+    for src, _dst, typ, _max_len in importer._TABLE_DEFS[csv_name]["columns"]:
+        if src == "noticeIdentifier":
+            data[src] = [f"{seed:04d}-notice-{i % notices:08d}" for i in range(rows)]
+        elif src == "noticeVersion":
+            data[src] = ["01"] * rows
+        elif src == "lotIdentifier":
+            data[src] = [f"LOT-{i // notices:04d}" for i in range(rows)]
+        else:
+            data[src] = [_value(src, typ, i, rng) for i in range(rows)]
+    return pd.DataFrame(data)
+
+
+def export_zip(notices: int, child_rows: int | None = None, seed: int = 0) -> bytes:
+    """Komplettes csv.zip mit `notices` Notices und je Kind-Tabelle `child_rows` Zeilen."""
+    child_rows = child_rows or notices
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for csv_name in importer._TABLE_DEFS:
+            rows = notices if csv_name in ("notice", "procedure") else child_rows
+            zf.writestr(f"{csv_name}.csv",
+                        table(csv_name, rows, notices, seed).to_csv(index=False))
+    return buffer.getvalue()
@@ -0,0 +1,12 @@
+"""Gemeinsame Test-Einrichtung: Backend-Module importierbar, ohne echte Zugangsdaten."""
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# config.py verlangt die Variablen; die Tests erreichen keinen der Dienste
+for _name in ("VERGABE_SQL_SERVER", "VERGABE_SQL_DATABASE", "VERGABE_SQL_USER",
+              "VERGABE_SQL_PASSWORD", "VERGABE_SEARCH_ENDPOINT", "VERGABE_SEARCH_KEY",
+              "VERGABE_OPENAI_ENDPOINT", "VERGABE_OPENAI_KEY"):
+    os.environ.setdefault(_name, "test")
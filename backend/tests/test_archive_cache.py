@@ -0,0 +1,170 @@
+"""Archiv-Cache: ZIP-Prüfung, Cache-Treffer und Revalidierung per Conditional GET."""
+import io
+import zipfile
+from datetime import date
+
+import pytest
+
+import config
+from pipeline import oeffentlichevergabe
+from pipeline.archive_cache import ArchiveCache, check_zip
+from pipeline.oeffentlichevergabe import OeffentlicheVergabeSource
+
+DAY = date(2025, 1, 2)
+
+
+def _zip_bytes(rows: int = 3) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("notice.csv", "noticeIdentifier,noticeVersion\n"
+                    + "".join(f"n{i},1\n" for i in range(rows)))
+    return buffer.getvalue()
+
+
+def _chunks(data: bytes, size: int = 64):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+def test_check_zip_accepts_complete_archive():
+    f = io.BytesIO(_zip_bytes())
+    f.seek(10)
+
+    check_zip(f)
+
+    assert f.tell() == 0
+
+
+def test_check_zip_rejects_truncated_archive():
+    with pytest.raises(zipfile.BadZipFile):
+        check_zip(io.BytesIO(_zip_bytes()[:-30]))
+
+
+def test_check_zip_rejects_corrupt_member():
+    data = bytearray(_zip_bytes(rows=200))
+    data[60] ^= 0xFF  # komprimierte Daten, Verzeichnis bleibt intakt
+
+    with pytest.raises(zipfile.BadZipFile):
+        check_zip(io.BytesIO(bytes(data)))
+
+
+def test_store_discards_truncated_download(tmp_path):
+    cache = ArchiveCache(tmp_path, max_bytes=10**9)
+
+    with pytest.raises(zipfile.BadZipFile):
+        cache.store("src", DAY, _chunks(_zip_bytes()[:-30]))
+
+    assert cache.lookup("src", DAY) is None
+    assert not list(tmp_path.rglob("*.part"))
+
+
+def test_store_replaces_older_archive_of_the_same_day(tmp_path):
+    cache = ArchiveCache(tmp_path, max_bytes=10**9)
+    first = cache.store("src", DAY, _chunks(_zip_bytes(3)), {"etag": '"e1"'})
+
+    second = cache.store("src", DAY, _chunks(_zip_bytes(4)), {"etag": '"e2"'})
+
+    assert first != second and not first.exists()
+    assert cache.lookup("src", DAY) == second
+    assert cache.validators("src", DAY) == {"etag": '"e2"'}
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    size = len(_zip_bytes())
+    cache = ArchiveCache(tmp_path, max_bytes=2 * size)
+    old = cache.store("src", date(2025, 1, 1), [_zip_bytes()])
+    cache.store("src", date(2025, 1, 2), [_zip_bytes()])
+    cache.lookup("src", date(2025, 1, 1))  # wieder benutzt
+    newest = cache.store("src", date(2025, 1, 3), [_zip_bytes()])
+
+    assert old.exists() and newest.exists()
+    assert cache.lookup("src", date(2025, 1, 2)) is None
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, body: bytes = b"", headers: dict | None = None):
+        self.status_code = status_code
+        self.body = body
+        self.headers = headers or {}
+
+    def iter_content(self, chunk_size):
+        return iter(_chunks(self.body, chunk_size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+class FakeSession:
+    """Spielt vorbereitete Antworten ab und merkt sich die Request-Header."""
+
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+
+    def get(self, url, params=None, headers=None, **kwargs):
+        self.requests.append(dict(headers or {}))
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    fake = FakeSession()
+    monkeypatch.setattr(oeffentlichevergabe, "_get_session", lambda: fake)
+    monkeypatch.setattr(config, "ARCHIVE_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(config, "ARCHIVE_CACHE_REVALIDATE_HOURS", 24)
+    return fake
+
+
+def _notice_rows(data) -> int:
+    try:
+        return len(data["notice"])
+    finally:
+        data.close()
+
+
+def test_second_fetch_is_served_from_cache(session):
+    session.responses.append(FakeResponse(200, _zip_bytes(3), {"ETag": '"e1"'}))
+    source = OeffentlicheVergabeSource()
+
+    assert _notice_rows(source.fetch(DAY)) == 3
+    assert _notice_rows(source.fetch(DAY)) == 3
+    assert len(session.requests) == 1
+
+
+def test_stale_entry_is_revalidated(session):
+    session.responses.append(FakeResponse(200, _zip_bytes(3), {"ETag": '"e1"'}))
+    source = OeffentlicheVergabeSource()
+    source.fetch(DAY).close()
+    source.cache.revalidate_after = 0
+
+    # unverändert: 304 liefert das gecachte Archiv
+    session.responses.append(FakeResponse(304))
+    assert _notice_rows(source.fetch(DAY)) == 3
+    assert session.requests[-1] == {"If-None-Match": '"e1"'}
+
+    # Re-Export: neues Archiv ersetzt das alte
+    session.responses.append(FakeResponse(200, _zip_bytes(5), {"ETag": '"e2"'}))
+    assert _notice_rows(source.fetch(DAY)) == 5
+    assert source.cache.validators(source.name, DAY) == {"etag": '"e2"'}
+
+    # abgeschnittener Re-Download: gecachtes Archiv bleibt
+    session.responses.append(FakeResponse(200, _zip_bytes(7)[:-30], {"ETag": '"e3"'}))
+    assert _notice_rows(source.fetch(DAY)) == 5
+    assert len(list(source.cache.root.rglob("*.zip"))) == 1
+
+
+def test_day_without_data_is_remembered(session):
+    session.responses.append(FakeResponse(400))
+    source = OeffentlicheVergabeSource()
+
+    assert source.fetch(DAY) == {}
+    assert source.fetch(DAY) == {}
+    assert len(session.requests) == 1
+
+
+def test_download_without_cache_rejects_truncated_archive(session):
+    session.responses.append(FakeResponse(200, _zip_bytes()[:-30]))
+
+    assert OeffentlicheVergabeSource(use_cache=False).fetch(DAY) == {}
@@ -0,0 +1,123 @@
+"""CsvZipArchive: lazy Zugriff und chunkweises Lesen der CSV-Member."""
+import io
+import zipfile
+
+import pandas as pd
+import pytest
+
+from pipeline.base_source import iter_table_chunks
+from pipeline import csv_archive
+from pipeline.csv_archive import CsvZipArchive
+
+NOTICE_CSV = "noticeIdentifier,noticeVersion,title\n" + "".join(
+    f"n{i},1,Titel {i}\n" for i in range(25)
+)
+
+
+def _zip(**members) -> io.BytesIO:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for name, content in members.items():
+            zf.writestr(f"{name}.csv", content)
+    buffer.seek(0)
+    return buffer
+
+
+@pytest.fixture
+def archive():
+    archive = CsvZipArchive(_zip(notice=NOTICE_CSV, lot="noticeIdentifier,lotIdentifier\n"))
+    yield archive
+    archive.close()
+
+
+def test_members_are_listed_without_parsing(archive):
+    assert sorted(archive) == ["lot", "notice"]
+    assert "notice" in archive and "tender" not in archive
+    assert archive.row_counts == {}
+
+
+def test_chunks_cover_all_rows_in_order(archive):
+    chunks = list(archive.iter_chunks("notice", 10))
+
+    assert [len(c) for c in chunks] == [10, 10, 5]
+    assert pd.concat(chunks)["noticeIdentifier"].tolist() == [f"n{i}" for i in range(25)]
+    assert archive.row_counts["notice"] == 25
+
+
+def test_empty_member_yields_one_empty_chunk(archive):
+    chunks = list(archive.iter_chunks("lot", 10))
+
+    assert len(chunks) == 1 and chunks[0].empty
+
+
+def test_table_hashes_change_with_content():
+    first = CsvZipArchive(_zip(notice=NOTICE_CSV)).table_hashes()
+    same = CsvZipArchive(_zip(notice=NOTICE_CSV)).table_hashes()
+    changed = CsvZipArchive(_zip(notice=NOTICE_CSV + "n99,2,Neu\n")).table_hashes()
+
+    assert first == same
+    assert first["notice"] != changed["notice"]
+
+
+def test_iter_table_chunks_streams_and_closes_the_archive():
+    fileobj = _zip(notice=NOTICE_CSV)
+    archive = CsvZipArchive(fileobj)
+
+    chunks = list(iter_table_chunks(archive, ["notice", "lot"], chunk_size=20))
+
+    assert [(name, len(c)) for name, c in chunks] == [("notice", 20), ("notice", 5)]
+    assert fileobj.closed
+
+
+ORG_CSV = (
+    "noticeIdentifier,organisationName,organisationPostCode,unused\n"
+    'n1,"Stadt ""Nord""",01067,x\n'
+    'n2,"Zeile 1\nZeile 2",,y\n'
+    "n3,Amt,50667,z\n"
+)
+ORG_COLUMNS = ["noticeIdentifier", "organisationName", "organisationPostCode", "organisationCity"]
+
+
+@pytest.fixture(params=[False, True], ids=["one-block", "small-blocks"])
+def arrow_blocks(request, monkeypatch):
+    """Mit small-blocks liefert pyarrow mehrere Batches, die neu geschnitten werden."""
+    if request.param:
+        options = csv_archive._arrow_options
+        monkeypatch.setattr(csv_archive, "_arrow_options", lambda usecols: {
+            **options(usecols), "read_options": csv_archive.pa_csv.ReadOptions(block_size=64),
+        })
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 10])
+def test_pyarrow_chunks_keep_strings_and_add_missing_columns(chunk_size, arrow_blocks):
+    archive = CsvZipArchive(_zip(organisation=ORG_CSV), columns={"organisation": ORG_COLUMNS})
+
+    chunks = list(archive.iter_chunks("organisation", chunk_size))
+    df = pd.concat(chunks, ignore_index=True)
+
+    assert [len(c) for c in chunks] == [min(chunk_size, 3 - i) for i in range(0, 3, chunk_size)]
+    assert list(df.columns) == ORG_COLUMNS
+    assert df["organisationPostCode"].tolist()[::2] == ["01067", "50667"]
+    assert df["organisationName"].tolist()[:2] == ['Stadt "Nord"', "Zeile 1\nZeile 2"]
+    assert df["organisationPostCode"].isna().tolist() == [False, True, False]
+    assert df["organisationCity"].isna().all()
+
+
+def test_pyarrow_chunks_across_blocks(arrow_blocks):
+    archive = CsvZipArchive(_zip(notice=NOTICE_CSV), columns={"notice": ["noticeIdentifier"]})
+
+    chunks = list(archive.iter_chunks("notice", 7))
+
+    assert [len(c) for c in chunks] == [7, 7, 7, 4]
+    assert pd.concat(chunks)["noticeIdentifier"].tolist() == [f"n{i}" for i in range(25)]
+
+
+def test_pandas_fallback_reads_strings_and_skips_missing_columns(monkeypatch):
+    monkeypatch.setattr(csv_archive, "pa_csv", None)
+    archive = CsvZipArchive(_zip(organisation=ORG_CSV), columns={"organisation": ORG_COLUMNS})
+
+    df = pd.concat(archive.iter_chunks("organisation", 2), ignore_index=True)
+
+    assert list(df.columns) == ORG_COLUMNS[:3]
+    assert df["organisationPostCode"].tolist()[0] == "01067"
+    assert len(df) == 3
@@ -0,0 +1,209 @@
+"""Embedding-Texte und Dokumente aus den Tages-DataFrames (ohne Datenbank)."""
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+import db
+from pipeline import denormalizer
+from pipeline.denormalizer import (
+    FrameCollector, _build_embedding_text, build_documents, build_embedding_texts,
+    embedding_hashes, imported_frames,
+)
+
+COLUMNS = ["title", "description", "buyer_name", "buyer_city", "cpv_code_main", "contract_nature"]
+
+ROWS = [
+    ("Neubau Kita", "Errichtung einer Kita", "Stadt Köln", "Köln", "45214100", "works"),
+    ("Reinigung", None, "Land Berlin", None, "90910000", "services"),
+    (None, "", None, "", None, None),
+    ("", "x" * 2500, "Bund", "Bonn", "", "supplies"),
+    ("Ümläute ß", "Zeile 1\nZeile 2", "Gemeinde Au", "Au", "03000000", None),
+]
+
+
+def test_build_embedding_texts_matches_scalar_reference():
+    docs = pd.DataFrame(ROWS, columns=COLUMNS)
+
+    texts = build_embedding_texts(docs)
+
+    assert texts.tolist() == [_build_embedding_text(*row) for row in ROWS]
+
+
+@pytest.mark.parametrize("dtype", [object, "str", "string[python]"])
+def test_missing_values_of_any_string_dtype_are_skipped(dtype):
+    docs = pd.DataFrame(ROWS, columns=COLUMNS).astype(dtype)
+
+    texts = build_embedding_texts(docs)
+
+    assert texts.tolist() == [_build_embedding_text(*row) for row in ROWS]
+
+
+def test_description_is_truncated():
+    docs = pd.DataFrame([ROWS[3]], columns=COLUMNS)
+
+    text = build_embedding_texts(docs).iloc[0]
+
+    assert text.startswith("Beschreibung: " + "x" * 2000 + "\n")
+    assert "x" * 2001 not in text
+
+
+def test_embedding_hashes_are_stable_sha256():
+    hashes = embedding_hashes(pd.Series(["a", "a", "b"]))
+
+    assert hashes[0] == hashes[1] != hashes[2]
+    assert hashes[0] == "ca978112ca1bbdcafac231b39a23dc4da786eff8147c4e72b9807785afee48bb"
+
+
+# --- Dokumente direkt aus den Tages-DataFrames ---
+
+KEY = ["noticeIdentifier", "noticeVersion"]
+
+
+def _source(rows, columns):
+    return pd.DataFrame(rows, columns=KEY + columns, dtype=object)
+
+
+# Ein Tag mit allem, was der Import ablehnt: doppelte Notice, Notice ohne
+# Schlüssel, doppelte procedure und Zeilen zu einer Notice, die es nicht gibt
+DAY_CHUNKS = [
+    ("notice", _source([
+        ("n1", "1", "cn-standard", "2025-01-02T08:00:00+01:00"),
+        ("n1", "1", "cn-desire", "2025-01-05T08:00:00+01:00"),
+        ("n2", "1", "can-standard", "2025-01-02T09:00:00+01:00"),
+        (None, "1", "cn-standard", "2025-01-02T10:00:00+01:00"),
+    ], ["noticeType", "publicationDate"])),
+    ("procedure", _source([
+        ("n1", "1", "open"), ("n1", "1", "restricted"), ("n9", "1", "neg-w-call"),
+    ], ["procedureType"])),
+    ("purpose", _source([
+        ("n1", "1", "LOT-1", "Los-Titel", None, "services", None),
+        ("n9", "1", None, "Waise", None, "works", "5"),
+    ], ["lotIdentifier", "title", "description", "mainNature", "estimatedValue"])),
+    ("purpose", _source([
+        ("n1", "1", None, "Neubau Kita", "Errichtung einer Kita", "works", "1000.50"),
+    ], ["lotIdentifier", "title", "description", "mainNature", "estimatedValue"])),
+    ("organisation", _source([
+        ("n1", "1", "Bieter GmbH", "Bonn", "53111", "tenderer"),
+        ("n1", "1", "Stadt Köln", "Köln", "50667", "buyer"),
+        ("n1", "1", "Land NRW", "Düsseldorf", "40213", "buyer"),
+    ], ["organisationName", "organisationCity", "organisationPostCode", "organisationRole"])),
+    ("classification", _source([
+        ("n1", "1", "LOT-1", "71000000", None),
+        ("n1", "1", None, "45214100", "45214100,45214200"),
+    ], ["lotIdentifier", "mainClassificationCode", "additionalClassificationCodes"])),
+    ("submissionTerms", _source([
+        ("n1", "1", "LOT-1", "2025-02-01T10:00:00+01:00"),
+        ("n1", "1", "LOT-2", "2025-02-08T10:00:00+01:00"),
+    ], ["lotIdentifier", "publicOpeningDate"])),
+]
+
+# Was der Import davon in SQL schreibt: notice erste Zeile pro Key, ohne
+# NULL-Schlüssel; procedure erste Zeile; Waisen ohne Notice abgelehnt
+IMPORT_STATS = {
+    "notice": {"rows": 4, "imported": 2, "skipped_dupes": 1, "errors": 1},
+    "procedure": {"rows": 3, "imported": 1, "skipped_dupes": 2, "errors": 0},
+    "purpose": {"rows": 3, "imported": 2, "skipped_dupes": 1, "errors": 0},
+    "organisation": {"rows": 3, "imported": 3, "skipped_dupes": 0, "errors": 0},
+    "classification": {"rows": 2, "imported": 2, "skipped_dupes": 0, "errors": 0},
+    "submissionTerms": {"rows": 2, "imported": 2, "skipped_dupes": 0, "errors": 0},
+}
+
+
+def _collect(chunks=DAY_CHUNKS) -> FrameCollector:
+    collector = FrameCollector()
+    out = list(collector.tap(iter(chunks)))
+    assert [name for name, _ in out] == [name for name, _ in chunks]
+    return collector
+
+
+def test_imported_frames_keep_only_rows_the_importer_accepts():
+    frames, rejected = imported_frames(_collect().frames())
+
+    assert rejected == {"notice": 2, "procedure": 0, "purpose": 0,
+                        "organisation": 0, "classification": 0, "submissionTerms": 0}
+    assert frames["notice"]["notice_type"].tolist() == ["cn-standard", "can-standard"]
+    assert frames["procedure"]["procedure_type"].tolist() == ["open"]
+    assert frames["purpose"]["title"].tolist() == ["Los-Titel", "Neubau Kita"]
+
+
+def test_frames_path_builds_the_document_the_sql_path_reads():
+    """Erwartet ist, was _SOURCE_SQL aus den importierten Zeilen liest.
+
+    purposes/classifications: Notice-Level vor Losen, dann id; Käufer und
+    Fristen: erste Zeile nach id; procedures: die eine importierte Zeile.
+    """
+    frames, _ = imported_frames(_collect().frames())
+
+    docs = build_documents(frames)
+
+    assert len(docs) == 1
+    doc = docs.iloc[0].to_dict()
+    expected = {
+        "id": "n1-1",
+        "notice_identifier": "n1",
+        "notice_version": "1",
+        "title": "Neubau Kita",
+        "description": "Errichtung einer Kita",
+        "buyer_name": "Stadt Köln",
+        "buyer_city": "Köln",
+        "buyer_post_code": "50667",
+        "contract_nature": "works",
+        "estimated_value": Decimal("1000.50"),
+        "document_url": "https://oeffentlichevergabe.de/ui/de/tender/n1",
+        "cpv_code_main": "45214100",
+        "all_cpv_codes": "45214100,45214200",
+        "procedure_type": "open",
+    }
+    assert {k: doc[k] for k in expected} == expected
+    assert str(doc["publication_date"]).startswith("2025-01-02")
+    assert str(doc["deadline"]).startswith("2025-02-01")
+    assert doc["embedding_text"] == _build_embedding_text(
+        "Neubau Kita", "Errichtung einer Kita", "Stadt Köln", "Köln", "45214100", "works")
+    assert doc["embedding_hash"] == embedding_hashes(pd.Series([doc["embedding_text"]]))[0]
+
+
+def test_refresh_from_frames_falls_back_when_notices_already_existed(monkeypatch):
+    queued = []
+    monkeypatch.setattr(denormalizer, "enqueue", queued.extend)
+    monkeypatch.setattr(db, "get_engine", lambda: pytest.fail("kein Staging erwartet"))
+    # n1 stand schon in SQL: der Import behält die alte Zeile
+    stats = {**IMPORT_STATS, "notice": {**IMPORT_STATS["notice"], "imported": 1, "skipped_dupes": 2}}
+
+    count = denormalizer.refresh_from_frames(_collect(), [("n1", "1"), ("n2", "1")], stats)
+
+    assert count == 0
+    assert queued == [("n1", "1"), ("n2", "1")]
+
+
+class FakeCursor:
+    def __init__(self):
+        self.staged = []
+        self.fast_executemany = False
+
+    def execute(self, statement, *params):
+        pass
+
+    def executemany(self, statement, rows):
+        self.staged.extend(rows)
+
+    def fetchone(self):
+        return (len(self.staged), 0, 0)
+
+    def close(self):
+        pass
+
+
+def test_refresh_from_frames_stages_documents_when_import_matches(monkeypatch):
+    pytest.importorskip("pyodbc")
+    cursor = FakeCursor()
+    connection = SimpleNamespace(cursor=lambda: cursor, commit=lambda: None,
+                                 rollback=lambda: None, close=lambda: None)
+    monkeypatch.setattr(db, "get_engine", lambda: SimpleNamespace(raw_connection=lambda: connection))
+    monkeypatch.setattr(denormalizer, "enqueue", lambda keys: pytest.fail("kein Fallback erwartet"))
+
+    count = denormalizer.refresh_from_frames(_collect(), [("n1", "1")], IMPORT_STATS)
+
+    assert count == 1
+    assert [row[0] for row in cursor.staged] == ["n1-1"]
@@ -0,0 +1,139 @@
+"""EmbeddingScheduler mit Fake-embed_fn (ohne API)."""
+import threading
+import time
+from types import SimpleNamespace
+
+from pipeline.embedding_scheduler import EmbeddingScheduler, TokenBucket, estimate_tokens
+
+
+class ApiError(Exception):
+    def __init__(self, status_code: int, retry_after: float | None = None):
+        super().__init__(status_code)
+        self.status_code = status_code
+        headers = {} if retry_after is None else {"retry-after": str(retry_after)}
+        self.response = SimpleNamespace(headers=headers)
+
+
+def retryable(exc: Exception) -> bool:
+    return exc.status_code == 429 or exc.status_code >= 500
+
+
+def fake_vectors(texts: list[str]) -> list[list[float]]:
+    return [[float(len(t))] for t in texts]
+
+
+def make_scheduler(embed_fn, **kwargs) -> EmbeddingScheduler:
+    options = dict(workers=2, tpm=10_000_000, rpm=100_000, max_batch_tokens=1_000,
+                   max_batch_size=4, max_retries=3)
+    options.update(kwargs)
+    return EmbeddingScheduler(embed_fn, retryable, **options)
+
+
+def collect(scheduler: EmbeddingScheduler, items) -> dict:
+    result = {}
+    for keys, vectors in scheduler.run(items):
+        result.update(zip(keys, vectors))
+    return result
+
+
+def test_all_items_embedded_once():
+    items = [(i, "x" * (i + 1)) for i in range(50)]
+    scheduler = make_scheduler(fake_vectors)
+
+    result = collect(scheduler, items)
+
+    assert result == {i: [float(i + 1)] for i in range(50)}
+    assert scheduler.failed == []
+    assert scheduler.requests == 13  # 50 Texte, max. 4 pro Batch
+
+
+def test_batches_respect_token_limit():
+    sizes = []
+
+    def embed(texts):
+        sizes.append(sum(estimate_tokens(t) for t in texts))
+        return fake_vectors(texts)
+
+    items = [(i, "y" * 900) for i in range(10)]  # je 301 Tokens
+    collect(make_scheduler(embed, max_batch_tokens=700), items)
+
+    assert max(sizes) <= 700
+    assert sum(sizes) == 10 * estimate_tokens("y" * 900)
+
+
+def test_transient_errors_are_retried():
+    calls = {}
+    lock = threading.Lock()
+
+    def embed(texts):
+        with lock:
+            calls[texts[0]] = calls.get(texts[0], 0) + 1
+            first = calls[texts[0]] == 1
+        if first and texts[0] == "b":
+            raise ApiError(503, retry_after=0)
+        return fake_vectors(texts)
+
+    scheduler = make_scheduler(embed, max_batch_size=1)
+    result = collect(scheduler, [("a", "a"), ("b", "b"), ("c", "c")])
+
+    assert set(result) == {"a", "b", "c"}
+    assert scheduler.retries == 1
+    assert scheduler.failed == []
+
+
+def test_retries_exhausted_marks_failed():
+    def embed(texts):
+        raise ApiError(500, retry_after=0)
+
+    scheduler = make_scheduler(embed, max_retries=2)
+    result = collect(scheduler, [("a", "a")])
+
+    assert result == {}
+    assert scheduler.failed == ["a"]
+    assert scheduler.retries == 2
+
+
+def test_permanent_error_is_isolated_by_splitting():
+    def embed(texts):
+        if "BAD" in texts:
+            raise ApiError(400)
+        return fake_vectors(texts)
+
+    items = [(i, "BAD" if i == 5 else f"text {i}") for i in range(8)]
+    scheduler = make_scheduler(embed, max_batch_size=8)
+    result = collect(scheduler, items)
+
+    assert scheduler.failed == [5]
+    assert set(result) == set(range(8)) - {5}
+
+
+def test_waiting_for_retry_does_not_spin():
+    """Volle Warteschlange + fällige Retries: der Scheduler blockiert statt zu pollen."""
+    seen = set()
+    lock = threading.Lock()
+
+    def embed(texts):
+        with lock:
+            first = texts[0] not in seen
+            seen.add(texts[0])
+        if first:
+            raise ApiError(503, retry_after=0.01)
+        time.sleep(0.1)
+        return fake_vectors(texts)
+
+    items = [(i, str(i)) for i in range(10)]
+    scheduler = make_scheduler(embed, workers=1, max_batch_size=1)
+    wall, cpu = time.monotonic(), time.process_time()
+    result = collect(scheduler, items)
+    wall, cpu = time.monotonic() - wall, time.process_time() - cpu
+
+    assert set(result) == set(range(10))
+    assert cpu < wall * 0.3
+
+
+def test_token_bucket_allows_debt():
+    bucket = TokenBucket(per_minute=6_000)  # 100/s, Bucket-Größe 100
+    started = time.monotonic()
+    bucket.acquire(250)  # größer als der Bucket: sofort, aber als Schuld
+    bucket.acquire(10)
+    assert time.monotonic() - started >= 1.4
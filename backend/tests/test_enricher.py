@@ -0,0 +1,54 @@
+"""Geocoding-Fallbacks in Python (ohne Datenbank)."""
+import pytest
+
+from pipeline import enricher
+from pipeline.gazetteer import CityIndex
+
+PLZ = {
+    "10115": (52.53, 13.38),
+    "10117": (52.51, 13.39),
+    "80331": (48.13, 11.57),
+}
+
+
+@pytest.fixture
+def resolve():
+    prefix_index = enricher._build_prefix_index(PLZ)
+    city_index = CityIndex([("Hamburg", 53.55, 10.0, 100)])
+
+    def _resolve(post_code=None, description=None, city=None):
+        return enricher._resolve(post_code, description, city, PLZ, prefix_index, city_index)
+    return _resolve
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("01067", "01067"),
+    ("1067", "01067"),
+    ("01067.0", "01067"),
+    ("D-50667", "50667"),
+    ("123", None),
+    ("", None),
+    (None, None),
+])
+def test_normalize_plz(raw, expected):
+    assert enricher._normalize_plz(raw) == expected
+
+
+def test_exact_plz(resolve):
+    assert resolve("D-10115") == PLZ["10115"]
+
+
+def test_three_digit_prefix_centroid(resolve):
+    assert resolve("10199") == pytest.approx((52.52, 13.385))
+
+
+def test_description_plz_beats_two_digit_prefix(resolve):
+    # 109.. hat keinen 3-stelligen Schwerpunkt, 10... aber einen 2-stelligen
+    assert resolve("10999", "Lieferort: 80331 München") == PLZ["80331"]
+    assert resolve("10999", "keine PLZ") == pytest.approx((52.52, 13.385))
+
+
+def test_city_name_last(resolve):
+    assert resolve(None, None, "Hansestadt Hamburg") == (53.55, 10.0)
+    assert resolve("99999", None, "Hamburg") == (53.55, 10.0)
+    assert resolve(None, None, None) is None
@@ -0,0 +1,93 @@
+"""PLZ-Gazetteer-Datei und Ortsnamen-Index."""
+import pytest
+
+import db
+from pipeline import gazetteer
+from pipeline.gazetteer import CityIndex, Gazetteer, normalize_city
+
+PLZ_ROWS = [
+    ("10115", 52.532, 13.384, "Berlin"),
+    ("10117", 52.517, 13.389, "Berlin"),
+    ("01067", 51.057, 13.721, "Dresden"),
+    ("60311", 50.110, 8.682, "Frankfurt am Main"),
+    ("1234", 50.0, 10.0, "Kaputt"),  # ungültige PLZ wird übersprungen
+]
+
+
+@pytest.fixture
+def gazetteer_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "fetch_all", lambda query, params=None: PLZ_ROWS)
+    path = tmp_path / "plz.npy"
+    gazetteer.build(path)
+    return path
+
+
+def test_build_and_open(gazetteer_file):
+    gaz = Gazetteer.open(gazetteer_file)
+
+    assert len(gaz) == 4
+    assert list(gaz) == ["01067", "10115", "10117", "60311"]
+    assert gaz["01067"] == pytest.approx((51.057, 13.721), abs=1e-4)
+    assert gaz.city("10117") == "Berlin"
+    assert "99999" not in gaz and 1067 not in gaz and "1067" not in gaz
+    with pytest.raises(KeyError):
+        gaz["99999"]
+    assert gaz.get("99999") is None
+
+
+def test_load_missing_file_returns_none(tmp_path):
+    assert gazetteer.load(tmp_path / "fehlt.npy") is None
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Frankfurt a.M.", "frankfurt am main"),
+    ("Frankfurt a. M.", "frankfurt am main"),
+    ("Frankfurt a. Main", "frankfurt am main"),
+    ("Frankfurt/Main", "frankfurt am main"),
+    ("Stadt Köln", "koeln"),
+    ("Köln, Stadt", "koeln"),
+    ("Neustadt a.d. Weinstr.", "neustadt an der weinstr"),
+    ("St. Ingbert", "sankt ingbert"),
+    ("Halle (Saale)", "halle saale"),
+    (None, ""),
+])
+def test_normalize_city(name, expected):
+    assert normalize_city(name) == expected
+
+
+@pytest.fixture
+def city_index():
+    return CityIndex([
+        ("Berlin", 52.5, 13.4, 190),
+        ("Frankfurt am Main", 50.1, 8.7, 40),
+        ("Frankfurt (Oder)", 52.3, 14.5, 3),
+        ("Neustadt", 50.0, 10.0, 5),
+        ("Halle", 51.5, 11.9, 10),
+        ("Mönchengladbach", 51.2, 6.4, 12),
+    ])
+
+
+def test_city_index_exact_and_abbreviated(city_index):
+    assert city_index.resolve("Frankfurt a.M.") == (50.1, 8.7)
+    assert city_index.resolve("Stadt Berlin") == (52.5, 13.4)
+
+
+def test_city_index_strips_hyphenated_district_only(city_index):
+    assert city_index.resolve("Berlin-Mitte") == (52.5, 13.4)
+    assert city_index.resolve("Neustadt a.d. Weinstr.") is None
+    assert city_index.resolve("Halle (Saale)") is None
+
+
+def test_city_index_fuzzy_match(city_index):
+    assert city_index.resolve("Moenchengladbch") == (51.2, 6.4)
+    assert city_index.resolve("Hamburg") is None
+    assert city_index.resolve("") is None
+
+
+def test_city_index_from_gazetteer(gazetteer_file):
+    index = CityIndex.from_gazetteer(Gazetteer.open(gazetteer_file))
+
+    lat, lng = index.resolve("Berlin")
+    assert lat == pytest.approx((52.532 + 52.517) / 2, abs=1e-4)
+    assert lng == pytest.approx((13.384 + 13.389) / 2, abs=1e-4)
+    assert len(index) == 3
@@ -0,0 +1,137 @@
+"""Spaltenweise Konverter des Importers gegen die skalaren Referenz-Helfer."""
+import io
+import math
+import random
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from pipeline import importer
+
+CSV = """noticeIdentifier,noticeVersion,publicationDate,lotsMaxAllowed,procedureAccelerated,estimatedValue,postCode,flag,mixed
+ abc ,01,2025-01-02T10:00:00+01:00,3,true,12.50,01067,1,x
+NaN,2,2025-06-02T10:00:00+02:00,,false,,50667,,
+x,,notadate,4.7,,1e3,,0,5
+,03,2025-01-05,,TRUE,abc,1067.0,1,
+"""
+
+SCALAR = {
+    "str": lambda v: importer._s(v, 3),
+    "num_str": lambda v: importer._num_str(v, 3),
+    "dec": importer._dec,
+    "int": importer._int,
+    "bool": importer._bool,
+    "dt": importer._dt,
+}
+
+
+def _same(a, b) -> bool:
+    if a is None or b is None:
+        return a is b
+    if isinstance(a, float) and math.isnan(a):
+        return isinstance(b, float) and math.isnan(b)
+    return type(a) is type(b) and a == b and str(a) == str(b)
+
+
+@pytest.mark.parametrize("as_str", [False, True], ids=["inferred", "str"])
+@pytest.mark.parametrize("typ", sorted(SCALAR))
+def test_column_converters_match_scalar_helpers(typ, as_str):
+    df = pd.read_csv(io.StringIO(CSV), dtype=str if as_str else None)
+    for column in df.columns:
+        vectorised = importer._CONVERTERS[typ](df[column], 3).tolist()
+        reference = [SCALAR[typ](v) for v in df[column].tolist()]
+        mismatches = [(x, y) for x, y in zip(vectorised, reference) if not _same(x, y)]
+        assert not mismatches, f"{column}: {mismatches}"
+
+
+
+@pytest.mark.parametrize("values", [
+    [1e19, -3e19, 2.0**63, -(2.0**63), 9.2e18, 12.7, None],
+    [2**62, -(2**62), 7],
+], ids=["float-out-of-int64", "int64"])
+def test_int_converter_matches_scalar_outside_int64(values):
+    series = pd.Series(values)
+
+    vectorised = importer._col_int(series).tolist()
+
+    assert vectorised == [importer._int(v) for v in values]
+    assert all(v is None or type(v) is int for v in vectorised)
+
+def test_num_str_drops_leading_zeros_of_numeric_ids():
+    assert importer._num_str("01") == "1"
+    assert importer._num_str(" 002 ") == "2"
+    assert importer._num_str("0") == "0"
+    assert importer._num_str("v2") == "v2"
+    assert importer._num_str("") is None
+
+
+def test_notice_keys_use_stored_key_format():
+    df = pd.DataFrame({
+        "noticeIdentifier": [" a ", "a", "b", None],
+        "noticeVersion": ["01", "1", "2", "1"],
+    })
+    assert importer.notice_keys(df) == {("a", "1"), ("b", "2")}
+
+
+def test_build_params_fills_missing_columns_with_null():
+    df = pd.DataFrame({"noticeIdentifier": ["n1"], "noticeVersion": ["01"], "title": [" T "]})
+
+    params = importer._build_params(importer._TABLE_DEFS["purpose"], df)
+
+    assert params == [("n1", "1", None, None, None, None, "T", None, None, None)]
+
+
+def test_merge_sql_dedupes_keyed_tables_and_keeps_file_order():
+    keyed = importer._merge_sql(importer._TABLE_DEFS["lot"], "#stage_lots")
+    plain = importer._merge_sql(importer._TABLE_DEFS["purpose"], "#stage_purposes")
+
+    assert "ROW_NUMBER() OVER (PARTITION BY notice_identifier, notice_version, lot_identifier" in keyed
+    assert "stage_rank" not in plain
+    assert plain.endswith("ORDER BY s.stage_row")
+
+
+def test_import_stream_keeps_file_order_per_table(monkeypatch):
+    log = []
+    running = set()
+    lock = threading.Lock()
+
+    def fake_import(csv_name, chunk):
+        with lock:
+            assert csv_name not in running, f"{csv_name}: zwei Chunks gleichzeitig"
+            running.add(csv_name)
+        time.sleep(random.random() * 0.005)
+        with lock:
+            running.discard(csv_name)
+            log.append((csv_name, chunk["n"].iloc[0]))
+        return {"imported": len(chunk), "errors": 0, "skipped_dupes": 0}
+
+    monkeypatch.setitem(importer._IMPORTERS, "fake", fake_import)
+    order = ["notice", "purpose", "tender"]
+    deps = {"notice": [], "purpose": ["notice"], "tender": ["notice"]}
+    chunks = [("notice", pd.DataFrame({"n": [i]})) for i in range(5)]
+    chunks += [(name, pd.DataFrame({"n": [i]})) for i in range(20) for name in ("purpose", "tender")]
+
+    stats = importer.import_stream(iter(chunks), order, mode="fake",
+                                   dependencies=deps, max_workers=4)
+
+    for name, count in (("notice", 5), ("purpose", 20), ("tender", 20)):
+        assert [n for table, n in log if table == name] == list(range(count))
+        assert stats[name]["imported"] == count
+    # Kind-Tabellen erst nach dem letzten notice-Chunk
+    assert [table for table, _ in log[:5]] == ["notice"] * 5
+
+
+def test_import_stream_raises_first_error(monkeypatch):
+    def fake_import(csv_name, chunk):
+        if csv_name == "purpose":
+            raise RuntimeError("kaputt")
+        return {"imported": len(chunk), "errors": 0, "skipped_dupes": 0}
+
+    monkeypatch.setitem(importer._IMPORTERS, "fake", fake_import)
+    chunks = [("notice", pd.DataFrame({"n": [1]}))] + [("purpose", pd.DataFrame({"n": [i]}))
+                                                       for i in range(10)]
+
+    with pytest.raises(RuntimeError, match="kaputt"):
+        importer.import_stream(iter(chunks), ["notice", "purpose"], mode="fake", max_workers=2)
@@ -0,0 +1,74 @@
+"""Aktiver Suchindex: gespeicherter Name und Umschalten beim Rebuild."""
+import pytest
+
+import config
+import db
+from pipeline import embedder, index_state, indexer
+
+
+@pytest.fixture
+def state_path(tmp_path, monkeypatch):
+    path = tmp_path / "data" / "search_index.json"
+    monkeypatch.setattr(config, "INDEX_STATE_PATH", path)
+    return path
+
+
+def test_default_is_config_index_name(state_path):
+    assert index_state.stored_index_name() is None
+    assert index_state.live_index_name() == config.INDEX_NAME
+
+
+def test_set_live_index_name_replaces_the_file(state_path):
+    index_state.set_live_index_name(f"{config.INDEX_NAME}-20250101000000")
+    index_state.set_live_index_name(f"{config.INDEX_NAME}-20250201000000")
+
+    assert index_state.live_index_name() == f"{config.INDEX_NAME}-20250201000000"
+    assert [p.name for p in state_path.parent.iterdir()] == ["search_index.json"]
+
+
+class FakeIndexClient:
+    def __init__(self, names, events):
+        self.names = list(names)
+        self.events = events
+
+    def list_index_names(self):
+        return iter(self.names)
+
+    def delete_index(self, name):
+        self.events.append(("delete", name, index_state.stored_index_name()))
+        self.names.remove(name)
+
+
+def test_without_stored_name_the_oldest_index_is_adopted(state_path):
+    old = f"{config.INDEX_NAME}-20250101000000"
+    client = FakeIndexClient([f"{config.INDEX_NAME}-20250201000000", old, "anderer-index"], [])
+
+    assert indexer.live_index_name(client) == old
+    assert index_state.stored_index_name() == old
+
+
+def test_rebuild_switches_before_deleting_the_old_index(state_path, monkeypatch):
+    live = f"{config.INDEX_NAME}-20250101000000"
+    aborted = f"{config.INDEX_NAME}-20250301000000"
+    index_state.set_live_index_name(live)
+    events = []
+    client = FakeIndexClient([aborted, live], events)
+    monkeypatch.setattr(indexer, "_index_client", lambda: client)
+    monkeypatch.setattr(indexer, "create_index", lambda name: client.names.append(name))
+    monkeypatch.setattr(indexer, "_search_client", lambda name: None)
+    monkeypatch.setattr(indexer, "_upload_batch", lambda c, batch, label: [d["id"] for d in batch])
+    monkeypatch.setattr(indexer, "_reset_index_state", lambda started, failed: None)
+    monkeypatch.setattr(indexer.time, "sleep", lambda seconds: events.append(("sleep", seconds)))
+    monkeypatch.setattr(embedder, "iter_stored", lambda chunk_size: iter([[{"id": "a"}, {"id": "b"}]]))
+    monkeypatch.setattr(db, "fetch_all", lambda query: [(0,)])
+
+    assert indexer.rebuild_index() == 2
+
+    new = index_state.stored_index_name()
+    assert new not in (live, aborted) and new.startswith(f"{config.INDEX_NAME}-")
+    assert events == [
+        ("delete", aborted, live),
+        ("sleep", config.INDEX_STATE_CACHE_SECONDS),
+        ("delete", live, new),
+    ]
+    assert client.names == [new]
@@ -0,0 +1,96 @@
+"""Import-Ledger und Löschen vor dem Re-Import (ohne Datenbank)."""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import db
+from pipeline import importer, ledger
+
+DAY = date(2025, 1, 2)
+
+
+@pytest.fixture
+def ledger_db(monkeypatch):
+    """Ersetzt import_ledger durch ein Dict table_name → (content_hash, errors)."""
+    rows = {}
+
+    def fetch_all(query, params=None):
+        return [(name, h, errors) for name, (h, errors) in rows.items()]
+
+    def execute(query, params=None):
+        for entry in params:
+            rows[entry["table_name"]] = (entry["content_hash"], entry["errors"])
+
+    monkeypatch.setattr(db, "fetch_all", fetch_all)
+    monkeypatch.setattr(db, "execute", execute)
+    return rows
+
+
+def test_new_and_changed_tables(ledger_db):
+    ledger_db["notice"] = ("h1", 0)
+    ledger_db["lot"] = ("h2", 0)
+
+    changed = ledger.changed_tables("src", DAY, {"notice": "h1", "lot": "neu", "purpose": "h3"})
+
+    assert changed == ["lot", "purpose"]
+
+
+def test_tables_with_errors_are_recorded_and_imported_again(ledger_db):
+    hashes = {"notice": "h1", "purpose": "h2"}
+    stats = {
+        "notice": {"rows": 10, "imported": 10},
+        "purpose": {"rows": 10, "imported": 8, "errors": 2},
+        "tender": {"missing": True},
+    }
+
+    ledger.record("src", DAY, stats, hashes)
+
+    assert ledger_db == {"notice": ("h1", 0), "purpose": ("h2", 2)}
+    assert ledger.changed_tables("src", DAY, hashes) == ["purpose"]
+
+
+def _chunk(*keys):
+    return pd.DataFrame({
+        "noticeIdentifier": [k[0] for k in keys],
+        "noticeVersion": [k[1] for k in keys],
+    })
+
+
+def test_purge_stream_deletes_each_notice_once_before_its_rows(monkeypatch):
+    events = []
+
+    def delete_notice_rows(csv_name, keys):
+        events.append(("delete", csv_name, sorted(keys)))
+        return len(keys)
+
+    monkeypatch.setattr(importer, "delete_notice_rows", delete_notice_rows)
+    chunks = [
+        ("notice", _chunk(("n1", "1"))),
+        ("purpose", _chunk(("n1", "1"), ("n2", "1"))),
+        ("purpose", _chunk(("n2", "01"), ("n3", "1"))),
+        ("tender", _chunk(("n1", "1"))),
+    ]
+
+    for csv_name, chunk in importer.purge_stream(iter(chunks), {"notice", "purpose", "tender"}):
+        events.append(("import", csv_name, len(chunk)))
+
+    # notice hat einen Primärschlüssel und wird nie gelöscht
+    assert events == [
+        ("import", "notice", 1),
+        ("delete", "purpose", [("n1", "1"), ("n2", "1")]),
+        ("import", "purpose", 2),
+        ("delete", "purpose", [("n3", "1")]),
+        ("import", "purpose", 2),
+        ("delete", "tender", [("n1", "1")]),
+        ("import", "tender", 1),
+    ]
+
+
+def test_purge_stream_ignores_tables_not_imported(monkeypatch):
+    monkeypatch.setattr(importer, "delete_notice_rows",
+                        lambda *args: pytest.fail("unerwartetes Löschen"))
+
+    out = list(importer.purge_stream(iter([("purpose", _chunk(("n1", "1")))]), set()))
+
+    assert len(out) == 1
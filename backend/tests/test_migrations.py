@@ -0,0 +1,120 @@
+"""Schema-Migrationen gegen eine simulierte Datenbank."""
+import pytest
+
+import db
+import migrations
+
+
+class FakeSchema:
+    """Hält angewendete Versionen und vorhandene (Tabelle, Index)-Paare."""
+
+    def __init__(self, applied=(), objects=()):
+        self.applied = set(applied)
+        self.objects = set(objects)
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.fail_on = None
+
+    # db.fetch_all
+    def fetch_all(self, query, params=None):
+        if "OBJECT_ID('schema_migrations')" in query:
+            return [(1 if self.applied else None,)]
+        if "FROM schema_migrations" in query:
+            return [(v,) for v in sorted(self.applied)]
+        if "sys.indexes" in query:
+            return sorted(self.objects)
+        raise AssertionError(query)
+
+    # db.get_engine().raw_connection()
+    def raw_connection(self):
+        return self
+
+    def cursor(self):
+        return self
+
+    def execute(self, statement, *params):
+        if self.fail_on and self.fail_on in statement:
+            raise RuntimeError("SQL-Fehler")
+        self.executed.append(statement)
+        if statement.startswith("INSERT INTO schema_migrations"):
+            self.applied.add(params[0])
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def schema(monkeypatch):
+    fake = FakeSchema()
+    monkeypatch.setattr(db, "fetch_all", fake.fetch_all)
+    monkeypatch.setattr(db, "get_engine", lambda: fake)
+    return fake
+
+
+def _all_objects():
+    objects = set()
+    for migration in migrations.MIGRATIONS:
+        for table in migration.get("tables", []):
+            objects.add((table, f"PK_{table}"))
+        for table, indexes in migration.get("indexes", {}).items():
+            objects.update((table, index) for index in indexes)
+    return objects
+
+
+def test_versions_are_unique_and_ascending():
+    versions = [m["version"] for m in migrations.MIGRATIONS]
+
+    assert versions == sorted(set(versions))
+    assert versions == list(range(1, len(versions) + 1))
+    assert all(m["name"] and m["statements"] for m in migrations.MIGRATIONS)
+
+
+def test_apply_runs_pending_migrations_in_order(schema):
+    schema.applied = {1, 2}
+
+    count = migrations.apply()
+
+    assert count == len(migrations.MIGRATIONS) - 2
+    assert schema.applied == {m["version"] for m in migrations.MIGRATIONS}
+    assert migrations.pending() == []
+    assert migrations.apply() == 0
+
+
+def test_failed_migration_is_rolled_back_and_not_recorded(schema):
+    schema.fail_on = "CREATE TABLE denorm_queue"
+
+    with pytest.raises(RuntimeError):
+        migrations.apply()
+
+    assert schema.applied == {1, 2}
+    assert schema.rollbacks == 1
+
+
+def test_verify_reports_nothing_when_complete(schema):
+    schema.applied = {m["version"] for m in migrations.MIGRATIONS}
+    schema.objects = _all_objects()
+
+    assert migrations.verify() == []
+
+
+def test_verify_reports_missing_objects_and_versions(schema):
+    schema.applied = {m["version"] for m in migrations.MIGRATIONS} - {9}
+    schema.objects = _all_objects() - {
+        ("search_documents", "ix_search_documents_pending_index"),
+        ("import_ledger", "PK_import_ledger"),
+    }
+
+    problems = migrations.verify()
+
+    assert problems == [
+        "Migration 009 (pending_index_by_id) nicht angewendet",
+        "Tabelle import_ledger fehlt",
+        "Index search_documents.ix_search_documents_pending_index fehlt",
+    ]
@@ -0,0 +1,76 @@
+"""Parquet-Staging-Lake: atomares Schreiben im Hive-Layout und Replay."""
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import config
+from pipeline import staging_lake
+from pipeline.staging_lake import LakeTables
+
+DAY = date(2025, 1, 2)
+
+
+@pytest.fixture
+def lake(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "STAGING_LAKE_DIR", tmp_path)
+    return tmp_path
+
+
+def _chunks():
+    return [
+        ("notice", pd.DataFrame({"noticeIdentifier": ["n1", "n2"], "title": [None, None]})),
+        ("notice", pd.DataFrame({"noticeIdentifier": ["n3"], "title": ["Titel"]})),
+        ("lot", pd.DataFrame({"noticeIdentifier": ["n1"], "lotIdentifier": ["LOT-1"]})),
+    ]
+
+
+def _part(lake, table):
+    return lake / "source=src" / f"table={table}" / f"date={DAY.isoformat()}" / "part-0.parquet"
+
+
+def test_tee_passes_chunks_through_and_writes_hive_layout(lake):
+    out = list(staging_lake.tee("src", DAY, iter(_chunks())))
+
+    assert [(name, len(c)) for name, c in out] == [("notice", 2), ("notice", 1), ("lot", 1)]
+    notice = pd.read_parquet(_part(lake, "notice"))
+    assert notice["noticeIdentifier"].tolist() == ["n1", "n2", "n3"]
+    # im ersten Chunk leere Spalte wurde als String angelegt
+    assert notice["title"].tolist()[2] == "Titel"
+    assert _part(lake, "lot").exists()
+    assert not list(lake.rglob("*.tmp"))
+
+
+def test_part_file_appears_only_after_the_last_chunk(lake):
+    stream = staging_lake.tee("src", DAY, iter(_chunks()))
+
+    next(stream)
+    next(stream)
+    assert not _part(lake, "notice").exists()
+    list(stream)
+    assert _part(lake, "notice").exists()
+
+
+def test_aborted_tee_keeps_the_previous_day(lake):
+    list(staging_lake.tee("src", DAY, iter(_chunks())))
+    before = pd.read_parquet(_part(lake, "notice"))
+
+    stream = staging_lake.tee("src", DAY, iter([
+        ("notice", pd.DataFrame({"noticeIdentifier": ["neu"], "title": ["x"]})),
+        ("lot", pd.DataFrame({"noticeIdentifier": ["neu"], "lotIdentifier": ["L"]})),
+    ]))
+    next(stream)
+    stream.close()
+
+    pd.testing.assert_frame_equal(pd.read_parquet(_part(lake, "notice")), before)
+    assert not list(lake.rglob("*.tmp"))
+
+
+def test_lake_tables_replay_in_chunks(lake):
+    list(staging_lake.tee("src", DAY, iter(_chunks())))
+
+    tables = LakeTables("src", DAY, ["notice", "lot", "tender"])
+
+    assert sorted(tables) == ["lot", "notice"]
+    assert [len(c) for c in tables.iter_chunks("notice", 2)] == [2, 1]
+    assert tables["lot"]["lotIdentifier"].tolist() == ["LOT-1"]
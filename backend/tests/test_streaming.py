@@ -0,0 +1,45 @@
+"""prefetch: Vorladen im Hintergrund-Thread."""
+import threading
+import time
+
+import pytest
+
+from pipeline.streaming import prefetch
+
+
+def test_yields_all_items_in_order():
+    assert list(prefetch(iter(range(100)), depth=3)) == list(range(100))
+
+
+def test_producer_error_is_raised_at_the_consumer():
+    def items():
+        yield 1
+        raise ValueError("Quelle kaputt")
+
+    out = prefetch(items(), depth=2)
+
+    assert next(out) == 1
+    with pytest.raises(ValueError, match="Quelle kaputt"):
+        next(out)
+
+
+@pytest.mark.parametrize("count", [1, 2, 50], ids=["one-item", "end-marker-blocked", "mid-stream"])
+def test_thread_ends_when_consumer_stops_early(count):
+    closed = threading.Event()
+
+    def items():
+        try:
+            yield from range(count)
+        finally:
+            closed.set()
+
+    before = set(threading.enumerate())
+    out = prefetch(items(), depth=1)
+    next(out)
+    time.sleep(0.1)  # Erzeuger füllt den Puffer und wartet
+    out.close()
+
+    assert closed.wait(2)
+    for thread in set(threading.enumerate()) - before:
+        thread.join(2)
+        assert not thread.is_alive()
@@ -0,0 +1,115 @@
+"""Content-adressierter Vektor-Cache (float16 auf Platte)."""
+import hashlib
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from pipeline.vector_cache import VectorCache, pack_vector, unpack_vector
+
+DIMS = 4
+RECORD = DIMS * 2
+
+
+def h(i) -> str:
+    return hashlib.sha256(str(i).encode()).hexdigest()
+
+
+def vec(i) -> list[float]:
+    return [float(i % 500), -1.0, 0.5, float(i % 7)]
+
+
+def open_cache(root, max_bytes=10**9) -> VectorCache:
+    return VectorCache(root, "test-model", DIMS, max_bytes)
+
+
+def test_pack_roundtrip():
+    assert unpack_vector(pack_vector([0.25, -1.5, 3.0])) == [0.25, -1.5, 3.0]
+
+
+def test_put_get_and_persist(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.put_many([h(1), h(2)], [vec(1), vec(2)])
+    cache.put_many([h(2)], [[9.0] * DIMS])  # vorhandener Hash bleibt unverändert
+
+    assert cache.get_many([h(1), h(3), h(2)]) == [vec(1), None, vec(2)]
+    assert (cache.hits, cache.misses) == (2, 1)
+    cache.flush()
+
+    reopened = open_cache(tmp_path)
+    assert len(reopened) == 2
+    assert reopened.get_many([h(2), h(1)]) == [vec(2), vec(1)]
+
+
+def test_hash_with_trailing_zero_byte_survives_reload(tmp_path):
+    key = "ab" * 31 + "00"
+    cache = open_cache(tmp_path)
+    cache.put_many([key], [vec(1)])
+    cache.flush()
+
+    assert open_cache(tmp_path).get_many([key]) == [vec(1)]
+
+
+def test_eviction_keeps_recently_used(tmp_path):
+    cache = open_cache(tmp_path, max_bytes=10 * RECORD)
+    cache.put_many([h(i) for i in range(12)], [vec(i) for i in range(12)])
+    cache.get_many([h(0), h(1)])  # zuletzt genutzt
+    cache.flush()
+
+    assert len(cache) == 9  # 90 % der Obergrenze
+    assert cache.get_many([h(0), h(1)]) == [vec(0), vec(1)]
+    assert (tmp_path / "test-model-4" / "vectors.f16").stat().st_size == 9 * RECORD
+
+
+def test_open_truncates_unindexed_and_torn_records(tmp_path):
+    cache = open_cache(tmp_path)
+    cache.put_many([h(1)], [vec(1)])
+    cache.flush()
+    cache.put_many([h(2)], [vec(2)])  # nie geflusht
+    vectors = tmp_path / "test-model-4" / "vectors.f16"
+    with open(vectors, "ab") as f:
+        f.write(b"\x01\x02\x03")  # abgebrochener Schreibvorgang
+
+    reopened = open_cache(tmp_path)
+    assert vectors.stat().st_size == RECORD
+    reopened.put_many([h(3)], [vec(3)])
+    assert reopened.get_many([h(1), h(2), h(3)]) == [vec(1), None, vec(3)]
+
+
+def test_other_process_eviction_invalidates_slots(tmp_path):
+    first = open_cache(tmp_path)
+    first.put_many([h(i) for i in range(20)], [vec(i) for i in range(20)])
+    first.flush()
+
+    second = open_cache(tmp_path, max_bytes=10 * RECORD)
+    second.get_many([h(i) for i in range(15, 20)])
+    second.flush()  # kompaktiert die Datei
+
+    result = first.get_many([h(i) for i in range(20)])
+    assert all(v is None or v == vec(i) for i, v in enumerate(result))
+    assert result[15:] == [vec(i) for i in range(15, 20)]
+
+
+def _writer(root, start):
+    cache = open_cache(root)
+    for offset in range(0, 200, 20):
+        keys = range(start + offset, start + offset + 20)
+        cache.put_many([h(i) for i in keys], [vec(i) for i in keys])
+    cache.flush()
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="benötigt fork")
+def test_concurrent_processes_append_consistently(tmp_path):
+    open_cache(tmp_path)  # Verzeichnis und Lock-Datei anlegen
+    ctx = multiprocessing.get_context("fork")
+    procs = [ctx.Process(target=_writer, args=(tmp_path, k * 1000)) for k in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+    cache = open_cache(tmp_path)
+    keys = [k * 1000 + i for k in range(3) for i in range(200)]
+    result = cache.get_many([h(i) for i in keys])
+    assert all(v is None or v == vec(i) for i, v in zip(keys, result))
+    assert np.count_nonzero([v is not None for v in result]) == len(cache)